@@ -0,0 +1,56 @@
+"""
+Compare load time of the same synthetic pack saved as siq, jsiq.zip and bsiq.
+
+    python -m benchmarks.bench_load --questions 5000 50000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import pathlib
+import tempfile
+import time
+
+from benchmarks.generate import PackSpec, generate_siq
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+THEMES_PER_ROUND = 50
+QUESTIONS_PER_THEME = 100
+TYPES = (SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ, SIDocumentTypes.BSIQ)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark package load time by format")
+    parser.add_argument("--questions", "-q", type=int, nargs="+", default=[5000, 50000],
+                        help="Approximate number of questions per pack")
+    parser.add_argument("--repeat", "-n", type=int, default=3, help="Loads per format, the fastest one is reported")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.questions:
+            per_round = THEMES_PER_ROUND * QUESTIONS_PER_THEME
+            spec = PackSpec(rounds=max(1, size // per_round), themes=THEMES_PER_ROUND,
+                            questions=QUESTIONS_PER_THEME if size >= per_round else max(1, size // THEMES_PER_ROUND))
+            paths = {filetype: pathlib.Path(tmp, f"pack_{size}.{filetype}") for filetype in TYPES}
+            generate_siq(paths[SIDocumentTypes.SIQ], spec)
+            doc = SIDocument.read_siq(paths[SIDocumentTypes.SIQ])
+            for filetype in TYPES[1:]:
+                doc.save_as(paths[filetype], filetype)
+            del doc
+            timings = {}
+            for filetype, path in paths.items():
+                times = []
+                for _ in range(args.repeat):
+                    gc.collect()
+                    start = time.perf_counter()
+                    SIDocument.read_as(path, filetype)
+                    times.append(time.perf_counter() - start)
+                timings[filetype] = min(times)
+            for filetype, elapsed in timings.items():
+                speedup = timings[SIDocumentTypes.SIQ] / elapsed
+                print(f"{filetype:>9} {spec.question_count:>7} questions: {elapsed:8.3f}s, "
+                      f"{elapsed / spec.question_count * 1e6:7.1f}us/question, x{speedup:4.1f} vs siq, "
+                      f"{paths[filetype].stat().st_size / 2 ** 20:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Report heap bytes per question of a loaded package.
+
+    python -m benchmarks.bench_memory --questions 20000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import pathlib
+import tempfile
+import tracemalloc
+
+from benchmarks.generate import PackSpec, generate_siq
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+
+def measure(path: pathlib.Path, filetype: str, **kwargs) -> int:
+    gc.collect()
+    tracemalloc.start()
+    doc = SIDocument.read_as(path, filetype, **kwargs)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del doc
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory used by loaded packages")
+    parser.add_argument("--questions", "-q", type=int, default=20000, help="Approximate number of questions")
+    args = parser.parse_args()
+    themes, questions = 50, 100
+    rounds = max(1, args.questions // (themes * questions))
+    count = rounds * themes * questions
+    with tempfile.TemporaryDirectory() as tmp:
+        siq = pathlib.Path(tmp, "pack.siq")
+        generate_siq(siq, PackSpec(rounds=rounds, themes=themes, questions=questions))
+        jsiq = pathlib.Path(tmp, "pack.jsiq.zip")
+        bsiq = pathlib.Path(tmp, "pack.bsiq")
+        doc = SIDocument.read_siq(siq)
+        doc.save_jsiq(jsiq)
+        doc.save_bsiq(bsiq)
+        del doc
+        for path, filetype in ((siq, SIDocumentTypes.SIQ), (jsiq, SIDocumentTypes.JSIQ), (bsiq, SIDocumentTypes.BSIQ)):
+            size = measure(path, filetype)
+            print(f"{filetype:>9}: {count} questions, {size / 2 ** 20:8.1f} MiB, {size / count:7.0f} bytes/question")
+
+
+if __name__ == '__main__':
+    main()
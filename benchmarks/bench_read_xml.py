@@ -0,0 +1,44 @@
+"""
+Time SIQ reading for synthetic packs of growing size.
+Parse time per question should stay flat when the deserializers are linear in document size.
+
+    python -m benchmarks.bench_read_xml --sizes 1000 10000 50000
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+from benchmarks.generate import PackSpec, generate_siq
+from sigame_tools.datatypes import SIDocument, SIQReaders
+
+THEMES_PER_ROUND = 50
+QUESTIONS_PER_THEME = 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SIQ readers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000], help="Number of questions per pack")
+    parser.add_argument("--reader", choices=(SIQReaders.ITERPARSE, SIQReaders.MINIDOM, SIQReaders.PARALLEL),
+                        action="append")
+    args = parser.parse_args()
+    readers = args.reader or [SIQReaders.MINIDOM, SIQReaders.ITERPARSE]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = pathlib.Path(tmp, f"pack_{size}.siq")
+            per_round = THEMES_PER_ROUND * QUESTIONS_PER_THEME
+            generate_siq(path, PackSpec(rounds=max(1, size // per_round), themes=THEMES_PER_ROUND,
+                                        questions=QUESTIONS_PER_THEME if size >= per_round
+                                        else max(1, size // THEMES_PER_ROUND)))
+            for reader in readers:
+                start = time.perf_counter()
+                doc = SIDocument.read_siq(path, reader=reader)
+                elapsed = time.perf_counter() - start
+                count = sum(len(theme.questions) for _round in doc.package.rounds for theme in _round.themes)
+                print(f"{reader:>10} {count:>7} questions: {elapsed:8.3f}s, {elapsed / count * 1e6:7.1f}us/question")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Deterministic generator of synthetic SI Game packages.
+
+    python -m benchmarks.generate --rounds 10 --themes 50 --questions 100 --media-size 65536 pack.siq
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import random
+from typing import List, NamedTuple
+from xml.sax.saxutils import escape, quoteattr
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+WORDS = ["вопрос", "ответ", "тема", "раунд", "игра", "question", "answer", "theme", "round", "pack"]
+
+# Atom type, media folder and file suffix of generated media
+MEDIA_KINDS = (("image", "Images", "jpg"), ("voice", "Audio", "mp3"), ("video", "Video", "mp4"))
+
+
+class PackSpec(NamedTuple):
+    rounds: int = 10
+    themes: int = 50
+    questions: int = 100
+    # Probabilities per question
+    info: float = 0.2
+    wrong: float = 0.2
+    oral: float = 0.1
+    media: float = 0.2
+    special: float = 0.1
+    # Distinct media files of each kind, atoms pick among them
+    media_files: int = 20
+    # Bytes per media file, no media members are written with 0
+    media_size: int = 0
+    seed: int = 0
+
+    @property
+    def question_count(self) -> int:
+        return self.rounds * self.themes * self.questions
+
+
+def _text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(words))
+
+
+def _info(rnd: random.Random) -> str:
+    return (f"<info><authors><author>{escape(_text(rnd, 2))}</author></authors>"
+            f"<sources><source>{escape(_text(rnd, 1))}</source></sources>"
+            f"<comments>{escape(_text(rnd, 5))}</comments></info>")
+
+
+def _question_type(rnd: random.Random, price: int) -> str:
+    kind = rnd.choice(("cat", "bagcat", "auction", "sponsored"))
+    if kind == "cat":
+        return (f'<type name="cat"><param name="theme">{escape(_text(rnd, 2))}</param>'
+                f'<param name="cost">{price}</param></type>')
+    if kind == "bagcat":
+        return (f'<type name="bagcat"><param name="theme">{escape(_text(rnd, 2))}</param>'
+                f'<param name="cost">0</param><param name="self">true</param>'
+                f'<param name="knows">after</param></type>')
+    return f'<type name="{kind}" />'
+
+
+def _media_atom(rnd: random.Random, spec: PackSpec) -> str:
+    atom_type, _, suffix = rnd.choice(MEDIA_KINDS)
+    time = ' time="10"' if atom_type != "image" and rnd.random() < 0.5 else ""
+    return f'<atom type="{atom_type}"{time}>@{atom_type}_{rnd.randrange(spec.media_files)}.{suffix}</atom>'
+
+
+def generate_content_xml(spec: PackSpec) -> str:
+    rnd = random.Random(spec.seed)
+    parts: List[str] = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<package name="Synthetic pack" version="4" id="synthetic" date="01.01.2024" difficulty="5" '
+        'publisher="benchmarks" language="ru" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd">',
+        "<tags><tag>synthetic</tag><tag>benchmark</tag></tags>",
+        _info(rnd),
+        "<rounds>",
+    ]
+    for r in range(spec.rounds):
+        final = ' type="final"' if r == spec.rounds - 1 and spec.rounds > 1 else ""
+        parts.append(f"<round name={quoteattr(f'Round {r + 1}')}{final}>{_info(rnd)}<themes>")
+        for t in range(spec.themes):
+            parts.append(f"<theme name={quoteattr(_text(rnd, 3))}>{_info(rnd)}<questions>")
+            for q in range(spec.questions):
+                price = (q + 1) * 100
+                parts.append(f'<question price="{price}">')
+                if rnd.random() < spec.info:
+                    parts.append(_info(rnd))
+                if rnd.random() < spec.special:
+                    parts.append(_question_type(rnd, price))
+                parts.append(f"<scenario><atom>{escape(_text(rnd, 12))}</atom>")
+                if rnd.random() < spec.oral:
+                    parts.append(f'<atom type="say">{escape(_text(rnd, 6))}</atom>')
+                if rnd.random() < spec.media:
+                    if rnd.random() < 0.3:
+                        # Media shown along with the answer
+                        parts.append('<atom type="marker" />')
+                    parts.append(_media_atom(rnd, spec))
+                parts.append(f"</scenario><right><answer>{escape(_text(rnd, 2))}</answer></right>")
+                if rnd.random() < spec.wrong:
+                    parts.append(f"<wrong><answer>{escape(_text(rnd, 2))}</answer></wrong>")
+                parts.append("</question>")
+            parts.append("</questions></theme>")
+        parts.append("</themes></round>")
+    parts.append("</rounds></package>")
+    return "\n".join(parts)
+
+
+def generate_siq(path: str | pathlib.Path, spec: PackSpec) -> None:
+    with ZipFile(path, "w", ZIP_DEFLATED) as zipfile:
+        zipfile.writestr("content.xml", generate_content_xml(spec).encode("utf-8"))
+        if spec.media_size <= 0:
+            return
+        rnd = random.Random(spec.seed)
+        for atom_type, folder, suffix in MEDIA_KINDS:
+            for i in range(spec.media_files):
+                # Random bytes do not compress, like real media
+                payload = rnd.getrandbits(spec.media_size * 8).to_bytes(spec.media_size, "little")
+                zipfile.writestr(f"{folder}/{atom_type}_{i}.{suffix}", payload, ZIP_STORED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SI Game package")
+    parser.add_argument("--rounds", "-r", type=int, default=10)
+    parser.add_argument("--themes", "-t", type=int, default=50)
+    parser.add_argument("--questions", "-q", type=int, default=100)
+    parser.add_argument("--media-files", type=int, default=20, help="Distinct media files of each kind")
+    parser.add_argument("--media-size", type=int, default=0, help="Bytes per media file")
+    parser.add_argument("--seed", "-s", type=int, default=0)
+    parser.add_argument("dst", type=pathlib.Path, metavar="DESTINATION")
+    args = parser.parse_args()
+    generate_siq(args.dst, PackSpec(rounds=args.rounds, themes=args.themes, questions=args.questions,
+                                    media_files=args.media_files, media_size=args.media_size, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Time and memory-profile every read/write path and format conversion on synthetic packs.
+Results are written as JSON, a previous result file can be given to compare against.
+
+    python -m benchmarks.run --questions 5000 50000 --output results.json
+    python -m benchmarks.run --questions 5000 50000 --compare results.json
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import fnmatch
+import gc
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple
+from zipfile import ZipFile
+
+from benchmarks.generate import PackSpec, generate_siq
+from sigame_tools import formats
+from sigame_tools.datatypes import SaveModes, SIDocument, SIDocumentTypes, SIQReaders, SIQWriters
+
+THEMES_PER_ROUND = 50
+QUESTIONS_PER_THEME = 100
+
+
+class Workspace(NamedTuple):
+    tmp: pathlib.Path
+    siq: pathlib.Path
+    jsiq: pathlib.Path
+    bsiq: pathlib.Path
+
+
+class Case(NamedTuple):
+    name: str
+    # Prepares the state passed to run, excluded from measurements
+    setup: Callable[[Workspace], Any]
+    run: Callable[[Workspace, Any], Any]
+    # Cases which take many times longer than the rest only run with --slow
+    slow: bool = False
+
+
+def _nothing(workspace: Workspace) -> None:
+    return None
+
+
+def _load_siq(workspace: Workspace) -> SIDocument:
+    return SIDocument.read_siq(workspace.siq)
+
+
+def _copy_siq(workspace: Workspace) -> SIDocument:
+    copy = workspace.tmp / "in_place.siq"
+    copy.write_bytes(workspace.siq.read_bytes())
+    doc = SIDocument.read_siq(copy)
+    doc.package.tags.append("edited")
+    return doc
+
+
+def _save_assets(raw: bool) -> Callable[[Workspace, SIDocument], None]:
+    def run(workspace: Workspace, doc: SIDocument) -> None:
+        with ZipFile(workspace.tmp / "assets.zip", "w") as zipfile:
+            doc.save_assets(zipfile, raw=raw)
+    return run
+
+
+CASES: List[Case] = [
+    Case("read_siq[iterparse]", _nothing, lambda w, _: SIDocument.read_siq(w.siq)),
+    Case("read_siq[minidom]", _nothing, lambda w, _: SIDocument.read_siq(w.siq, reader=SIQReaders.MINIDOM), True),
+    Case("read_siq[parallel]", _nothing, lambda w, _: SIDocument.read_siq(w.siq, reader=SIQReaders.PARALLEL)),
+    Case("read_siq[lazy]", _nothing, lambda w, _: SIDocument.read_siq(w.siq, lazy=True)),
+    Case("read_jsiq", _nothing, lambda w, _: SIDocument.read_jsiq(w.jsiq)),
+    Case("read_jsiq[lazy]", _nothing, lambda w, _: SIDocument.read_jsiq(w.jsiq, lazy=True)),
+    Case("read_bsiq", _nothing, lambda w, _: SIDocument.read_bsiq(w.bsiq)),
+    Case("save_siq[stream]", _load_siq, lambda w, doc: doc.save_siq(w.tmp / "out.siq")),
+    Case("save_siq[minidom]", _load_siq, lambda w, doc: doc.save_siq(w.tmp / "out.siq", writer=SIQWriters.MINIDOM),
+         True),
+    Case("save_jsiq", _load_siq, lambda w, doc: doc.save_jsiq(w.tmp / "out.jsiq.zip")),
+    Case("save_bsiq", _load_siq, lambda w, doc: doc.save_bsiq(w.tmp / "out.bsiq")),
+    Case("save_assets[raw]", _load_siq, _save_assets(True)),
+    Case("save_assets[recompress]", _load_siq, _save_assets(False)),
+    Case("save_in_place[append]", _copy_siq, lambda w, doc: doc.save_in_place(SaveModes.APPEND)),
+    Case("save_in_place[rewrite]", _copy_siq, lambda w, doc: doc.save_in_place(SaveModes.REWRITE)),
+    Case("convert[siq->jsiq]", _nothing,
+         lambda w, _: SIDocument.read_siq(w.siq).save_jsiq(w.tmp / "converted.jsiq.zip")),
+    Case("convert[jsiq->siq]", _nothing,
+         lambda w, _: SIDocument.read_jsiq(w.jsiq).save_siq(w.tmp / "converted.siq")),
+    Case("convert[siq->bsiq]", _nothing,
+         lambda w, _: SIDocument.read_siq(w.siq).save_bsiq(w.tmp / "converted.bsiq")),
+    Case("stream convert[siq->jsiq]", _nothing,
+         lambda w, _: formats.convert(w.siq, w.tmp / "streamed.jsiq.zip", "siq", "jsiq.zip")),
+]
+
+
+def measure(case: Case, workspace: Workspace, repeat: int) -> Dict[str, Any]:
+    times: List[float] = []
+    for _ in range(repeat):
+        state = case.setup(workspace)
+        gc.collect()
+        start = time.perf_counter()
+        case.run(workspace, state)
+        times.append(time.perf_counter() - start)
+        del state
+    # tracemalloc slows allocations down, so memory is measured by a separate run
+    state = case.setup(workspace)
+    gc.collect()
+    tracemalloc.start()
+    result = case.run(workspace, state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result, state
+    return {"min": min(times), "median": statistics.median(times), "times": times, "peak_bytes": peak}
+
+
+def git_commit() -> None | str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=pathlib.Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> int:
+    """
+    Print median time and peak memory ratios against a baseline, returning the number of regressions.
+    """
+    previous = {(r["case"], r["questions"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"Compared to {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    for result in results:
+        old = previous.get((result["case"], result["questions"]))
+        if old is None:
+            continue
+        time_ratio = result["median"] / old["median"] if old["median"] else 1.0
+        memory_ratio = result["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] else 1.0
+        regressed = time_ratio > threshold or memory_ratio > threshold
+        regressions += regressed
+        print(f"{result['case']:>24} {result['questions']:>7}: time x{time_ratio:5.2f}, memory x{memory_ratio:5.2f}"
+              f"{'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reading, writing and converting SI Game packages")
+    parser.add_argument("--questions", "-q", type=int, nargs="+", default=[5000, 50000],
+                        help="Approximate number of questions per pack")
+    parser.add_argument("--media-files", type=int, default=20, help="Distinct media files of each kind")
+    parser.add_argument("--media-size", type=int, default=1 << 16, help="Bytes per media file")
+    parser.add_argument("--repeat", "-n", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--case", "-c", action="append", help="Only run cases matching this pattern, e.g. 'read_*'")
+    parser.add_argument("--slow", action="store_true", help="Also run the DOM-based reader and writer")
+    parser.add_argument("--output", "-o", type=pathlib.Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=pathlib.Path, help="Compare with results of a previous run")
+    parser.add_argument("--threshold", type=float, default=1.1,
+                        help="Ratio to a previous run reported as a regression")
+    args = parser.parse_args()
+
+    cases = [case for case in CASES if (args.slow or not case.slow)
+             and (not args.case or any(fnmatch.fnmatch(case.name, pattern) for pattern in args.case))]
+    results: List[Dict[str, Any]] = []
+    specs: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.questions:
+            per_round = THEMES_PER_ROUND * QUESTIONS_PER_THEME
+            spec = PackSpec(rounds=max(1, size // per_round), themes=THEMES_PER_ROUND,
+                            questions=QUESTIONS_PER_THEME if size >= per_round else max(1, size // THEMES_PER_ROUND),
+                            media_files=args.media_files, media_size=args.media_size)
+            specs.append(spec._asdict())
+            workspace = Workspace(pathlib.Path(tmp), pathlib.Path(tmp, "pack.siq"), pathlib.Path(tmp, "pack.jsiq.zip"),
+                                  pathlib.Path(tmp, "pack.bsiq"))
+            generate_siq(workspace.siq, spec)
+            doc = SIDocument.read_siq(workspace.siq)
+            doc.save_as(workspace.jsiq, SIDocumentTypes.JSIQ)
+            doc.save_as(workspace.bsiq, SIDocumentTypes.BSIQ)
+            del doc
+            for case in cases:
+                result = {"case": case.name, "questions": spec.question_count,
+                          "siq_bytes": workspace.siq.stat().st_size, "jsiq_bytes": workspace.jsiq.stat().st_size,
+                          "bsiq_bytes": workspace.bsiq.stat().st_size,
+                          **measure(case, workspace, args.repeat)}
+                results.append(result)
+                print(f"{case.name:>24} {spec.question_count:>7} questions: {result['median']:8.3f}s, "
+                      f"{result['median'] / spec.question_count * 1e6:7.1f}us/question, "
+                      f"peak {result['peak_bytes'] / 2 ** 20:7.1f} MiB", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "specs": specs,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            if compare(results, json.load(fp), args.threshold):
+                raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
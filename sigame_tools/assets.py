@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import stat
+import tempfile
+import time
+from typing import IO, Dict, Iterable, List, NamedTuple, Tuple
+from urllib.parse import unquote
+from zipfile import ZipFile, ZipInfo
+
+from sigame_tools import helper
+from sigame_tools.datatypes import AtomTypes, Package, SIDocument
+from sigame_tools.index import cache_dir
+
+MEDIA_STORAGE_NAMES = {
+    AtomTypes.IMAGE: SIDocument.IMAGE_STORAGE_NAME,
+    AtomTypes.AUDIO: SIDocument.AUDIO_STORAGE_NAME,
+    AtomTypes.VIDEO: SIDocument.VIDEO_STORAGE_NAME,
+}
+# Lists the media members of a stripped package along with the blobs they are restored from
+MANIFEST_NAME = "assets.json"
+# Attributes of members restored from a manifest which does not list them, the same as ZipFile.writestr gives
+_DEFAULT_EXTERNAL_ATTR = 0o600 << 16
+_HASH_BUFSIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (path, name)
+);
+"""
+
+
+class MediaRef(NamedTuple):
+    name: str
+    round: int
+    theme: int
+    question: int
+
+    def __repr__(self) -> str:
+        return f"{self.name} (round {self.round + 1}, theme {self.theme + 1}, question {self.question + 1})"
+
+
+class MediaAsset(NamedTuple):
+    name: str
+    size: int
+    sha256: str
+
+
+class AssetInventory(NamedTuple):
+    path: str
+    assets: List[MediaAsset]
+    # Media referenced by atoms but absent from the package
+    missing: List[MediaRef]
+    # Media in Images/, Audio/ and Video/ which no atom references
+    orphaned: List[str]
+
+
+def normalize_member(name: str) -> str:
+    # SIGame stores member names URL-encoded, while atoms reference them as written
+    return unquote(name)
+
+
+def atom_member(atom_type: str, text: str) -> None | str:
+    """
+    Package member an atom refers to, None for text atoms and links to external files.
+    """
+    folder = MEDIA_STORAGE_NAMES.get(atom_type)
+    if folder is None or not text.startswith("@"):
+        return None
+    return f"{folder}/{text[1:]}"
+
+
+def media_references(package: Package) -> Dict[str, List[MediaRef]]:
+    references: Dict[str, List[MediaRef]] = {}
+    for round_i, _round in enumerate(package.rounds):
+        for theme_i, theme in enumerate(_round.themes):
+            for question_i, question in enumerate(theme.questions):
+                for atom in question.scenario:
+                    name = atom_member(atom.type, atom.text)
+                    if name is not None:
+                        references.setdefault(name, []).append(MediaRef(name, round_i, theme_i, question_i))
+    return references
+
+
+def hash_stream(fp: IO[bytes], sink: None | IO[bytes] = None) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: fp.read(_HASH_BUFSIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+        if sink is not None:
+            sink.write(chunk)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """
+    Content-addressed store of media files, each kept once under objects/<sha256[:2]>/<sha256[2:]>.
+    Blobs are read-only since packages exported with links share them.
+    """
+
+    def __init__(self, root: str | pathlib.Path) -> None:
+        self.root = pathlib.Path(root)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "tmp").mkdir(exist_ok=True)
+
+    def path(self, digest: str) -> pathlib.Path:
+        return self.root / "objects" / digest[:2] / digest[2:]
+
+    def __contains__(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def add(self, fp: IO[bytes]) -> Tuple[str, int, bool]:
+        """
+        Store the data of fp, returning its hash, its size and whether it was not stored before.
+        """
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=self.root / "tmp")
+        tmp = pathlib.Path(tmp_name)
+        try:
+            with os.fdopen(tmp_fd, "wb") as sink:
+                digest, size = hash_stream(fp, sink)
+            blob = self.path(digest)
+            if blob.exists():
+                tmp.unlink()
+                return digest, size, False
+            blob.parent.mkdir(exist_ok=True)
+            tmp.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp, blob)
+            return digest, size, True
+        except BaseException:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+
+    def add_member(self, zipfile: ZipFile, info: ZipInfo) -> Tuple[str, int, bool]:
+        with zipfile.open(info, "r") as fp:
+            return self.add(fp)
+
+    def link(self, digest: str, dst: pathlib.Path) -> None:
+        """
+        Hardlink a blob to dst, copying it when the store is on another file system.
+        """
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(self.path(digest), dst)
+        except OSError:
+            shutil.copyfile(self.path(digest), dst)
+
+
+class AssetHashCache:
+    """
+    Hashes of media members, reused while the package file keeps its size and mtime.
+    """
+
+    def __init__(self, path: None | str | pathlib.Path = None) -> None:
+        self.path = pathlib.Path(path) if path else cache_dir() / "assets.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> AssetHashCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def key(path: str | pathlib.Path) -> str:
+        return str(pathlib.Path(path).resolve())
+
+    def get(self, path: str | pathlib.Path) -> None | Dict[str, MediaAsset]:
+        file_stat = os.stat(path)
+        rows = self.db.execute("SELECT size, mtime_ns, name, file_size, sha256 FROM members WHERE path = ?",
+                               (self.key(path),)).fetchall()
+        if not rows or any(row[:2] != (file_stat.st_size, file_stat.st_mtime_ns) for row in rows):
+            return None
+        return {name: MediaAsset(name, file_size, sha256) for _, _, name, file_size, sha256 in rows}
+
+    def put(self, path: str | pathlib.Path, assets: Iterable[MediaAsset]) -> None:
+        file_stat = os.stat(path)
+        key = self.key(path)
+        with self.db:
+            self.db.execute("DELETE FROM members WHERE path = ?", (key,))
+            self.db.executemany("INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)",
+                                ((key, file_stat.st_size, file_stat.st_mtime_ns, asset.name, asset.size, asset.sha256)
+                                 for asset in assets))
+
+
+def hash_assets(path: str | pathlib.Path, cache: None | AssetHashCache = None,
+                store: None | BlobStore = None) -> List[MediaAsset]:
+    """
+    Hash every asset member of a package, adding them to store if given.
+    Members whose hash is cached and which are already in the store are not read at all.
+    """
+    cached = cache.get(path) if cache is not None else None
+    assets: List[MediaAsset] = []
+    with ZipFile(path, "r") as zipfile:
+        for info in zipfile.infolist():
+            if not SIDocument.is_asset(info.filename):
+                continue
+            asset = cached.get(info.filename) if cached else None
+            if asset is not None and asset.size == info.file_size and (store is None or asset.sha256 in store):
+                assets.append(asset)
+                continue
+            if store is not None:
+                digest, size, _ = store.add_member(zipfile, info)
+            else:
+                with zipfile.open(info, "r") as fp:
+                    digest, size = hash_stream(fp)
+            assets.append(MediaAsset(info.filename, size, digest))
+    if cache is not None and assets != list((cached or {}).values()):
+        cache.put(path, assets)
+    return assets
+
+
+def take_inventory(path: str | pathlib.Path, filetype: str, cache: None | AssetHashCache = None,
+                   store: None | BlobStore = None) -> AssetInventory:
+    assets = hash_assets(path, cache, store)
+    references = media_references(SIDocument.read_as(path, filetype).package)
+    present = {normalize_member(asset.name) for asset in assets}
+    missing = [ref for name, refs in references.items() if normalize_member(name) not in present for ref in refs]
+    referenced = {normalize_member(name) for name in references}
+    orphaned = [asset.name for asset in assets
+                if asset.name.partition("/")[0] in MEDIA_STORAGE_NAMES.values()
+                and normalize_member(asset.name) not in referenced]
+    return AssetInventory(str(path), assets, missing, orphaned)
+
+
+def strip_package(path: str | pathlib.Path, dst: str | pathlib.Path, assets: Iterable[MediaAsset]) -> None:
+    """
+    Write a copy of the package without its assets, listing them in assets.json instead.
+    The assets have to be in the store the package is later restored from.
+    """
+    with ZipFile(path, "r") as ziporigin, ZipFile(dst, "w") as zipfile:
+        manifest = {}
+        for asset in assets:
+            # Member attributes are kept so the restored member is the same, not a copy of the read-only blob
+            info = ziporigin.getinfo(asset.name)
+            manifest[asset.name] = {"sha256": asset.sha256, "size": asset.size, "date_time": info.date_time,
+                                    "compress_type": info.compress_type, "external_attr": info.external_attr}
+        for info in ziporigin.infolist():
+            if SIDocument.is_asset(info.filename) or info.filename == MANIFEST_NAME:
+                continue
+            if helper.can_copy_raw(info):
+                helper.copy_member_raw(ziporigin, zipfile, info)
+            else:
+                with ziporigin.open(info, "r") as from_file, zipfile.open(info.filename, "w") as to_file:
+                    shutil.copyfileobj(from_file, to_file)
+        zipfile.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+def restore_package(path: str | pathlib.Path, dst: str | pathlib.Path, store: BlobStore) -> None:
+    """
+    Rebuild a full package from a stripped one and the blob store.
+    """
+    with ZipFile(path, "r") as ziporigin, ZipFile(dst, "w") as zipfile:
+        manifest: Dict[str, Dict[str, str | int]] = json.loads(ziporigin.read(MANIFEST_NAME))
+        missing = [name for name, entry in manifest.items() if entry["sha256"] not in store]
+        if missing:
+            raise ValueError(f"Restore error: {len(missing)} assets are not in the store, e.g. '{missing[0]}'")
+        for info in ziporigin.infolist():
+            if info.filename == MANIFEST_NAME:
+                continue
+            if helper.can_copy_raw(info):
+                helper.copy_member_raw(ziporigin, zipfile, info)
+            else:
+                with ziporigin.open(info, "r") as from_file, zipfile.open(info.filename, "w") as to_file:
+                    shutil.copyfileobj(from_file, to_file)
+        for name, entry in manifest.items():
+            info = ZipInfo(name, tuple(entry.get("date_time", time.localtime()[:6])))
+            info.compress_type = entry.get("compress_type", zipfile.compression)
+            info.external_attr = entry.get("external_attr", _DEFAULT_EXTERNAL_ATTR)
+            info.file_size = entry["size"]
+            with open(store.path(entry["sha256"]), "rb") as from_file, zipfile.open(info, "w") as to_file:
+                shutil.copyfileobj(from_file, to_file)
+
+
+def link_package(path: str | pathlib.Path, dst: str | pathlib.Path, assets: Iterable[MediaAsset],
+                 store: BlobStore) -> None:
+    """
+    Unpack the package into the dst directory, with assets hardlinked from the store instead of extracted.
+    """
+    dst = pathlib.Path(dst)
+    dst.mkdir(parents=True, exist_ok=True)
+    with ZipFile(path, "r") as zipfile:
+        for info in zipfile.infolist():
+            if not SIDocument.is_asset(info.filename):
+                zipfile.extract(info, dst)
+    for asset in assets:
+        parts = pathlib.PurePosixPath(asset.name).parts
+        if ".." in parts or pathlib.PurePosixPath(asset.name).is_absolute():
+            raise ValueError(f"Export error: Unsafe member name: '{asset.name}'")
+        target = dst.joinpath(*parts)
+        if target.exists():
+            target.unlink()
+        store.link(asset.sha256, target)
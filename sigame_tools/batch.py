@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pathlib
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.queues import SimpleQueue
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from sigame_tools import formats
+
+
+class ConversionJob(NamedTuple):
+    src: pathlib.Path
+    dst: pathlib.Path
+    # Empty to sniff the format of src
+    input_type: str
+    output_type: str
+
+
+class ConversionResult(NamedTuple):
+    job: ConversionJob
+    size: int
+    elapsed: float
+    error: None | str = None
+
+
+def convert_file(job: ConversionJob, options: Dict[str, Any]) -> ConversionResult:
+    start = time.perf_counter()
+    size = 0
+    try:
+        size = job.src.stat().st_size
+        job.dst.parent.mkdir(parents=True, exist_ok=True)
+        formats.convert(job.src, job.dst, job.input_type, job.output_type, **options)
+    except Exception as e:
+        return ConversionResult(job, size, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return ConversionResult(job, size, time.perf_counter() - start)
+
+
+def largest_first(jobs: Iterable[ConversionJob]) -> List[ConversionJob]:
+    # Starting big packs first keeps a few of them from running alone at the end
+    def size(job: ConversionJob) -> int:
+        try:
+            return job.src.stat().st_size
+        except OSError:
+            return 0
+    return sorted(jobs, key=size, reverse=True)
+
+
+# Queue worker processes report the index of each job they start on
+_started: None | SimpleQueue = None
+
+
+def _init_worker(started: SimpleQueue) -> None:
+    global _started
+    _started = started
+
+
+def _convert_reported(index: int, job: ConversionJob, options: Dict[str, Any]) -> ConversionResult:
+    _started.put(index)
+    return convert_file(job, options)
+
+
+def _run_pool(jobs: Dict[int, ConversionJob], workers: int, options: Dict[str, Any],
+              started: SimpleQueue) -> Iterator[Tuple[int, ConversionResult | BrokenProcessPool]]:
+    # Yields results by job index, jobs lost to a dead worker along with the error
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started,)) as executor:
+        futures: Dict[Future, int] = {executor.submit(_convert_reported, index, job, options): index
+                                      for index, job in jobs.items()}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result()
+            except BrokenProcessPool as e:
+                yield index, e
+            except Exception as e:
+                yield index, ConversionResult(jobs[index], 0, 0.0, f"{type(e).__name__}: {e}")
+
+
+def convert_many(jobs: Iterable[ConversionJob], workers: None | int = None,
+                 options: None | Dict[str, Any] = None) -> Iterator[ConversionResult]:
+    """
+    Convert packages in a process pool, yielding results as they complete.
+    Errors are reported per file and never stop the remaining conversions.
+    When a worker dies (e.g. killed for memory), the pool breaks and every unfinished job with it.
+    Jobs which had not started yet go to a new pool, the ones running at the time are run again one by one,
+    and only a job breaking the pool on its own is reported as failed.
+    """
+    options = options or {}
+    jobs = largest_first(jobs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            yield convert_file(job, options)
+        return
+    started = multiprocessing.get_context().SimpleQueue()
+    pending: Dict[int, ConversionJob] = dict(enumerate(jobs))
+    suspects: Dict[int, ConversionJob] = {}
+    while pending or suspects:
+        alone = not pending
+        if alone:
+            index = next(iter(suspects))
+            run, pool_size = {index: suspects.pop(index)}, 1
+        else:
+            run, pending, pool_size = pending, {}, workers
+        broken: Dict[int, BrokenProcessPool] = {}
+        for index, result in _run_pool(run, pool_size, options, started):
+            if isinstance(result, BrokenProcessPool):
+                broken[index] = result
+            else:
+                yield result
+        running = set()
+        while not started.empty():
+            running.add(started.get())
+        for index, e in broken.items():
+            if alone:
+                yield ConversionResult(run[index], 0, 0.0, f"{type(e).__name__}: {e}")
+            elif index in running:
+                suspects[index] = run[index]
+            else:
+                pending[index] = run[index]
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Tuple
+
+from sigame_tools.datatypes import Atom, InfoOwner, Package, Question, QuestionType, QuestionTypes, Round, Theme
+
+MAGIC = b"SIQB"
+FORMAT_VERSION = 1
+# Magic, format version and number of sections, followed by the byte length of each section
+_HEADER = struct.Struct("<4sHH")
+
+# Every section but strings is a flat array of little-endian int32 values, read as records of the given width.
+# Strings are indices into the string table, records follow each other in document order and their children
+# are taken from the next records of the child section, counts tell how many.
+RECORD_WIDTHS: Dict[str, int] = {
+    # name, id, restriction, date, publisher, logo, language, version, difficulty, has info, rounds, tags
+    "package": 12,
+    # Tag strings
+    "tags": 1,
+    # Authors, sources, comments string
+    "infos": 3,
+    # Author and source strings of infos
+    "info_strings": 1,
+    # name, final, has info, themes
+    "rounds": 4,
+    # name, has info, questions
+    "themes": 3,
+    # price, has type, has info, atoms, right answers, wrong answers
+    "questions": 6,
+    # name, params
+    "types": 2,
+    # key and value strings
+    "params": 2,
+    # type, text, time kind, time (kind 0: no time, 1: integer time, 2: time string)
+    "atoms": 4,
+    # Right then wrong answer strings of each question
+    "answers": 1,
+}
+SECTIONS = ("strings",) + tuple(RECORD_WIDTHS)
+_SWAP = sys.byteorder != "little"
+
+
+class _Encoder:
+    def __init__(self) -> None:
+        # Insertion ordered, so the index of a string is its position in the table
+        self.strings: Dict[str, int] = {}
+        self.arrays: Dict[str, array] = {name: array("i") for name in RECORD_WIDTHS}
+
+    def string(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            if "\0" in value:
+                raise ValueError("Save error: Strings with NUL characters can't be stored in binary packages")
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def info(self, owner: InfoOwner) -> int:
+        if not owner.has_info:
+            return 0
+        info = owner.info
+        self.arrays["infos"].extend((len(info.authors), len(info.sources), self.string(info.comments)))
+        self.arrays["info_strings"].extend(self.string(value) for value in (*info.authors, *info.sources))
+        return 1
+
+    def question(self, question: Question) -> None:
+        q_type = question.q_type
+        has_type = q_type.name != QuestionTypes.SIMPLE or len(q_type) != 0
+        if has_type:
+            self.arrays["types"].extend((self.string(q_type.name), len(q_type)))
+            for key, value in q_type.items():
+                self.arrays["params"].extend((self.string(key), self.string(value)))
+        has_info = self.info(question)
+        atoms = self.arrays["atoms"]
+        for atom in question.scenario:
+            time = atom.time
+            if not time:
+                atoms.extend((self.string(atom.type), self.string(atom.text), 0, 0))
+            elif isinstance(time, int):
+                atoms.extend((self.string(atom.type), self.string(atom.text), 1, time))
+            else:
+                atoms.extend((self.string(atom.type), self.string(atom.text), 2, self.string(str(time))))
+        self.arrays["answers"].extend(self.string(answer) for answer in (*question.right, *question.wrong))
+        self.arrays["questions"].extend((question.price, has_type, has_info, len(question.scenario),
+                                         len(question.right), len(question.wrong)))
+
+    def package(self, package: Package, rounds: Iterable[Round]) -> None:
+        has_info = self.info(package)
+        self.arrays["tags"].extend(self.string(tag) for tag in package.tags)
+        n_rounds = 0
+        for _round in rounds:
+            n_rounds += 1
+            round_has_info = self.info(_round)
+            for theme in _round.themes:
+                theme_has_info = self.info(theme)
+                for question in theme.questions:
+                    self.question(question)
+                self.arrays["themes"].extend((self.string(theme.name), theme_has_info, len(theme.questions)))
+            self.arrays["rounds"].extend((self.string(_round.name), int(_round.final), round_has_info,
+                                          len(_round.themes)))
+        self.arrays["package"].extend((
+            self.string(package.name), self.string(package.id), self.string(package.restriction),
+            self.string(package.date), self.string(package.publisher), self.string(package.logo),
+            self.string(package.language), self.string(repr(float(package.version))), int(package.difficulty),
+            has_info, n_rounds, len(package.tags),
+        ))
+
+
+def write_package(fp: IO[bytes], package: Package, rounds: None | Iterable[Round] = None) -> None:
+    """
+    Write the package as a string table followed by flat arrays of fixed-width integer records.
+    Rounds are taken from the given iterable instead of package.rounds if there is one.
+    """
+    encoder = _Encoder()
+    try:
+        encoder.package(package, package.rounds if rounds is None else rounds)
+    except OverflowError:
+        raise ValueError("Save error: Prices and atom times have to fit in 32 bits for binary packages")
+    sections = ["\0".join(encoder.strings).encode("utf-8")]
+    for name in RECORD_WIDTHS:
+        values = encoder.arrays[name]
+        if _SWAP:
+            values.byteswap()
+        sections.append(values.tobytes())
+    fp.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+    fp.write(struct.pack(f"<{len(sections)}I", *(len(section) for section in sections)))
+    for section in sections:
+        fp.write(section)
+
+
+# Columns of each section holding indices into the string table, atom times are checked by their kind
+STRING_COLUMNS: Dict[str, Tuple[int, ...]] = {
+    "package": (0, 1, 2, 3, 4, 5, 6, 7),
+    "tags": (0,),
+    "infos": (2,),
+    "info_strings": (0,),
+    "rounds": (0,),
+    "themes": (0,),
+    "types": (0,),
+    "params": (0, 1),
+    "atoms": (0, 1),
+    "answers": (0,),
+}
+
+# Columns of child counts and of 0/1 flags
+COUNT_COLUMNS = (("package", 10), ("package", 11), ("infos", 0), ("infos", 1), ("rounds", 3), ("themes", 2),
+                 ("questions", 3), ("questions", 4), ("questions", 5), ("types", 1))
+FLAG_COLUMNS = (("package", 9), ("rounds", 1), ("rounds", 2), ("themes", 1), ("questions", 1), ("questions", 2))
+
+
+def _read_sections(data: bytes) -> Tuple[List[str], Dict[str, array]]:
+    if len(data) < _HEADER.size:
+        raise ValueError("Read error: Truncated binary package")
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Read error: Not a binary SIQ package")
+    if version != FORMAT_VERSION or count != len(SECTIONS):
+        raise ValueError(f"Read error: Unsupported binary package version {version}")
+    pos = _HEADER.size + 4 * count
+    if pos > len(data):
+        raise ValueError("Read error: Truncated binary package")
+    lengths = struct.unpack_from(f"<{count}I", data, _HEADER.size)
+    if pos + sum(lengths) > len(data):
+        raise ValueError("Read error: Truncated binary package")
+    if pos + sum(lengths) < len(data):
+        raise ValueError("Read error: Trailing bytes after binary package")
+    view = memoryview(data)
+    try:
+        strings = str(view[pos:pos + lengths[0]], "utf-8").split("\0")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Read error: Malformed string table: {e}")
+    pos += lengths[0]
+    arrays: Dict[str, array] = {}
+    for (name, width), length in zip(RECORD_WIDTHS.items(), lengths[1:]):
+        if length % (4 * width):
+            raise ValueError(f"Read error: Truncated {name} section")
+        values = array("i")
+        values.frombytes(view[pos:pos + length])
+        if _SWAP:
+            values.byteswap()
+        arrays[name] = values
+        pos += length
+    _check_sections(len(strings), arrays)
+    return strings, arrays
+
+
+def _check_sections(n_strings: int, arrays: Dict[str, array]) -> None:
+    """
+    Check string indices and that every section has exactly the records the counts of its parents ask for,
+    so a broken package fails before anything is built instead of losing records or reading the wrong ones.
+    """
+    def column(name: str, i: int) -> array:
+        return arrays[name][i::RECORD_WIDTHS[name]]
+
+    def records(name: str) -> int:
+        return len(arrays[name]) // RECORD_WIDTHS[name]
+
+    if records("package") != 1:
+        raise ValueError("Read error: Binary package has to have a single package record")
+    for name, columns in STRING_COLUMNS.items():
+        for i in columns:
+            values = column(name, i)
+            if values and (min(values) < 0 or max(values) >= n_strings):
+                raise ValueError(f"Read error: String index out of range in {name} section")
+    kinds, times = column("atoms", 2), column("atoms", 3)
+    if kinds and (min(kinds) < 0 or max(kinds) > 2):
+        raise ValueError("Read error: Unknown atom time kind")
+    if any(kind == 2 and not 0 <= time < n_strings for kind, time in zip(kinds, times)):
+        raise ValueError("Read error: String index out of range in atoms section")
+    for name, i in COUNT_COLUMNS:
+        values = column(name, i)
+        if values and min(values) < 0:
+            raise ValueError(f"Read error: Negative count in {name} section")
+    for name, i in FLAG_COLUMNS:
+        values = column(name, i)
+        if values and (min(values) < 0 or max(values) > 1):
+            raise ValueError(f"Read error: Malformed flag in {name} section")
+    package = arrays["package"]
+    expected = {
+        "tags": package[11],
+        "rounds": package[10],
+        "themes": sum(column("rounds", 3)),
+        "questions": sum(column("themes", 2)),
+        "types": sum(column("questions", 1)),
+        "params": sum(column("types", 1)),
+        "atoms": sum(column("questions", 3)),
+        "answers": sum(column("questions", 4)) + sum(column("questions", 5)),
+        "infos": package[9] + sum(column("rounds", 2)) + sum(column("themes", 1)) + sum(column("questions", 2)),
+        "info_strings": sum(column("infos", 0)) + sum(column("infos", 1)),
+    }
+    for name, count in expected.items():
+        if records(name) != count:
+            raise ValueError(f"Read error: {name} section has {records(name)} records, {count} expected")
+
+
+def _records(values: array, width: int) -> Iterator[tuple]:
+    if width == 1:
+        return iter(values)
+    return zip(*[iter(values)] * width)
+
+
+def stream_package(data: bytes) -> Tuple[Package, Iterator[Round]]:
+    """
+    Build a Package without rounds from a binary package content, returning its rounds as an iterator
+    which builds them one at a time.
+    """
+    strings, arrays = _read_sections(data)
+    records = {name: _records(values, RECORD_WIDTHS[name]) for name, values in arrays.items()}
+    infos, info_strings = records["infos"], records["info_strings"]
+    types, params, atoms, answers = records["types"], records["params"], records["atoms"], records["answers"]
+
+    def read_info(owner: InfoOwner) -> None:
+        authors, sources, comments = next(infos)
+        info = owner.info
+        info.authors.extend([strings[i] for i in islice(info_strings, authors)])
+        info.sources.extend([strings[i] for i in islice(info_strings, sources)])
+        info.comments = strings[comments]
+
+    def read_type() -> QuestionType:
+        name, n_params = next(types)
+        q_type = QuestionType(strings[name])
+        for key, value in islice(params, n_params):
+            q_type[strings[key]] = strings[value]
+        return q_type
+
+    def read_questions(count: int) -> List[Question]:
+        questions: List[Question] = []
+        for price, has_type, has_info, n_atoms, n_right, n_wrong in islice(records["questions"], count):
+            question = Question(read_type() if has_type else None, price)
+            if has_info:
+                read_info(question)
+            question.scenario.extend([
+                Atom(strings[text], strings[a_type], time if kind == 1 else strings[time] if kind == 2 else 0)
+                for a_type, text, kind, time in islice(atoms, n_atoms)
+            ])
+            if n_right:
+                question.right.extend([strings[i] for i in islice(answers, n_right)])
+            if n_wrong:
+                question.wrong.extend([strings[i] for i in islice(answers, n_wrong)])
+            questions.append(question)
+        return questions
+
+    (name, p_id, restriction, date, publisher, logo, language, version, difficulty,
+     has_info, n_rounds, n_tags) = next(records["package"])
+    package = Package(strings[name])
+    package.id, package.restriction, package.date = strings[p_id], strings[restriction], strings[date]
+    package.publisher, package.logo, package.language = strings[publisher], strings[logo], strings[language]
+    package.version, package.difficulty = float(strings[version]), difficulty
+    package.tags.extend([strings[i] for i in islice(records["tags"], n_tags)])
+    if has_info:
+        read_info(package)
+
+    def read_rounds() -> Iterator[Round]:
+        for r_name, final, r_has_info, n_themes in islice(records["rounds"], n_rounds):
+            _round = Round(strings[r_name], bool(final))
+            if r_has_info:
+                read_info(_round)
+            for t_name, t_has_info, n_questions in islice(records["themes"], n_themes):
+                theme = Theme(strings[t_name])
+                if t_has_info:
+                    read_info(theme)
+                theme.questions.extend(read_questions(n_questions))
+                _round.themes.append(theme)
+            yield _round
+
+    return package, read_rounds()
+
+
+def read_package(data: bytes) -> Package:
+    """
+    Build a Package from a binary package content.
+    """
+    package, rounds = stream_package(data)
+    package.rounds.extend(rounds)
+    return package
@@ -1,19 +1,31 @@
 from __future__ import annotations
 
 import argparse
+import glob
+import itertools
+import json
+import os
 import pathlib
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
 
+from sigame_tools import formats, profiling
+from sigame_tools.batch import ConversionJob, convert_many as run_conversions
 from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+from sigame_tools.index import PackageIndex, SORT_KEYS
+from sigame_tools.search import SearchIndex
+from sigame_tools.validate import RULES
 
+# A live view, so formats registered before arguments are parsed are accepted too
+FILE_TYPES = formats.FORMATS.keys()
 
-def guess_type(file: str | pathlib.Path) -> str:
-    if isinstance(file, pathlib.Path):
-        file: str = file.name
-    if file.endswith(".jsiq.zip"):
-        return SIDocumentTypes.JSIQ
-    if file.endswith(".siq"):
-        return SIDocumentTypes.SIQ
-    return ""
+
+def guess_type(file: str | pathlib.Path, sniff: bool = True) -> str:
+    # Existing inputs are sniffed, so misnamed packages are read correctly. Outputs go by name only,
+    # a file about to be overwritten says nothing of the format wanted
+    fmt = formats.guess(file) if sniff else formats.from_suffix(pathlib.Path(file).name)
+    return fmt.name if fmt is not None else ""
 
 
 def query(args):
@@ -21,8 +33,13 @@ def query(args):
     input_type = args.in_type or guess_type(src)
     if not input_type:
         raise ValueError(f"Unable to guess type for file {src}")
-    si_doc: SIDocument = SIDocument.read_as(src, input_type)
-    print(si_doc.package)
+    if args.no_index:
+        si_doc: SIDocument = SIDocument.read_as(src, input_type, lazy=True)
+        print(si_doc.package)
+        return
+    with PackageIndex(args.index) as index:
+        summary = index.lookup(src) or index.update(src, input_type)[0]
+    print(summary)
 
 
 def convert(args):
@@ -31,32 +48,319 @@ def convert(args):
         raise ValueError(f"'{src}' is a Directory")
     dst: pathlib.Path = args.dst
     input_type = args.in_type or guess_type(src)
-    output_type = "" if dst.is_dir() else args.out_type or guess_type(dst)
+    output_type = "" if dst.is_dir() else args.out_type or guess_type(dst, sniff=False)
     if not input_type:
         raise ValueError(f"Unable to guess type for input file '{src}'")
     if not output_type:
         if dst.is_dir():
             raise ValueError(f"'{dst}' is a Directory, please specify full path or provide file type")
         raise ValueError(f"Unable to guess type for output file '{dst}'")
+    options = {"store_media": args.store_media}
+    if args.indent is not None:
+        if output_type != SIDocumentTypes.JSIQ:
+            raise ValueError(f"--indent is only supported for {SIDocumentTypes.JSIQ} output")
+        options["indent"] = args.indent
     print(f"Converting from {input_type} to {output_type} ...")
-    si_doc: SIDocument = SIDocument.read_as(src, input_type)
-    print("Load successful")
-    si_doc.save_as(dst, output_type)
-    print("Save successful")
+    formats.convert(src, dst, input_type, output_type, **options)
+    print("Conversion successful")
+
+
+def glob_base(pattern: str) -> pathlib.Path:
+    # Leading part of a glob pattern without wildcards, e.g. "packs/2024" for "packs/2024/**/*.siq"
+    parts = pathlib.Path(pattern).parts
+    base = [part for part in itertools.takewhile(lambda part: not glob.has_magic(part), parts[:-1])]
+    return pathlib.Path(*base)
+
+
+def find_sources(sources: List[str], input_type: None | str) -> Iterator[Tuple[pathlib.Path, pathlib.Path]]:
+    """
+    Expand directories and glob patterns into package files of input_type, or of any type without it.
+    Yields each file along with its path relative to the searched directory, or to the part of the glob pattern
+    before its first wildcard.
+    """
+    def is_package(file: pathlib.Path) -> bool:
+        # Other files found in directories and by patterns are skipped
+        file_type = guess_type(file) if file.is_file() else ""
+        return bool(file_type) and (not input_type or file_type == input_type)
+
+    for source in sources:
+        path = pathlib.Path(source)
+        if path.is_dir():
+            for file in sorted(path.rglob("*")):
+                if is_package(file):
+                    yield file, file.relative_to(path)
+        elif glob.has_magic(source):
+            base = glob_base(source)
+            for name in sorted(glob.glob(source, recursive=True)):
+                file = pathlib.Path(name)
+                if is_package(file):
+                    yield file, file.relative_to(base)
+        elif path.is_file():
+            yield path, pathlib.Path(path.name)
+        else:
+            raise ValueError(f"'{source}' does not exist")
+
+
+def output_name(name: str, input_type: str, output_type: str) -> str:
+    suffix = formats.get_format(input_type).suffix
+    stem = name[:-len(suffix)] if name.endswith(suffix) else pathlib.Path(name).stem
+    return stem + formats.get_format(output_type).suffix
+
+
+def convert_many(args):
+    dst: pathlib.Path = args.dst
+    if dst.exists() and not dst.is_dir():
+        raise ValueError(f"'{dst}' is not a Directory")
+    jobs: List[ConversionJob] = []
+    # Sources by resolved target, two jobs must never write the same file
+    targets: Dict[pathlib.Path, pathlib.Path] = {}
+    sources = set()
+    for src, relative in find_sources(args.src, args.in_type):
+        if src.resolve() in sources:
+            # Matched by more than one source argument
+            continue
+        sources.add(src.resolve())
+        input_type = args.in_type or guess_type(src)
+        if not input_type:
+            raise ValueError(f"Unable to guess type for input file '{src}'")
+        target = dst / relative.with_name(output_name(relative.name, input_type, args.out_type))
+        if target.resolve() == src.resolve():
+            raise ValueError(f"'{src}' would be overwritten by its own conversion")
+        other = targets.setdefault(target.resolve(), src)
+        if other is not src:
+            raise ValueError(f"'{other}' and '{src}' would both be converted to '{target}'")
+        jobs.append(ConversionJob(src, target, input_type, args.out_type))
+    if not jobs:
+        raise ValueError("No SI Game packages found")
+
+    workers = args.jobs or os.cpu_count() or 1
+    print(f"Converting {len(jobs)} files to {args.out_type} with {workers} workers ...")
+    start = time.perf_counter()
+    total_bytes = 0
+    failed: List[str] = []
+    for i, result in enumerate(run_conversions(jobs, workers, {"store_media": args.store_media}), start=1):
+        total_bytes += result.size
+        prefix = f"[{i}/{len(jobs)}]"
+        if result.error:
+            failed.append(f"{result.job.src}: {result.error}")
+            print(f"{prefix} FAILED {result.job.src}: {result.error}")
+        else:
+            print(f"{prefix} {result.job.src} -> {result.job.dst} "
+                  f"({result.size / 2 ** 20:.1f} MiB, {result.elapsed:.2f}s)")
+    elapsed = time.perf_counter() - start
+    print(f"Converted {len(jobs) - len(failed)}/{len(jobs)} files in {elapsed:.2f}s: "
+          f"{len(jobs) / elapsed:.2f} files/s, {total_bytes / 2 ** 20 / elapsed:.2f} MiB/s")
+    if failed:
+        print(f"{len(failed)} files failed:")
+        for line in failed:
+            print(f"  {line}")
+        raise SystemExit(1)
+
+
+def index_packages(args):
+    parsed = unchanged = 0
+    failed: List[str] = []
+    files = [src for src, _ in find_sources(args.src, args.in_type)]
+    with PackageIndex(args.index) as index, SearchIndex(args.search_index) as search_index:
+        for src in files:
+            input_type = args.in_type or guess_type(src)
+            try:
+                _, updated = index.update(src, input_type)
+                if not args.no_search:
+                    updated = search_index.update(src, input_type) or updated
+            except Exception as e:
+                failed.append(f"{src}: {type(e).__name__}: {e}")
+                continue
+            if updated:
+                parsed += 1
+            else:
+                unchanged += 1
+        removed = index.prune(files)
+        if not args.no_search:
+            search_index.prune(files)
+    print(f"Indexed {parsed + unchanged} packages: {parsed} parsed, {unchanged} unchanged, {removed} removed")
+    for line in failed:
+        print(f"FAILED {line}")
+    if failed:
+        raise SystemExit(1)
+
+
+def list_packages(args):
+    with PackageIndex(args.index) as index:
+        summaries = index.find(name=args.name, author=args.author, tag=args.tag, question_type=args.type,
+                               order_by=args.sort, descending=args.reverse)
+    for summary in summaries:
+        prices = "" if summary.min_price is None else f", prices {summary.min_price}-{summary.max_price}"
+        tags = f", tags: {', '.join(summary.tags)}" if summary.tags else ""
+        print(f"{summary.path}: {summary.name} ({len(summary.rounds)} rounds, {summary.themes} themes, "
+              f"{summary.questions} questions{prices}){tags}")
+
+
+def search(args):
+    with SearchIndex(args.search_index) as search_index:
+        start = time.perf_counter()
+        hits = search_index.search(" ".join(args.query), limit=args.limit or None)
+        elapsed = time.perf_counter() - start
+    for hit in hits:
+        print(hit)
+    print(f"{len(hits)} questions found in {elapsed * 1000:.1f}ms")
+
+
+def dedupe(args):
+    from sigame_tools import dedupe as dedupe_module
+    packs = []
+    for src, _ in find_sources(args.src, args.in_type):
+        try:
+            packs.append(dedupe_module.load_signatures(src, args.in_type or guess_type(src)))
+        except ImportError:
+            raise
+        except Exception as e:
+            print(f"FAILED {src}: {type(e).__name__}: {e}")
+    clusters = dedupe_module.find_duplicates(packs, args.threshold)
+    for cluster in clusters:
+        print(f"{len(cluster.questions)} similar questions (similarity >= {cluster.similarity:.2f}):")
+        for question in cluster.questions:
+            print(f"  {question}")
+    print(f"{len(clusters)} clusters found in {sum(len(pack.signatures) for pack in packs)} questions "
+          f"of {len(packs)} packages")
+
+
+def export(args):
+    from sigame_tools.columnar import CorpusWriter
+    start = time.perf_counter()
+    with CorpusWriter(args.dst) as writer:
+        for src, _ in find_sources(args.src, args.in_type):
+            try:
+                package = SIDocument.read_as(src, args.in_type or guess_type(src)).package
+            except Exception as e:
+                print(f"FAILED {src}: {type(e).__name__}: {e}")
+                continue
+            writer.add(str(src.resolve()), package)
+    rows = writer.rows
+    print(f"Exported {rows['packs']} packages, {rows['questions']} questions and {rows['atoms']} atoms "
+          f"to {args.dst} in {time.perf_counter() - start:.2f}s")
+
+
+def assets(args):
+    from sigame_tools import assets as assets_module
+    store = assets_module.BlobStore(args.store) if args.store else None
+    if args.export and store is None:
+        raise ValueError("--export requires --store")
+    total_files = total_bytes = problems = 0
+    unique: Dict[str, int] = {}
+    with assets_module.AssetHashCache(args.cache) as cache:
+        for src, relative in find_sources(args.src, args.in_type):
+            input_type = args.in_type or guess_type(src)
+            try:
+                inventory = assets_module.take_inventory(src, input_type, cache, store)
+            except Exception as e:
+                print(f"FAILED {src}: {type(e).__name__}: {e}")
+                problems += 1
+                continue
+            size = sum(asset.size for asset in inventory.assets)
+            total_files += len(inventory.assets)
+            total_bytes += size
+            unique.update((asset.sha256, asset.size) for asset in inventory.assets)
+            problems += len(inventory.missing) + len(inventory.orphaned)
+            print(f"{src}: {len(inventory.assets)} files ({size / 2 ** 20:.1f} MiB), "
+                  f"{len(inventory.missing)} missing, {len(inventory.orphaned)} orphaned")
+            for ref in inventory.missing:
+                print(f"  missing {ref}")
+            for name in inventory.orphaned:
+                print(f"  orphaned {name}")
+            if args.export:
+                target = args.export / relative
+                if args.link:
+                    assets_module.link_package(src, target.with_name(target.name + ".d"), inventory.assets, store)
+                else:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    assets_module.strip_package(src, target, inventory.assets)
+    print(f"{total_files} asset files ({total_bytes / 2 ** 20:.1f} MiB), {len(unique)} unique "
+          f"({sum(unique.values()) / 2 ** 20:.1f} MiB)")
+    if args.strict and problems:
+        raise SystemExit(1)
+
+
+def validate(args):
+    from sigame_tools import validate as validate_module
+    rules = [RULES[name] for name in args.rule] if args.rule else RULES.values()
+    checked = invalid = 0
+    for src, _ in find_sources(args.src, args.in_type):
+        input_type = args.in_type or guess_type(src)
+        problems = validate_module.validate(src, input_type, rules, fail_fast=args.fail_fast)
+        checked += 1
+        if not problems:
+            if not args.quiet:
+                print(f"{src}: OK")
+            continue
+        invalid += 1
+        print(f"{src}: {'FAILED' if args.fail_fast else f'{len(problems)} problems'}")
+        for problem in problems:
+            print(f"  {problem}")
+    print(f"{checked - invalid}/{checked} packages valid")
+    if invalid:
+        raise SystemExit(1)
+
+
+def diff(args):
+    from sigame_tools import diff as diff_module
+    paths = ([args.base] if args.base else []) + [args.old, args.new]
+    types = []
+    for path in paths:
+        file_type = args.in_type or guess_type(path)
+        if not file_type:
+            raise ValueError(f"Unable to guess type for input file '{path}'")
+        types.append(file_type)
+    if args.base is None:
+        if args.output:
+            raise ValueError("--output requires --base")
+        changes = diff_module.diff_files(args.old, types[0], args.new, types[1])
+        for change in changes:
+            print(change)
+        print(f"{len(changes)} changes")
+        return
+    if not args.output:
+        raise ValueError("--base requires --output")
+    output_type = args.out_type or guess_type(args.output, sniff=False)
+    if not output_type:
+        raise ValueError(f"Unable to guess type for output file '{args.output}'")
+    conflicts = diff_module.merge_files(args.base, args.old, args.new, args.output, tuple(types), output_type)
+    for conflict in conflicts:
+        print(conflict)
+    print(f"Merged into {args.output} with {len(conflicts)} conflicts")
+    if conflicts:
+        raise SystemExit(1)
+
+
+def restore(args):
+    from sigame_tools import assets as assets_module
+    assets_module.restore_package(args.src, args.dst, assets_module.BlobStore(args.store))
+    print("Restore successful")
+
+
+def serve(args):
+    import asyncio
+    from sigame_tools.service import serve as run_server
+    try:
+        asyncio.run(run_server(args.host, args.port, args.unix, args.jobs, args.max_queue))
+    except KeyboardInterrupt:
+        pass
 
 
 parser = argparse.ArgumentParser(description="SI Game tools CLI")
 
-commands = parser.add_subparsers(required=True, help="Specific action to perform", metavar="<command>")
+commands = parser.add_subparsers(dest="command", required=True, help="Specific action to perform", metavar="<command>")
 
 # Query
 query_parser = commands.add_parser("query", description="Query info about SI Game package",
                                    help="Query info about SI Game package")
 query_parser.set_defaults(func=query)
-query_parser.add_argument("--in-type", "-i", choices=(SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ),
+query_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
                           help="Explicitly specify input file format")
 query_parser.add_argument("src", type=pathlib.Path, help="SI Game package file\n"
                                                          "File format is detected automatically", metavar="FILE")
+query_parser.add_argument("--index", type=pathlib.Path, help="Package index file (in user cache by default)")
+query_parser.add_argument("--no-index", action="store_true", help="Read the package without using the index")
 
 # Convert
 convert_parser = commands.add_parser("convert", description="Convert SI Game package to another format",
@@ -65,24 +369,223 @@ convert_parser = commands.add_parser("convert", description="Convert SI Game pac
 convert_parser.set_defaults(func=convert)
 
 # src_group = convert_parser.add_argument_group("Source")
-convert_parser.add_argument("--in-type", "-i", choices=(SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ),
+convert_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
                             help="Explicitly specify file format")
 convert_parser.add_argument("src", type=pathlib.Path, help="Source SI Game package file\n"
                                                            "File format is detected automatically", metavar="SOURCE")
 
 # convert_parser.add_argument("--format", "-f", dest="bar")
 # dst_group = convert_parser.add_argument_group("Destination")
-convert_parser.add_argument("--out-type", "-o", choices=(SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ),
+convert_parser.add_argument("--out-type", "-o", choices=FILE_TYPES,
                             help="Explicitly specify output file format\n"
                                  "(required when DESTINATION is a Directory)")
 convert_parser.add_argument("dst", type=pathlib.Path, help="Destination package file or directory\n"
                                                            "File format is detected automatically\n"
                                                            "If directory is specified instead, format is required",
                             metavar="DESTINATION")
+convert_parser.add_argument("--store-media", action="store_true",
+                            help="Store already compressed media (jpg, mp3, mp4...) without deflate")
+convert_parser.add_argument("--indent", type=int, metavar="N",
+                            help="Indent JSON output by N spaces (compact by default)")
+
+# Convert many
+convert_many_parser = commands.add_parser("convert-many", description="Convert many SI Game packages in parallel",
+                                          help="Convert many SI Game packages in parallel",
+                                          formatter_class=argparse.RawTextHelpFormatter)
+convert_many_parser.set_defaults(func=convert_many)
+convert_many_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                                 help="Only convert files of this format\n"
+                                      "(all recognised packages by default)")
+convert_many_parser.add_argument("--out-type", "-o", choices=FILE_TYPES,
+                                 required=True, help="Output file format")
+convert_many_parser.add_argument("--jobs", "-j", type=int, help="Number of worker processes\n"
+                                                                "(number of CPUs by default)")
+convert_many_parser.add_argument("--store-media", action="store_true",
+                                 help="Store already compressed media (jpg, mp3, mp4...) without deflate")
+convert_many_parser.add_argument("src", nargs="+", help="Source package files, directories or glob patterns\n"
+                                                        "Directories are searched recursively", metavar="SOURCE")
+convert_many_parser.add_argument("dst", type=pathlib.Path, help="Destination directory\n"
+                                                                "Directory structure of sources is kept",
+                                 metavar="DESTINATION")
+
+# Index
+index_parser = commands.add_parser("index", description="Add SI Game packages to the package index",
+                                   help="Add SI Game packages to the package index",
+                                   formatter_class=argparse.RawTextHelpFormatter)
+index_parser.set_defaults(func=index_packages)
+index_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                          help="Only index files of this format")
+index_parser.add_argument("--index", type=pathlib.Path, help="Package index file (in user cache by default)")
+index_parser.add_argument("--search-index", type=pathlib.Path,
+                          help="Search index file (in user cache by default)")
+index_parser.add_argument("--no-search", action="store_true", help="Don't update the search index")
+index_parser.add_argument("src", nargs="+", help="Package files, directories or glob patterns\n"
+                                                 "Only changed packages are parsed again", metavar="SOURCE")
+
+# List
+list_parser = commands.add_parser("list", description="List indexed SI Game packages",
+                                  help="List indexed SI Game packages")
+list_parser.set_defaults(func=list_packages)
+list_parser.add_argument("--index", type=pathlib.Path, help="Package index file (in user cache by default)")
+list_parser.add_argument("--name", help="Only packages with names containing NAME")
+list_parser.add_argument("--author", help="Only packages with authors containing AUTHOR")
+list_parser.add_argument("--tag", help="Only packages with tag TAG")
+list_parser.add_argument("--type", help="Only packages with questions of type TYPE")
+list_parser.add_argument("--sort", choices=SORT_KEYS, default="path", help="Sort packages by this field")
+list_parser.add_argument("--reverse", "-r", action="store_true", help="Sort in descending order")
+
+# Search
+search_parser = commands.add_parser("search", description="Search questions of indexed SI Game packages\n"
+                                                          "Packages are added to the search index by 'index'",
+                                    help="Search questions of indexed SI Game packages",
+                                    formatter_class=argparse.RawTextHelpFormatter)
+search_parser.set_defaults(func=search)
+search_parser.add_argument("--search-index", type=pathlib.Path,
+                           help="Search index file (in user cache by default)")
+search_parser.add_argument("--limit", "-n", type=int, default=100, help="Maximum number of results (0 for all)")
+search_parser.add_argument("query", nargs="+", help="Words the question has to contain\n"
+                                                    "Words ending with '*' match as prefixes", metavar="WORD")
+
+# Dedupe
+dedupe_parser = commands.add_parser("dedupe", description="Find near-duplicate questions across SI Game packages\n"
+                                                          "Requires numpy",
+                                    help="Find near-duplicate questions across SI Game packages",
+                                    formatter_class=argparse.RawTextHelpFormatter)
+dedupe_parser.set_defaults(func=dedupe)
+dedupe_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                           help="Only check files of this format")
+dedupe_parser.add_argument("--threshold", "-t", type=float, default=0.8,
+                           help="Minimal estimated similarity of questions (0..1)")
+dedupe_parser.add_argument("src", nargs="+", help="Package files, directories or glob patterns\n"
+                                                  "Signatures of unchanged packages are cached", metavar="SOURCE")
+
+# Export
+export_parser = commands.add_parser("export", description="Export SI Game packages to memory-mapped column files\n"
+                                                          "Read them with sigame_tools.columnar.Corpus",
+                                    help="Export SI Game packages to memory-mapped column files",
+                                    formatter_class=argparse.RawTextHelpFormatter)
+export_parser.set_defaults(func=export)
+export_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                           help="Only export files of this format")
+export_parser.add_argument("src", nargs="+", help="Package files, directories or glob patterns", metavar="SOURCE")
+export_parser.add_argument("dst", type=pathlib.Path, help="Output directory", metavar="DESTINATION")
+
+# Assets
+assets_parser = commands.add_parser("assets", description="Check media files of SI Game packages\n"
+                                                          "Reports media referenced by questions but missing from\n"
+                                                          "the package, and media which no question uses",
+                                    help="Check media files of SI Game packages",
+                                    formatter_class=argparse.RawTextHelpFormatter)
+assets_parser.set_defaults(func=assets)
+assets_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                           help="Only check files of this format")
+assets_parser.add_argument("--store", type=pathlib.Path, help="Add media to a content-addressed store in this directory",
+                           metavar="DIR")
+assets_parser.add_argument("--export", type=pathlib.Path, metavar="DIR",
+                           help="Write packages without media to DIR (requires --store)\n"
+                                "Their media is listed in assets.json, use restore\n"
+                                "to get the full package back")
+assets_parser.add_argument("--link", action="store_true",
+                           help="With --export, unpack packages into directories\n"
+                                "with media hardlinked from the store")
+assets_parser.add_argument("--cache", type=pathlib.Path, help="Media hash cache file (in user cache by default)")
+assets_parser.add_argument("--strict", action="store_true",
+                           help="Exit with an error if any media is missing or orphaned")
+assets_parser.add_argument("src", nargs="+", help="Package files, directories or glob patterns", metavar="SOURCE")
+
+# Validate
+validate_parser = commands.add_parser("validate", description="Check SI Game packages without loading them\n"
+                                                              "Exits with an error if any package has problems",
+                                      help="Check SI Game packages without loading them",
+                                      formatter_class=argparse.RawTextHelpFormatter)
+validate_parser.set_defaults(func=validate)
+validate_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                             help="Only check files of this format")
+validate_parser.add_argument("--rule", "-r", action="append", choices=RULES.keys(),
+                             help="Only run this rule (all rules by default)")
+validate_parser.add_argument("--fail-fast", "-x", action="store_true",
+                             help="Stop checking a package at its first problem")
+validate_parser.add_argument("--quiet", "-q", action="store_true", help="Only list packages with problems")
+validate_parser.add_argument("src", nargs="+", help="Package files, directories or glob patterns", metavar="SOURCE")
+
+# Diff
+diff_parser = commands.add_parser("diff", description="Compare two revisions of a SI Game package\n"
+                                                      "Rounds and themes are matched by name, questions by price\n"
+                                                      "With --base, merge OLD and NEW as two edits of BASE instead",
+                                  help="Compare or merge revisions of a SI Game package",
+                                  formatter_class=argparse.RawTextHelpFormatter)
+diff_parser.set_defaults(func=diff)
+diff_parser.add_argument("--in-type", "-i", choices=FILE_TYPES,
+                         help="Explicitly specify input file format")
+diff_parser.add_argument("--base", type=pathlib.Path, help="Common ancestor of OLD and NEW for a three-way merge\n"
+                                                           "Conflicting questions are taken from OLD",
+                         metavar="BASE")
+diff_parser.add_argument("--output", type=pathlib.Path, help="Merged package file (requires --base)", metavar="FILE")
+diff_parser.add_argument("--out-type", "-o", choices=FILE_TYPES,
+                         help="Explicitly specify merged file format")
+diff_parser.add_argument("old", type=pathlib.Path, help="Old revision, or ours with --base", metavar="OLD")
+diff_parser.add_argument("new", type=pathlib.Path, help="New revision, or theirs with --base", metavar="NEW")
+
+# Restore
+restore_parser = commands.add_parser("restore", description="Rebuild a package exported with 'assets --export'",
+                                     help="Rebuild a package exported with 'assets --export'")
+restore_parser.set_defaults(func=restore)
+restore_parser.add_argument("--store", type=pathlib.Path, required=True, help="Content-addressed media store",
+                            metavar="DIR")
+restore_parser.add_argument("src", type=pathlib.Path, help="Package without media", metavar="SOURCE")
+restore_parser.add_argument("dst", type=pathlib.Path, help="Full package file", metavar="DESTINATION")
+
+# Serve
+serve_parser = commands.add_parser("serve", description="Run a local HTTP conversion service\n"
+                                                        "POST /convert?in=siq&out=jsiq.zip converts the request body,\n"
+                                                        "GET /metrics reports queue and latency metrics",
+                                   help="Run a local HTTP conversion service",
+                                   formatter_class=argparse.RawTextHelpFormatter)
+serve_parser.set_defaults(func=serve)
+serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+serve_parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+serve_parser.add_argument("--unix", type=pathlib.Path, help="Listen on a Unix socket instead", metavar="PATH")
+serve_parser.add_argument("--jobs", "-j", type=int, help="Number of worker processes\n"
+                                                         "(number of CPUs by default)")
+serve_parser.add_argument("--max-queue", type=int, default=64,
+                          help="Conversions allowed to wait for a worker before requests are rejected")
+
+# Profiling options of all commands
+for command_parser in commands.choices.values():
+    stats_group = command_parser.add_argument_group("profiling")
+    stats_group.add_argument("--stats", action="store_true",
+                             help="Print wall time, process peak RSS and bytes read/written per phase\n"
+                                  "(zip open, parse, build, serialize, asset copy) and object counts")
+    stats_group.add_argument("--stats-json", type=pathlib.Path, help="Write the same statistics as JSON to FILE",
+                             metavar="FILE")
+    stats_group.add_argument("--profile", type=pathlib.Path, help="Dump cProfile stats to FILE", metavar="FILE")
+    stats_group.add_argument("--trace-malloc", type=pathlib.Path, metavar="FILE",
+                             help="Dump a tracemalloc snapshot to FILE\n"
+                                  "and add the traced memory peak of each phase to the statistics")
+
+
+def run_profiled(args):
+    command = args.command
+    # Unset when profiling fails to start, its error is raised then without a report
+    profiler = None
+    try:
+        with profiling.profiled(command, args.profile and str(args.profile),
+                                args.trace_malloc and str(args.trace_malloc)) as profiler:
+            args.func(args)
+    finally:
+        if profiler is not None:
+            if args.stats:
+                print(profiler.format_report(), file=sys.stderr)
+            if args.stats_json:
+                with open(args.stats_json, "w", encoding="utf-8") as fp:
+                    json.dump({"command": command, "argv": sys.argv[1:], **profiler.report()}, fp, indent=2)
 
 
 def main():
     args = parser.parse_args()
+    if args.stats or args.stats_json or args.profile or args.trace_malloc:
+        run_profiled(args)
+        return
     args.func(args)
 
 
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+import mmap
+import pathlib
+import sys
+from array import array
+from typing import IO, Dict, Iterable, List, Tuple
+
+from sigame_tools.datatypes import AtomTypes, Package, QuestionTypes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMAT_VERSION = 1
+STRINGS_FILE = "strings.bin"
+META_FILE = "meta.json"
+
+# Column typecodes of array.array and the matching little-endian numpy dtypes
+DTYPES = {"B": "u1", "i": "<i4", "q": "<i8"}
+
+# Strings are stored as an offset into the shared string heap and a length in bytes
+TABLES: Dict[str, Dict[str, str]] = {
+    "packs": {"name_offset": "q", "name_length": "i", "path_offset": "q", "path_length": "i"},
+    "rounds": {"pack": "i", "final": "B", "name_offset": "q", "name_length": "i"},
+    "themes": {"pack": "i", "round": "i", "name_offset": "q", "name_length": "i"},
+    "questions": {"pack": "i", "round": "i", "theme": "i", "price": "i", "type": "B",
+                  "answer_offset": "q", "answer_length": "i"},
+    "atoms": {"question": "i", "type": "B", "time": "i", "text_offset": "q", "text_length": "i"},
+}
+
+KNOWN_QUESTION_TYPES = [QuestionTypes.SIMPLE, QuestionTypes.AUCTION, QuestionTypes.CAT, QuestionTypes.BAGCAT,
+                        QuestionTypes.SPONSORED, QuestionTypes.CHOICE]
+KNOWN_ATOM_TYPES = [AtomTypes.TEXT, AtomTypes.ORAL, AtomTypes.IMAGE, AtomTypes.AUDIO, AtomTypes.VIDEO,
+                    AtomTypes.MARKER]
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("Reading columnar exports requires numpy, install it with 'pip install SIGameTools[dedupe]'")
+
+
+class Column:
+    """
+    Append-only column buffered in an array and flushed to its file as raw little-endian values.
+    """
+
+    def __init__(self, fp: IO[bytes], typecode: str, buffer_size: int = 1 << 16) -> None:
+        self.fp = fp
+        self.values = array(typecode)
+        self.buffer_size = buffer_size
+        self.length = 0
+
+    def append(self, value: int) -> None:
+        self.values.append(value)
+        if len(self.values) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if sys.byteorder == "big":
+            self.values.byteswap()
+        self.values.tofile(self.fp)
+        self.length += len(self.values)
+        del self.values[:]
+
+
+class StringHeap:
+    def __init__(self, fp: IO[bytes]) -> None:
+        self.fp = fp
+        self.size = 0
+        # Names repeat a lot (rounds, themes, answers), each distinct string is stored once
+        self.__offsets: Dict[str, Tuple[int, int]] = {}
+
+    def add(self, value: str) -> Tuple[int, int]:
+        ref = self.__offsets.get(value)
+        if ref is None:
+            data = value.encode("utf-8")
+            ref = self.__offsets[value] = (self.size, len(data))
+            self.fp.write(data)
+            self.size += len(data)
+        return ref
+
+
+def _code(codes: Dict[str, int], names: List[str], name: str) -> int:
+    code = codes.get(name)
+    if code is None:
+        if len(names) > 255:
+            raise ValueError(f"Too many distinct types to export: '{name}'")
+        code = codes[name] = len(names)
+        names.append(name)
+    return code
+
+
+def _atom_time(time: int | str) -> int:
+    # Atoms read from XML may keep their time as a string
+    try:
+        return int(time or 0)
+    except ValueError:
+        return 0
+
+
+class CorpusWriter:
+    """
+    Flattens packages into columnar tables in a directory: one raw file per column, a shared string heap,
+    and meta.json describing columns, row counts and type codes.
+    """
+
+    def __init__(self, path: str | pathlib.Path) -> None:
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.__files: List[IO[bytes]] = []
+        self.columns: Dict[str, Dict[str, Column]] = {}
+        for table, columns in TABLES.items():
+            self.columns[table] = {}
+            for name, typecode in columns.items():
+                fp = open(self.path / f"{table}.{name}", "wb")
+                self.__files.append(fp)
+                self.columns[table][name] = Column(fp, typecode)
+        strings_fp = open(self.path / STRINGS_FILE, "wb")
+        self.__files.append(strings_fp)
+        self.strings = StringHeap(strings_fp)
+        self.question_types: List[str] = list(KNOWN_QUESTION_TYPES)
+        self.atom_types: List[str] = list(KNOWN_ATOM_TYPES)
+        self.__question_codes = {name: i for i, name in enumerate(self.question_types)}
+        self.__atom_codes = {name: i for i, name in enumerate(self.atom_types)}
+        self.rows = {table: 0 for table in TABLES}
+
+    def __row(self, table: str, **values: int | str) -> int:
+        columns = self.columns[table]
+        for name, value in values.items():
+            if isinstance(value, str):
+                offset, length = self.strings.add(value)
+                columns[f"{name}_offset"].append(offset)
+                columns[f"{name}_length"].append(length)
+            else:
+                columns[name].append(value)
+        row = self.rows[table]
+        self.rows[table] += 1
+        return row
+
+    def add(self, path: str, package: Package) -> None:
+        pack = self.__row("packs", name=package.name, path=path)
+        for _round in package.rounds:
+            round_id = self.__row("rounds", pack=pack, final=int(_round.final), name=_round.name)
+            for theme in _round.themes:
+                theme_id = self.__row("themes", pack=pack, round=round_id, name=theme.name)
+                for question in theme.questions:
+                    question_id = self.__row(
+                        "questions", pack=pack, round=round_id, theme=theme_id, price=question.price,
+                        type=_code(self.__question_codes, self.question_types, question.q_type.name),
+                        answer=question.right[0] if question.right else ""
+                    )
+                    for atom in question.scenario:
+                        self.__row("atoms", question=question_id,
+                                   type=_code(self.__atom_codes, self.atom_types, atom.type),
+                                   time=_atom_time(atom.time), text=atom.text)
+
+    def close(self) -> None:
+        for columns in self.columns.values():
+            for column in columns.values():
+                column.flush()
+        for fp in self.__files:
+            fp.close()
+        meta = {
+            "version": FORMAT_VERSION,
+            "rows": self.rows,
+            "tables": TABLES,
+            "question_types": self.question_types,
+            "atom_types": self.atom_types,
+        }
+        with open(self.path / META_FILE, "w", encoding="utf-8") as fp:
+            json.dump(meta, fp, ensure_ascii=False, indent=2)
+
+    def __enter__(self) -> CorpusWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def export_corpus(packages: Iterable[Tuple[str, Package]], path: str | pathlib.Path) -> Dict[str, int]:
+    with CorpusWriter(path) as writer:
+        for pack_path, package in packages:
+            writer.add(pack_path, package)
+    return writer.rows
+
+
+class Corpus:
+    """
+    Read-only view of an exported corpus. Columns are numpy arrays over memory-mapped files,
+    so aggregates run vectorized without building Python objects per question.
+    """
+
+    def __init__(self, path: str | pathlib.Path) -> None:
+        require_numpy()
+        self.path = pathlib.Path(path)
+        with open(self.path / META_FILE, encoding="utf-8") as fp:
+            self.meta = json.load(fp)
+        if self.meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar export version: {self.meta['version']}")
+        self.question_types: List[str] = self.meta["question_types"]
+        self.atom_types: List[str] = self.meta["atom_types"]
+        self.__columns: Dict[Tuple[str, str], np.ndarray] = {}
+        self.__strings = self.__map(self.path / STRINGS_FILE)
+
+    @staticmethod
+    def __map(path: pathlib.Path) -> bytes | mmap.mmap:
+        with open(path, "rb") as fp:
+            if fp.seek(0, 2) == 0:
+                return b""
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def rows(self, table: str) -> int:
+        return self.meta["rows"][table]
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        key = (table, name)
+        if key not in self.__columns:
+            dtype = np.dtype(DTYPES[self.meta["tables"][table][name]])
+            if self.rows(table) == 0:
+                self.__columns[key] = np.empty(0, dtype=dtype)
+            else:
+                self.__columns[key] = np.memmap(self.path / f"{table}.{name}", dtype=dtype, mode="r",
+                                                shape=(self.rows(table),))
+        return self.__columns[key]
+
+    def string(self, table: str, name: str, row: int) -> str:
+        offset = int(self.column(table, f"{name}_offset")[row])
+        length = int(self.column(table, f"{name}_length")[row])
+        return bytes(self.__strings[offset:offset + length]).decode("utf-8")
+
+    def price_distribution(self) -> Dict[int, int]:
+        prices, counts = np.unique(self.column("questions", "price"), return_counts=True)
+        return dict(zip(prices.tolist(), counts.tolist()))
+
+    def question_type_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.column("questions", "type"), minlength=len(self.question_types))
+        return {name: int(count) for name, count in zip(self.question_types, counts) if count}
+
+    def atom_type_mix(self) -> np.ndarray:
+        """
+        Number of atoms of each type (columns, see atom_types) per round (rows).
+        """
+        atom_rounds = self.column("questions", "round")[self.column("atoms", "question")].astype(np.int64)
+        types = len(self.atom_types)
+        flat = atom_rounds * types + self.column("atoms", "type")
+        return np.bincount(flat, minlength=self.rows("rounds") * types).reshape(self.rows("rounds"), types)
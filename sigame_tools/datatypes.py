@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+import hashlib
+import itertools
 import json
+import os
+import pathlib
 import shutil
-from typing import List, Iterator, Any, Dict, Type
+import sys
+import tempfile
+from typing import List, Iterable, Iterator, Any, Dict, NamedTuple, Tuple
 from abc import ABC, abstractmethod
-from collections.abc import MutableMapping
-from xml.dom.minidom import parse, Document, Element, Text
-from zipfile import ZipFile
+from collections.abc import MutableMapping, MutableSequence
+from xml.dom.minidom import Document, Element, Text
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
 
-from sigame_tools import helper
+from sigame_tools import helper, profiling
 
 
 class JSONSerializeable(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def json_serialize(self) -> Dict[str, Any]:
         pass
@@ -23,6 +31,8 @@ class JSONSerializeable(ABC):
 
 
 class XMLOp(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def read_xml(self, el: Element) -> None:
         pass
@@ -33,16 +43,171 @@ class XMLOp(ABC):
 
 
 class Named:
+    __slots__ = ("name",)
+
     def __init__(self, name: str = "") -> None:
         super(Named, self).__init__()
         self.name: str = name
 
 
-class Info:
+class _AttributeHooks:
+    __slots__ = ()
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        super().__setattr__(key, value)
+        self.changed()
+
+
+class _ListHooks:
+    __slots__ = ()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self.changed()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.changed()
+
+    def __iadd__(self, values):
+        super().extend(values)
+        self.changed()
+        return self
+
+    def __imul__(self, n: int):
+        super().__imul__(n)
+        self.changed()
+        return self
+
+    def append(self, value) -> None:
+        super().append(value)
+        self.changed()
+
+    def extend(self, values) -> None:
+        super().extend(values)
+        self.changed()
+
+    def insert(self, index: int, value) -> None:
+        super().insert(index, value)
+        self.changed()
+
+    def pop(self, index: int = -1):
+        value = super().pop(index)
+        self.changed()
+        return value
+
+    def remove(self, value) -> None:
+        super().remove(value)
+        self.changed()
+
+    def clear(self) -> None:
+        super().clear()
+        self.changed()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self.changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.changed()
+
+
+class _MappingHooks(_AttributeHooks):
+    __slots__ = ()
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.changed()
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self.changed()
+
+
+class Tracked:
+    """
+    Part of a package whose edits invalidate the cached digests of the objects it belongs to.
+    Objects nobody has hashed are plain ones without any hooks, so reading and building packages costs nothing extra.
+    When an owner caches its digest, the object is switched to a tracking subclass of the same name and layout
+    and linked to the owner, its first edit after that switches it back and invalidates the owners.
+    """
+    __slots__ = ()
+    # Hooks added by the tracking subclass, each calls changed() after the edit
+    _HOOKS: type = _AttributeHooks
+    # Set on tracking subclasses to the class they were made from
+    _untracked: None | type = None
+
+    def _track(self) -> None:
+        cls = type(self)
+        if cls._untracked is not None:
+            return
+        tracking = _TRACKING.get(cls)
+        if tracking is None:
+            tracking = _TRACKING[cls] = type(cls)(cls.__name__, (cls._HOOKS, cls), {
+                "__slots__": (), "__module__": cls.__module__, "__qualname__": cls.__qualname__, "_untracked": cls})
+        object.__setattr__(self, "__class__", tracking)
+        object.__setattr__(self, "_owners", None)
+
+    def link(self, owner: Tracked) -> bool:
+        """
+        Invalidate owner on the next edit of this object, tells whether that is possible.
+        """
+        self._track()
+        owners = self._owners
+        if owners is None:
+            object.__setattr__(self, "_owners", owner)
+        elif type(owners) is list:
+            # Shared between several owners, e.g. by shallow copies
+            if not any(linked is owner for linked in owners):
+                owners.append(owner)
+        elif owners is not owner:
+            object.__setattr__(self, "_owners", [owners, owner])
+        return True
+
+    def changed(self) -> None:
+        cls = type(self)._untracked
+        if cls is None:
+            return
+        owners = self._owners
+        object.__setattr__(self, "_owners", None)
+        object.__setattr__(self, "__class__", cls)
+        if type(owners) is list:
+            for owner in owners:
+                owner.changed()
+        elif owners is not None:
+            owners.changed()
+
+
+# Tracking subclass of each class, made on first use
+_TRACKING: Dict[type, type] = {}
+
+
+def link(value: Any, owner: Tracked) -> bool:
+    # Plain values such as lists assigned by callers cannot be tracked
+    return isinstance(value, Tracked) and value.link(owner)
+
+
+class ModelList(list, Tracked):
+    """
+    List of a package object, e.g. its questions or right answers.
+    Plain lists work as well, but edits of them cannot be tracked, so their owners are hashed on every access.
+    """
+    __slots__ = ("_owners",)
+    _HOOKS = _ListHooks
+
+    def __reduce__(self):
+        # Owners stay with the original
+        return ModelList, (), None, iter(self)
+
+
+class Info(Tracked):
+    __slots__ = ("__authors", "__sources", "comments", "_owners")
+
     def __init__(self):
         super(Info, self).__init__()
-        self.__authors: List[str] = []
-        self.__sources: List[str] = []
+        self.__authors: List[str] = ModelList()
+        self.__sources: List[str] = ModelList()
         self.comments: str = ""
 
     @property
@@ -53,22 +218,114 @@ class Info:
     def sources(self):
         return self.__sources
 
+    def link(self, owner: Tracked) -> bool:
+        super().link(owner)
+        authors, sources = link(self.__authors, self), link(self.__sources, self)
+        return authors and sources
+
+    def __reduce__(self):
+        return Info, (), (self.__authors, self.__sources, self.comments)
+
+    def __setstate__(self, state) -> None:
+        self.__authors, self.__sources, self.comments = state
+
+
+class InfoOwner(Named, Tracked, JSONSerializeable, XMLOp):
+    __slots__ = ("__info", "_digest", "_owners")
 
-class InfoOwner(Named, JSONSerializeable, XMLOp):
     def __init__(self, name: str = ""):
         super().__init__(name=name)
-        self.__info: Info = Info()
+        # Most questions have no info, so Info is only allocated on first access
+        self.__info: None | Info = None
+
+    def __reduce__(self):
+        # Copies are untracked, without the cached digest and owners, they are hashed and linked on their own
+        return object.__new__, (type(self)._untracked or type(self),), (
+            getattr(self, "__dict__", None), {"name": self.name, "_InfoOwner__info": self.__info})
+
+    @property
+    def info(self) -> Info:
+        info = self.__info
+        if info is None:
+            # An empty Info leaves the digest as it is
+            info = Info()
+            object.__setattr__(self, "_InfoOwner__info", info)
+            if type(self)._untracked is not None:
+                info.link(self)
+        return info
+
+    @info.setter
+    def info(self, info: None | Info):
+        self.__info = info
 
     @property
-    def info(self):
-        return self.__info
+    def has_info(self) -> bool:
+        info = self.__info
+        return info is not None and bool(info.authors or info.sources or info.comments)
 
     def copy_info(self, other: InfoOwner):
         self.__info = other.info
 
+    def info_fields(self) -> None | Tuple[Any, ...]:
+        if not self.has_info:
+            return None
+        return tuple(self.info.authors), tuple(self.info.sources), self.info.comments
+
+    def digest_fields(self) -> Tuple[Any, ...]:
+        """
+        Canonical own fields, the same whichever format the object was read from.
+        """
+        return self.name, self.info_fields()
+
+    def digest_children(self) -> Iterable[InfoOwner]:
+        return ()
+
+    def digest_values(self) -> Iterator[Any]:
+        """
+        Mutable values digest_fields are taken from, linked so that their edits invalidate the digest.
+        """
+        info = self.__info
+        if info is not None:
+            yield info
+
+    def link(self, owner: Tracked) -> bool:
+        # Only objects with a cached digest are tracked
+        if type(self)._untracked is None:
+            return False
+        return super().link(owner)
+
+    def changed(self) -> None:
+        object.__setattr__(self, "_digest", None)
+        super().changed()
+
+    @property
+    def digest(self) -> bytes:
+        """
+        SHA-256 of the canonical fields of this object and of the digests of its children.
+        The digest is cached until this object, one of its values or one of its children is edited,
+        so after an edit only the edited objects and their parents are hashed again.
+        Objects holding plain lists and their parents are hashed on every access, since edits of those go unnoticed.
+        """
+        if type(self)._untracked is not None:
+            return self._digest
+        data = json.dumps([type(self).__name__, self.digest_fields()], ensure_ascii=False, separators=(",", ":"))
+        hashed = hashlib.sha256(data.encode("utf-8"))
+        cached = True
+        for child in self.digest_children():
+            hashed.update(child.digest)
+            cached = child.link(self) and cached
+        for value in self.digest_values():
+            cached = link(value, self) and cached
+        digest = hashed.digest()
+        if cached:
+            self._track()
+            object.__setattr__(self, "_digest", digest)
+        return digest
+
     def json_serialize(self) -> Dict[str, Any]:
-        # if self.info.authors or self.info.sources or self.info.comments:
         info = {}
+        if not self.has_info:
+            return info
         if self.info.authors:
             info["authors"] = self.info.authors
         if self.info.sources:
@@ -77,39 +334,34 @@ class InfoOwner(Named, JSONSerializeable, XMLOp):
             info["comments"] = self.info.comments
         return info
 
+    def json_read_info(self, d: Dict[str, Any]) -> None:
+        d_info = d.get("info")
+        if not d_info:
+            return
+        self.info.authors.extend(d_info.get("authors", ()))
+        self.info.sources.extend(d_info.get("sources", ()))
+        self.info.comments = d_info.get("comments", "")
+
     @classmethod
-    def json_deserialize(cls, d: Dict[str, Any]) -> None | InfoOwner:
-        if "info" not in d:
-            return None
-        d_info = d["info"]
-        if not ("authors" in d_info or "sources" in d_info or "comments" in d_info):
-            return None
-        i = InfoOwner()
-        i.info.authors.extend(d_info.get("authors", []))
-        i.info.sources.extend(d_info.get("sources", []))
-        i.info.comments = d_info.get("comments", "")
+    def json_deserialize(cls, d: Dict[str, Any]) -> InfoOwner:
+        i = cls(d.get("name", ""))
+        i.json_read_info(d)
         return i
 
     def read_xml(self, el: Element):
         assert el.nodeName == "info"
-        el_authors_l: List[Element] = el.getElementsByTagName("authors")
-        if el_authors_l:
-            el_author_l: List[Element] = el_authors_l[0].getElementsByTagName("author")
-            for el_author in el_author_l:
-                self.info.authors.append(helper.get_text(el_author))
-        el_sources_l: List[Element] = el.getElementsByTagName("sources")
-        if el_sources_l:
-            el_source_l: List[Element] = el_sources_l[0].getElementsByTagName("source")
-            for el_source in el_source_l:
-                self.info.sources.append(helper.get_text(el_source))
-        el_comments_l: List[Element] = el.getElementsByTagName("comments")
-        if el_comments_l:
-            # el_comment_l: Text = el_comments_l[0].childNodes[0]
-            # self.info.comments = el_comment_l.data
-            self.info.comments = helper.get_text(el_comments_l[0])
+        for child in helper.child_elements(el):
+            if child.nodeName == "authors":
+                for el_author in helper.child_elements(child):
+                    self.info.authors.append(helper.get_text(el_author))
+            elif child.nodeName == "sources":
+                for el_source in helper.child_elements(child):
+                    self.info.sources.append(helper.get_text(el_source))
+            elif child.nodeName == "comments":
+                self.info.comments = helper.get_text(child)
 
     def write_xml(self, root: Document) -> None | Element:
-        if not (self.info.authors or self.info.sources or self.info.comments):
+        if not self.has_info:
             return None
         el: Element = root.createElement("info")
         if self.info.authors:
@@ -151,17 +403,33 @@ class Package(InfoOwner, JSONSerializeable, XMLOp):
         self.logo = ""
         self.date = ""
         self.language = ""
-        self.__tags: List[str] = []
-        self.__rounds: List[Round] = []
+        self.__tags: List[str] = ModelList()
+        self.__rounds: List[Round] = ModelList()
 
     @property
     def rounds(self):
         return self.__rounds
 
+    @rounds.setter
+    def rounds(self, rounds: MutableSequence[Round]):
+        self.__rounds = rounds
+
     @property
     def tags(self):
         return self.__tags
 
+    def digest_fields(self) -> Tuple[Any, ...]:
+        return (self.name, float(self.version), self.id, self.restriction, self.date, self.publisher,
+                int(self.difficulty), self.logo, self.language, tuple(self.tags), self.info_fields())
+
+    def digest_children(self) -> Iterable[Round]:
+        return self.rounds
+
+    def digest_values(self) -> Iterator[Any]:
+        yield from super().digest_values()
+        yield self.tags
+        yield self.rounds
+
     @classmethod
     def from_document(cls, doc: Document) -> Package:
         root: Element = doc.documentElement
@@ -198,13 +466,9 @@ class Package(InfoOwner, JSONSerializeable, XMLOp):
         return res
 
     @classmethod
-    def json_deserialize(cls, d) -> None | Package:
-        if "rounds" not in d:
-            return None
+    def json_deserialize(cls, d) -> Package:
         p = Package(d["name"])
-        io = super().json_deserialize(d)
-        if io:
-            p.copy_info(io)
+        p.json_read_info(d)
         p.version = d.get("version", p.version)
         p.id = d.get("id", p.id)
         p.restriction = d.get("restriction", p.restriction)
@@ -214,7 +478,7 @@ class Package(InfoOwner, JSONSerializeable, XMLOp):
         p.date = d.get("date", p.date)
         p.language = d.get("language", p.language)
         p.rounds.clear()
-        p.rounds.extend(d["rounds"])
+        p.rounds.extend(Round.json_deserialize(d_round) for d_round in d["rounds"])
         p.tags.clear()
         p.tags.extend(d.get("tags", []))
         return p
@@ -232,21 +496,17 @@ class Package(InfoOwner, JSONSerializeable, XMLOp):
         self.logo = el.getAttribute("logo")
         self.language = el.getAttribute("language")
 
-        el_info_l: List[Element] = el.getElementsByTagName("info")
-        if el_info_l and el_info_l[0] in el.childNodes:
-            super(Package, self).read_xml(el_info_l[0])
-
-        el_tags: List[Element] = el.getElementsByTagName("tags")
-        if el_tags:
-            el_tag: Element
-            for el_tag in el_tags[0].getElementsByTagName("tag"):
-                self.tags.append(helper.get_text(el_tag))
-        # rounds: Element = el.getElementsByTagName("rounds")[0]
-        # el_round: Element
-        for el_round in el.getElementsByTagName("round"):
-            _round = Round()
-            _round.read_xml(el_round)
-            self.rounds.append(_round)
+        for child in helper.child_elements(el):
+            if child.nodeName == "info":
+                super(Package, self).read_xml(child)
+            elif child.nodeName == "tags":
+                for el_tag in helper.child_elements(child):
+                    self.tags.append(helper.get_text(el_tag))
+            elif child.nodeName == "rounds":
+                for el_round in helper.child_elements(child):
+                    _round = Round()
+                    _round.read_xml(el_round)
+                    self.rounds.append(_round)
 
     def write_xml(self, root: Document) -> Element:
         el: Element = root.createElement("package")
@@ -300,7 +560,17 @@ class Round(InfoOwner, JSONSerializeable, XMLOp):
     def __init__(self, name: str = "", final=False) -> None:
         super().__init__(name)
         self.final: bool = final
-        self.themes: List[Theme] = []
+        self.themes: List[Theme] = ModelList()
+
+    def digest_fields(self) -> Tuple[Any, ...]:
+        return self.name, bool(self.final), self.info_fields()
+
+    def digest_children(self) -> Iterable[Theme]:
+        return self.themes
+
+    def digest_values(self) -> Iterator[Any]:
+        yield from super().digest_values()
+        yield self.themes
 
     def json_serialize(self):
         res = {
@@ -315,14 +585,10 @@ class Round(InfoOwner, JSONSerializeable, XMLOp):
         return res
 
     @classmethod
-    def json_deserialize(cls, d) -> None | Round:
-        if "themes" not in d:
-            return None
+    def json_deserialize(cls, d) -> Round:
         r = Round(d["name"], d.get("final", False))
-        io = super().json_deserialize(d)
-        if io:
-            r.copy_info(io)
-        r.themes.extend(d["themes"])
+        r.json_read_info(d)
+        r.themes.extend(Theme.json_deserialize(d_theme) for d_theme in d["themes"])
         return r
 
     def read_xml(self, el: Element) -> None:
@@ -331,14 +597,14 @@ class Round(InfoOwner, JSONSerializeable, XMLOp):
         r_type = el.getAttribute("type")
         self.final = r_type == "final"
 
-        el_info_l: List[Element] = el.getElementsByTagName("info")
-        if el_info_l and el_info_l[0] in el.childNodes:
-            super(Round, self).read_xml(el_info_l[0])
-
-        for el_theme in el.getElementsByTagName("theme"):
-            theme = Theme()
-            theme.read_xml(el_theme)
-            self.themes.append(theme)
+        for child in helper.child_elements(el):
+            if child.nodeName == "info":
+                super(Round, self).read_xml(child)
+            elif child.nodeName == "themes":
+                for el_theme in helper.child_elements(child):
+                    theme = Theme()
+                    theme.read_xml(el_theme)
+                    self.themes.append(theme)
 
     def write_xml(self, root: Document) -> Element:
         el: Element = root.createElement("round")
@@ -366,7 +632,14 @@ class Round(InfoOwner, JSONSerializeable, XMLOp):
 class Theme(InfoOwner, JSONSerializeable, XMLOp):
     def __init__(self, name: str = "") -> None:
         super().__init__(name)
-        self.questions: List[Question] = []
+        self.questions: List[Question] = ModelList()
+
+    def digest_children(self) -> Iterable[Question]:
+        return self.questions
+
+    def digest_values(self) -> Iterator[Any]:
+        yield from super().digest_values()
+        yield self.questions
 
     def json_serialize(self):
         res = {
@@ -379,29 +652,24 @@ class Theme(InfoOwner, JSONSerializeable, XMLOp):
         return res
 
     @classmethod
-    def json_deserialize(cls, d) -> None | Theme:
-        if "questions" not in d:
-            return None
+    def json_deserialize(cls, d) -> Theme:
         t = Theme(d["name"])
-        io = super().json_deserialize(d)
-        if io:
-            t.copy_info(io)
-        t.questions.extend(d["questions"])
+        t.json_read_info(d)
+        t.questions.extend(Question.json_deserialize(d_question) for d_question in d["questions"])
         return t
 
     def read_xml(self, el: Element) -> None:
         assert el.nodeName == "theme"
 
-        el_info_l: List[Element] = el.getElementsByTagName("info")
-        if el_info_l and el_info_l[0] in el.childNodes:
-            super(Theme, self).read_xml(el_info_l[0])
-
         self.name = el.getAttribute("name")
-        for el_question in el.getElementsByTagName("question"):
-            question = Question()
-            question.read_xml(el_question)
-            # question = parse_question(el_question)
-            self.questions.append(question)
+        for child in helper.child_elements(el):
+            if child.nodeName == "info":
+                super(Theme, self).read_xml(child)
+            elif child.nodeName == "questions":
+                for el_question in helper.child_elements(child):
+                    question = Question()
+                    question.read_xml(el_question)
+                    self.questions.append(question)
 
     def write_xml(self, root: Document) -> Element:
         el: Element = root.createElement("theme")
@@ -433,29 +701,30 @@ class QuestionTypes:
     CHOICE = "choice"
 
 
-class QuestionType(MutableMapping, Named, JSONSerializeable):
+class QuestionType(MutableMapping, Named, Tracked, JSONSerializeable):
+    __slots__ = ("__params", "_owners")
+    _HOOKS = _MappingHooks
+
     def __init__(self, q_type: str) -> None:
-        super().__init__(q_type)
-        self.__params: List[QuestionTypeParam] = []
+        # Type names and parameter keys repeat across every question of a pack, so they are interned
+        super().__init__(sys.intern(q_type))
+        # Insertion ordered, which keeps parameters in XML order on round-trips
+        self.__params: Dict[str, str] = {}
 
     def __getitem__(self, __key: str) -> str:
-        for value in (p.value for p in self.__params if p.name == __key):
-            return value
-        return ""
+        return self.__params.get(__key, "")
 
     def __setitem__(self, __key: str, __value: str) -> None:
-        for p in (p for p in self.__params if p.name == __key):
-            p.value = __value
-            return
-        self.__params.append(QuestionTypeParam(__key, __value))
+        self.__params[sys.intern(__key)] = __value
 
     def __delitem__(self, __key: str) -> None:
-        __params: List[QuestionTypeParam] = [p for p in self.__params if p.value != __key]
-        self.__params.clear()
-        self.__params.extend(__params)
+        del self.__params[__key]
+
+    def __contains__(self, __key: object) -> bool:
+        return __key in self.__params
 
     def __iter__(self) -> Iterator[str]:
-        return (p.name for p in self.__params)
+        return iter(self.__params)
 
     def __len__(self) -> int:
         return len(self.__params)
@@ -465,25 +734,68 @@ class QuestionType(MutableMapping, Named, JSONSerializeable):
             "name": self.name
         }
         if len(self) != 0:
-            res["param"] = {key.name: self[key.name] for key in self.__params}
+            res["param"] = dict(self.__params)
         return res
 
     @classmethod
-    def json_deserialize(cls, d) -> None | JSONSerializeable:
-        return
+    def json_deserialize(cls, d) -> QuestionType:
+        q_type = QuestionType(d["name"])
+        for p_name, p_value in d.get("param", {}).items():
+            q_type[p_name] = p_value
+        return q_type
 
     def __bool__(self):
         return True
 
+    def __reduce__(self):
+        return QuestionType, (self.name,), self.__params
+
+    def __setstate__(self, state: Dict[str, str]) -> None:
+        for key, value in state.items():
+            self[key] = value
+
+
+class DefaultQuestionType(QuestionType):
+    """
+    Read-only simple question type shared by all questions created without an explicit type.
+    """
+    __slots__ = ()
+    _READ_ONLY_ERROR = "Default question type is shared, assign a new QuestionType to Question.q_type instead"
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        if hasattr(self, key):
+            raise TypeError(self._READ_ONLY_ERROR)
+        super().__setattr__(key, value)
+
+    def __setitem__(self, __key: str, __value: str) -> None:
+        raise TypeError(self._READ_ONLY_ERROR)
+
+    def __delitem__(self, __key: str) -> None:
+        raise TypeError(self._READ_ONLY_ERROR)
+
+    def __reduce__(self):
+        return "DEFAULT_QUESTION_TYPE"
+
+    def link(self, owner: Tracked) -> bool:
+        # Read-only, so there is nothing to track
+        return True
+
+
+DEFAULT_QUESTION_TYPE = DefaultQuestionType(QuestionTypes.SIMPLE)
+
 
 class Question(InfoOwner, JSONSerializeable, XMLOp):
+    __slots__ = ("price", "q_type", "scenario", "right", "wrong")
+    # Names of the items of digest_fields
+    DIGEST_FIELDS = ("price", "type", "scenario", "right", "wrong", "info")
+
     def __init__(self, q_type: QuestionType = None, price: int = -1) -> None:
         super().__init__("")
         self.price: int = price
-        self.q_type: QuestionType = q_type or QuestionType(QuestionTypes.SIMPLE)
-        self.scenario: List[Atom] = []
-        self.right: List[str] = []
-        self.wrong: List[str] = []
+        self.q_type: QuestionType = q_type or DEFAULT_QUESTION_TYPE
+        self.scenario: List[Atom] = ModelList()
+        self.right: List[str] = ModelList()
+        self.wrong: List[str] = ModelList()
 
     def json_serialize(self):
         res: Dict[str, Any] = {
@@ -502,21 +814,39 @@ class Question(InfoOwner, JSONSerializeable, XMLOp):
         res["scenario"] = self.scenario
         return res
 
+    def digest_fields(self) -> Tuple[Any, ...]:
+        q_type = self.q_type
+        return (int(self.price), (q_type.name, tuple(sorted(q_type.items())) if len(q_type) else ()),
+                tuple((atom.type, atom.text, atom.canonical_time) for atom in self.scenario),
+                tuple(self.right), tuple(self.wrong), self.info_fields())
+
+    def digest_values(self) -> Iterator[Any]:
+        yield from super().digest_values()
+        yield self.q_type
+        yield self.scenario
+        yield from self.scenario
+        yield self.right
+        yield self.wrong
+
+    def __reduce__(self):
+        # Explicit state pickles much faster than generic slot copying, which matters when rounds are parsed
+        # in worker processes
+        return Question, (self.q_type, self.price), (self.info if self.has_info else None,
+                                                     self.scenario, self.right, self.wrong)
+
+    def __setstate__(self, state) -> None:
+        info, self.scenario, self.right, self.wrong = state
+        if info is not None:
+            self.info = info
+
     @classmethod
-    def json_deserialize(cls, d: Dict[str, Any]) -> None | Question:
-        if "scenario" not in d:
-            return
+    def json_deserialize(cls, d: Dict[str, Any]) -> Question:
         q_type: QuestionType | None = None
         if "type" in d:
-            d_type: Dict[str, Any] = d["type"]
-            q_type = QuestionType(d_type["name"])
-            for p_name, p_value in d_type.get("param", {}).items():
-                q_type[p_name] = p_value
+            q_type = QuestionType.json_deserialize(d["type"])
         q = Question(q_type=q_type, price=d["price"])
-        io = super().json_deserialize(d)
-        if io:
-            q.copy_info(io)
-        q.scenario.extend(d["scenario"])
+        q.json_read_info(d)
+        q.scenario.extend(Atom.json_deserialize(d_atom) for d_atom in d["scenario"])
         # There should be at least one right answer
         q.right.extend(d["answers"]["right"])
         q.wrong.extend(d["answers"].get("wrong", []))
@@ -527,39 +857,25 @@ class Question(InfoOwner, JSONSerializeable, XMLOp):
 
         self.price = int(el.getAttribute("price") or self.price)
 
-        el_info_l: List[Element] = el.getElementsByTagName("info")
-        if el_info_l and el_info_l[0] in el.childNodes:
-            super(Question, self).read_xml(el_info_l[0])
-
-        el_type: List[Element] = el.getElementsByTagName("type")
-        if len(el_type) != 0:
-            type_name = el_type[0].getAttribute("name")
-            param: List[Element] = el_type[0].getElementsByTagName("param")
-            q_type = QuestionType(type_name)
-            for el_param in param:
-                name = el_param.getAttribute("name")
-                value = el_param.childNodes[0].data if len(el_param.childNodes) != 0 else ""
-                q_type[name] = value
-            self.q_type = q_type
-
-        el_scenario: Element = el.getElementsByTagName("scenario")[0]
-        atoms = el_scenario.getElementsByTagName("atom")
-        for el_atom in atoms:
-            atom = Atom()
-            atom.read_xml(el_atom)
-            self.scenario.append(atom)
-
-        el_right: List[Element] = el.getElementsByTagName("right")
-        if len(el_right) != 0:
-            answers = el_right[0].getElementsByTagName("answer")
-            for el_answer in answers:
-                self.right.append(helper.get_text(el_answer))
-
-        el_wrong: List[Element] = el.getElementsByTagName("wrong")
-        if len(el_wrong) != 0:
-            answers = el_wrong[0].getElementsByTagName("answer")
-            for el_answer in answers:
-                self.wrong.append(helper.get_text(el_answer))
+        for child in helper.child_elements(el):
+            if child.nodeName == "info":
+                super(Question, self).read_xml(child)
+            elif child.nodeName == "type":
+                q_type = QuestionType(child.getAttribute("name"))
+                for el_param in helper.child_elements(child):
+                    q_type[el_param.getAttribute("name")] = helper.get_text(el_param)
+                self.q_type = q_type
+            elif child.nodeName == "scenario":
+                for el_atom in helper.child_elements(child):
+                    atom = Atom()
+                    atom.read_xml(el_atom)
+                    self.scenario.append(atom)
+            elif child.nodeName == "right":
+                for el_answer in helper.child_elements(child):
+                    self.right.append(helper.get_text(el_answer))
+            elif child.nodeName == "wrong":
+                for el_answer in helper.child_elements(child):
+                    self.wrong.append(helper.get_text(el_answer))
 
     def write_xml(self, root: Document) -> Element:
         el: Element = root.createElement("question")
@@ -569,7 +885,7 @@ class Question(InfoOwner, JSONSerializeable, XMLOp):
         if el_info:
             el.appendChild(el_info)
 
-        if self.q_type.name is not QuestionTypes.SIMPLE:
+        if self.q_type.name != QuestionTypes.SIMPLE:
             el_type: Element = root.createElement("type")
             el_type.setAttribute("name", self.q_type.name)
             for name, value in self.q_type.items():
@@ -582,14 +898,7 @@ class Question(InfoOwner, JSONSerializeable, XMLOp):
 
         el_scenario: Element = root.createElement("scenario")
         for atom in self.scenario:
-            el_atom: Element = root.createElement("atom")
-            if atom.time:
-                el_atom.setAttribute("time", str(atom.time))
-            if atom.type is not AtomTypes.TEXT:
-                el_atom.setAttribute("type", atom.type)
-            if atom.text:
-                el_atom.appendChild(root.createTextNode(atom.text))
-            el_scenario.appendChild(el_atom)
+            el_scenario.appendChild(atom.write_xml(root))
         el.appendChild(el_scenario)
 
         el_right: Element = root.createElement("right")
@@ -615,12 +924,6 @@ class Question(InfoOwner, JSONSerializeable, XMLOp):
         return f"SIGame Question, price: {self.price}"
 
 
-class QuestionTypeParam(Named):
-    def __init__(self, name: str, value: str = "") -> None:
-        super().__init__(name)
-        self.value: str = value
-
-
 class AtomTypes:
     TEXT = "text"
     ORAL = "say"
@@ -630,7 +933,9 @@ class AtomTypes:
     MARKER = "marker"
 
 
-class Atom(JSONSerializeable, XMLOp):
+class Atom(Tracked, JSONSerializeable, XMLOp):
+    __slots__ = ("type", "text", "time", "_owners")
+
     def __init__(self, text: str = "", a_type: str = AtomTypes.TEXT, time: int = 0) -> None:
         self.type: str = a_type
         self.text: str = text
@@ -645,15 +950,24 @@ class Atom(JSONSerializeable, XMLOp):
         return atom
 
     @classmethod
-    def json_deserialize(cls, d) -> None | Atom:
-        if "text" not in d:
-            return None
+    def json_deserialize(cls, d) -> Atom:
         text = d["text"]
         a_type = d.get("type", AtomTypes.TEXT)
         time = d.get("time", 0)
         atom = cls(text=text, a_type=a_type, time=time)
         return atom
 
+    @property
+    def canonical_time(self) -> int | str:
+        # SIQ keeps time as written, JSIQ may have it as a number
+        try:
+            return int(self.time or 0)
+        except (TypeError, ValueError):
+            return str(self.time)
+
+    def __reduce__(self):
+        return Atom, (self.text, self.type, self.time)
+
     def read_xml(self, el: Element) -> None:
         assert el.nodeName == "atom"
         self.text = el.childNodes[0].data if len(el.childNodes) != 0 else ""
@@ -663,7 +977,14 @@ class Atom(JSONSerializeable, XMLOp):
         self.type = AtomTypes.TEXT if a_type == "" else a_type
 
     def write_xml(self, root: Document) -> Element:
-        pass
+        el: Element = root.createElement("atom")
+        if self.time:
+            el.setAttribute("time", str(self.time))
+        if self.type != AtomTypes.TEXT:
+            el.setAttribute("type", self.type)
+        if self.text:
+            el.appendChild(root.createTextNode(self.text))
+        return el
 
     def __repr__(self):
         return f"SIGame Atom, type \"{self.type}\", text \"{self.text}\""
@@ -672,6 +993,33 @@ class Atom(JSONSerializeable, XMLOp):
 class SIDocumentTypes:
     SIQ = "siq"
     JSIQ = "jsiq.zip"
+    # Binary content with the same zip layout, see sigame_tools.binary
+    BSIQ = "bsiq"
+
+
+class SaveModes:
+    APPEND = "append"
+    REWRITE = "rewrite"
+
+
+class SIQReaders:
+    ITERPARSE = "iterparse"
+    MINIDOM = "minidom"
+    PARALLEL = "parallel"
+
+
+class SIQWriters:
+    STREAM = "stream"
+    MINIDOM = "minidom"
+
+
+class PackageFingerprint(NamedTuple):
+    # CRC of content.xml/content.json
+    content_crc: int
+    # SHA-256 of names, sizes and CRCs of all other members
+    members: str
+    # Package.digest in hex, None unless the content was read
+    digest: None | str = None
 
 
 class SIDocument:
@@ -679,92 +1027,255 @@ class SIDocument:
     IMAGE_STORAGE_NAME = "Images"
     AUDIO_STORAGE_NAME = "Audio"
     VIDEO_STORAGE_NAME = "Video"
+    STORAGE_NAMES = frozenset((TEXT_STORAGE_NAME, IMAGE_STORAGE_NAME, AUDIO_STORAGE_NAME, VIDEO_STORAGE_NAME))
+    # Media formats which gain nothing from deflate
+    COMPRESSED_MEDIA_SUFFIXES = frozenset((".jpg", ".jpeg", ".png", ".gif", ".webp",
+                                           ".mp3", ".ogg", ".opus", ".m4a", ".aac",
+                                           ".mp4", ".webm", ".mkv", ".avi"))
+
+    CONTENT_NAMES = {
+        SIDocumentTypes.SIQ: "content.xml",
+        SIDocumentTypes.JSIQ: "content.json",
+        SIDocumentTypes.BSIQ: "content.bin",
+    }
 
     def __init__(self, package: Package):
         self.package = package
         self.origin = None
 
-    # This is very ugly. Too bad!
-    def save_assets(self, other: ZipFile):
-        with ZipFile(self.origin, "r") as ziporigin:
-            for info in ziporigin.filelist:
-                for foldername in (SIDocument.TEXT_STORAGE_NAME, SIDocument.IMAGE_STORAGE_NAME,
-                                   SIDocument.AUDIO_STORAGE_NAME, SIDocument.VIDEO_STORAGE_NAME):
-                    if info.filename.startswith(f"{foldername}/"):
-                        filename = info.filename
-                        with ziporigin.open(filename, "r") as from_file:
-                            with other.open(filename, "w") as to_file:
+    @classmethod
+    def is_asset(cls, filename: str) -> bool:
+        folder, sep, _ = filename.partition("/")
+        return bool(sep) and folder in cls.STORAGE_NAMES
+
+    @classmethod
+    def is_compressed_media(cls, filename: str) -> bool:
+        _, dot, suffix = filename.rpartition(".")
+        return bool(dot) and f".{suffix.lower()}" in cls.COMPRESSED_MEDIA_SUFFIXES
+
+    def save_assets(self, other: ZipFile, raw: bool = True, store_media: bool = False):
+        """
+        Copy Texts/, Images/, Audio/ and Video/ members of the origin package to other.
+        With raw, compressed member data is moved as is without inflating it.
+        With store_media, already compressed media (jpg, mp3, mp4...) is written with ZIP_STORED.
+        """
+        if self.origin is None:
+            return
+        with profiling.phase("asset copy"), ZipFile(self.origin, "r") as ziporigin:
+            for info in ziporigin.infolist():
+                if not self.is_asset(info.filename):
+                    continue
+                store = store_media and self.is_compressed_media(info.filename)
+                if raw and (not store or info.compress_type == ZIP_STORED) and helper.can_copy_raw(info):
+                    helper.copy_member_raw(ziporigin, other, info)
+                    continue
+                if store:
+                    zinfo = ZipInfo(info.filename, info.date_time)
+                    zinfo.compress_type = ZIP_STORED
+                    zinfo.file_size = info.file_size
+                    zinfo.external_attr = info.external_attr
+                else:
+                    zinfo = info.filename
+                with ziporigin.open(info, "r") as from_file:
+                    with other.open(zinfo, "w") as to_file:
+                        shutil.copyfileobj(from_file, to_file)
+
+    # Shortcuts for the built-in formats, which are implemented in sigame_tools.formats
+
+    @classmethod
+    def read_siq(cls, path, reader: str = SIQReaders.ITERPARSE, lazy: bool = False,
+                 workers: None | int = None) -> SIDocument:
+        return cls.read_as(path, SIDocumentTypes.SIQ, reader=reader, lazy=lazy, workers=workers)
+
+    @classmethod
+    def read_jsiq(cls, path, lazy: bool = False) -> SIDocument:
+        return cls.read_as(path, SIDocumentTypes.JSIQ, lazy=lazy)
+
+    @classmethod
+    def read_bsiq(cls, path, lazy: bool = False) -> SIDocument:
+        return cls.read_as(path, SIDocumentTypes.BSIQ, lazy=lazy)
+
+    def write_siq_content(self, zipfile: ZipFile, writer: str = SIQWriters.STREAM):
+        self.write_content(zipfile, SIDocumentTypes.SIQ, writer=writer)
+
+    def write_jsiq_content(self, zipfile: ZipFile, indent: None | int = None, ensure_ascii: bool = False):
+        self.write_content(zipfile, SIDocumentTypes.JSIQ, indent=indent, ensure_ascii=ensure_ascii)
+
+    def write_bsiq_content(self, zipfile: ZipFile):
+        self.write_content(zipfile, SIDocumentTypes.BSIQ)
+
+    def write_content(self, zipfile: ZipFile, filetype: str, **kwargs):
+        from sigame_tools import formats
+        fmt = formats.FORMATS.get(filetype)
+        if fmt is None:
+            raise ValueError(f"Save error: Incorrect file type: '{filetype}'")
+        fmt.write_content(self, zipfile, **kwargs)
+
+    def save_siq(self, path, raw_assets: bool = True, store_media: bool = False, writer: str = SIQWriters.STREAM):
+        self.save_as(path, SIDocumentTypes.SIQ, raw_assets=raw_assets, store_media=store_media, writer=writer)
+
+    def save_jsiq(self, path, raw_assets: bool = True, store_media: bool = False,
+                  indent: None | int = None, ensure_ascii: bool = False):
+        self.save_as(path, SIDocumentTypes.JSIQ, raw_assets=raw_assets, store_media=store_media, indent=indent,
+                     ensure_ascii=ensure_ascii)
+
+    def save_bsiq(self, path, raw_assets: bool = True, store_media: bool = False):
+        self.save_as(path, SIDocumentTypes.BSIQ, raw_assets=raw_assets, store_media=store_media)
+
+    def save_in_place(self, mode: str = SaveModes.APPEND, **kwargs):
+        """
+        Write the package back to its origin, replacing only content.xml/content.json.
+        With APPEND, the new content is appended and only the central directory is rewritten, so the time does not
+        depend on the size of media. The old content is overwritten if it was stored last, otherwise it stays in
+        the file unreferenced until the next full save. The content is written to a temporary file first, so errors
+        while serializing it leave the origin as it was, only an interrupted copy can leave the file broken.
+        With REWRITE, all other members are copied raw into a temporary file which then replaces the origin.
+        kwargs are passed to the content writer of the format.
+        """
+        if self.origin is None:
+            raise ValueError("Save error: Document has no origin file")
+        if mode not in (SaveModes.APPEND, SaveModes.REWRITE):
+            raise ValueError(f"Save error: Incorrect save mode: '{mode}'")
+        origin = pathlib.Path(self.origin)
+        with ZipFile(origin, "r") as zipfile:
+            filetype, content_info = self.content_info(zipfile, "Save error")
+            content_name = content_info.filename
+
+        compression = content_info.compress_type
+        if mode == SaveModes.APPEND:
+            with tempfile.TemporaryFile(dir=origin.parent) as buffer:
+                with ZipFile(buffer, "w", compression=compression) as prepared:
+                    self.write_content(prepared, filetype, **kwargs)
+                with ZipFile(buffer, "r") as prepared, ZipFile(origin, "a", compression=compression) as zipfile:
+                    info = prepared.getinfo(content_name)
+                    helper.drop_member(zipfile, zipfile.getinfo(content_name))
+                    if helper.can_copy_raw(info):
+                        helper.copy_member_raw(prepared, zipfile, info)
+                    else:
+                        with prepared.open(info, "r") as from_file:
+                            with zipfile.open(content_name, "w", force_zip64=True) as to_file:
+                                shutil.copyfileobj(from_file, to_file)
+            return
+
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{origin.name}.", suffix=".tmp", dir=origin.parent)
+        os.close(fd)
+        tmp = pathlib.Path(tmp_name)
+        try:
+            with ZipFile(tmp, "w", compression=compression) as zipfile, ZipFile(origin, "r") as ziporigin:
+                with profiling.phase("asset copy"):
+                    for info in ziporigin.infolist():
+                        if info.filename == content_name:
+                            continue
+                        if helper.can_copy_raw(info):
+                            helper.copy_member_raw(ziporigin, zipfile, info)
+                            continue
+                        with ziporigin.open(info, "r") as from_file:
+                            with zipfile.open(info.filename, "w") as to_file:
                                 shutil.copyfileobj(from_file, to_file)
+                # Content goes last, so later appends overwrite it instead of leaving it unreferenced
+                self.write_content(zipfile, filetype, **kwargs)
+            shutil.copymode(origin, tmp)
+            os.replace(tmp, origin)
+        except BaseException:
+            tmp.unlink()
+            raise
 
     @classmethod
-    def read_siq(cls, path) -> SIDocument:
-        with ZipFile(path, "r") as zipfile:
-            with zipfile.open("content.xml") as fp:
-                document: Document = parse(fp)
-        package = Package.from_document(document)
-        doc = SIDocument(package)
-        doc.origin = path
-        return doc
+    def content_info(cls, zipfile: ZipFile, error: str = "Read error") -> Tuple[str, ZipInfo]:
+        """
+        File type of a package told by its content member, along with that member.
+        """
+        names = zipfile.namelist()
+        filetypes = [filetype for filetype, name in cls.CONTENT_NAMES.items() if name in names]
+        if len(filetypes) != 1:
+            raise ValueError(f"{error}: Unable to tell the format of '{zipfile.filename}'")
+        return filetypes[0], zipfile.getinfo(cls.CONTENT_NAMES[filetypes[0]])
 
     @classmethod
-    def read_jsiq(cls, path) -> SIDocument:
+    def fingerprint(cls, path, digest: bool = False) -> PackageFingerprint:
+        """
+        Fingerprint of a package file taken from its zip directory.
+        With digest, the content is read as well to add the digest of the package.
+        """
         with ZipFile(path, "r") as zipfile:
-            with zipfile.open("content.json") as fp:
-                package: Package = json.load(fp, object_hook=json_object_hook)
-        doc = SIDocument(package)
-        doc.origin = path
-        return doc
-
-    def save_siq(self, path):
-        with ZipFile(path, "w") as zipfile:
-            with zipfile.open("content.xml", "w") as fp:
-                root = Document()
-                doc = self.package.write_xml(root)
-                root.appendChild(doc)
-                xml_str = root.toprettyxml(indent="    ")
-                # xml_str = root.toprettyxml()
-                fp.write(xml_str.encode("utf-8"))
-                # json.dump(self.package, fp, default=default)
-                # iterable = content_parser.SIJSONEncoder(ensure_ascii=False, indent=2).iterencode(self.package)
-            self.save_assets(zipfile)
-
-    def save_jsiq(self, path):
-        with ZipFile(path, "w") as zipfile:
-            with zipfile.open("content.json", "w") as fp:
-                fp.write(json.dumps(self.package, default=json_default).encode("utf-8"))
-                # json.dump(self.package, fp, default=default)
-                # iterable = content_parser.SIJSONEncoder(ensure_ascii=False, indent=2).iterencode(self.package)
-            self.save_assets(zipfile)
+            filetype, content_info = cls.content_info(zipfile)
+            members = hashlib.sha256()
+            for info in sorted(zipfile.infolist(), key=lambda i: i.filename):
+                if info is not content_info:
+                    members.update(f"{info.filename}\0{info.file_size}\0{info.CRC}\0".encode("utf-8"))
+        package_digest = cls.read_as(path, filetype).package.digest.hex() if digest else None
+        return PackageFingerprint(content_info.CRC, members.hexdigest(), package_digest)
 
     @classmethod
-    def read_as(cls, path, filetype: str) -> SIDocument:
-        if filetype == SIDocumentTypes.SIQ:
-            return cls.read_siq(path)
-        if filetype == SIDocumentTypes.JSIQ:
-            return cls.read_jsiq(path)
-        raise ValueError("Read error: Incorrect file type")
-
-    def save_as(self, path, filetype: str):
-        if filetype == SIDocumentTypes.SIQ:
-            self.save_siq(path)
-            return
-        if filetype == SIDocumentTypes.JSIQ:
-            self.save_jsiq(path)
-            return
-        raise ValueError(f"Save error: Incorrect file type: '{filetype}'")
+    def has_changed(cls, path, fingerprint: PackageFingerprint) -> bool:
+        """
+        Whether a package file differs from a fingerprint taken before.
+        Only the zip directory is read, unless just the content CRC differs and the fingerprint has a digest:
+        then the content is read to tell apart an actual change from the same package written differently.
+        """
+        current = cls.fingerprint(path)
+        if current.members != fingerprint.members:
+            return True
+        if current.content_crc == fingerprint.content_crc:
+            return False
+        if fingerprint.digest is None:
+            return True
+        return cls.fingerprint(path, digest=True).digest != fingerprint.digest
+
+    @classmethod
+    def read_as(cls, path, filetype: str, **kwargs) -> SIDocument:
+        # Formats register themselves in sigame_tools.formats, kwargs go to the reader of the format
+        from sigame_tools import formats
+        fmt = formats.FORMATS.get(filetype)
+        if fmt is None:
+            raise ValueError("Read error: Incorrect file type")
+        return fmt.read(path, **kwargs)
+
+    def save_as(self, path, filetype: str, **kwargs):
+        from sigame_tools import formats
+        fmt = formats.FORMATS.get(filetype)
+        if fmt is None:
+            raise ValueError(f"Save error: Incorrect file type: '{filetype}'")
+        fmt.save(self, path, **kwargs)
 
 
 def json_default(o: Any) -> Any:
     if isinstance(o, JSONSerializeable):
         return o.json_serialize()
+    if isinstance(o, MutableSequence):
+        return list(o)
     return o
     # return JSONEncoder.default(self, o)
 
 
-def json_object_hook(d: dict) -> JSONSerializeable | dict:
-    data_cls: List[Type[JSONSerializeable]] = [Atom, Question, Theme, Round, Package]
-    for cls in data_cls:
-        res = cls.json_deserialize(d)
-        if res:
-            return res
-    return d
+def json_iterencode_package(package: Package, indent: None | int = None, ensure_ascii: bool = False,
+                            rounds: None | Iterable[Round] = None) -> Iterator[str]:
+    """
+    Encode package the same way as json.dumps, but one round at a time.
+    Each round still goes through the C encoder in one call, which pure iterencode would not use.
+    Without indent the output is compact. Rounds are taken from the given iterable instead of package.rounds
+    if there is one.
+    """
+    separators = (",", ":") if indent is None else (",", ": ")
+    encoder = json.JSONEncoder(default=json_default, ensure_ascii=ensure_ascii, indent=indent, separators=separators)
+    # Encoded JSON never contains raw newlines inside strings, so nested output can be re-indented by replacing them
+    newline, pad = ("", "") if indent is None else ("\n", " " * indent)
+    item_separator = separators[0] + newline
+    d = package.json_serialize()
+    yield "{"
+    for i, (key, value) in enumerate(d.items()):
+        yield f"{item_separator if i else newline}{pad}{encoder.encode(key)}{separators[1]}"
+        if key == "rounds":
+            value = iter(value if rounds is None else rounds)
+            first_round = next(value, None)
+            if first_round is None:
+                yield "[]"
+                continue
+            yield "["
+            for j, p_round in enumerate(itertools.chain((first_round,), value)):
+                yield f"{item_separator if j else newline}{pad * 2}"
+                yield encoder.encode(p_round).replace("\n", "\n" + pad * 2)
+            yield f"{newline}{pad}]"
+        else:
+            yield encoder.encode(value).replace("\n", "\n" + pad)
+    yield f"{newline}}}"
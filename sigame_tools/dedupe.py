@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import pathlib
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from sigame_tools.datatypes import Package, SIDocument
+from sigame_tools.index import cache_dir, content_hash
+from sigame_tools.search import normalize, question_text
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+SEED = 1
+# Pairwise checks inside one LSH bucket are quadratic, bigger buckets are only checked against their first member
+MAX_BUCKET_PAIRWISE = 50
+# Largest prime below 2 ** 32, the hash family works modulo it
+_PRIME = 4294967291
+# Part of the signature cache key, bumped whenever signatures of the same text change
+HASH_VERSION = 2
+_SPACES = re.compile(r"\s+")
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("Near-duplicate detection requires numpy, install it with 'pip install SIGameTools[dedupe]'")
+
+
+class QuestionRef(NamedTuple):
+    path: str
+    round: int
+    theme: int
+    question: int
+    text: str
+
+    def __repr__(self) -> str:
+        return f"{self.path}: round {self.round + 1}, theme {self.theme + 1}, question {self.question + 1}: {self.text}"
+
+
+class DuplicateCluster(NamedTuple):
+    questions: List[QuestionRef]
+    # Estimated Jaccard similarity of the least similar verified pair
+    similarity: float
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """
+    CRC32 of every character size-gram of the normalized text (the whole text if it is shorter).
+    """
+    text = _SPACES.sub(" ", normalize(text)).strip()
+    if not text:
+        return []
+    if len(text) <= size:
+        return [zlib.crc32(text.encode("utf-8"))]
+    return list({zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)})
+
+
+def question_fingerprint_text(question) -> str:
+    return question_text(question) + " | " + " | ".join(question.right)
+
+
+def permutations(num_perm: int = NUM_PERM, seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    require_numpy()
+    rng = np.random.default_rng(seed)
+    # a, b and h are below the prime, so a * h + b stays below 2 ** 64 and never overflows uint64
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(shingles: List[List[int]], num_perm: int = NUM_PERM, seed: int = SEED,
+                       batch_shingles: int = 1 << 15) -> np.ndarray:
+    """
+    MinHash signatures (len(shingles) x num_perm, uint32) computed for batches of questions at once.
+    Every shingle list has to be non-empty.
+    """
+    require_numpy()
+    a, b = permutations(num_perm, seed)
+    signatures = np.empty((len(shingles), num_perm), dtype=np.uint32)
+    start = 0
+    while start < len(shingles):
+        end, total = start, 0
+        while end < len(shingles) and (end == start or total + len(shingles[end]) <= batch_shingles):
+            total += len(shingles[end])
+            end += 1
+        lengths = np.fromiter((len(s) for s in shingles[start:end]), dtype=np.int64, count=end - start)
+        hashes = np.fromiter((h for s in shingles[start:end] for h in s), dtype=np.uint64, count=total)
+        hashes %= np.uint64(_PRIME)
+        values = (a[:, None] * hashes[None, :] + b[:, None]) % np.uint64(_PRIME)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures[start:end] = np.minimum.reduceat(values, offsets, axis=1).T
+        start = end
+    return signatures
+
+
+class PackSignatures(NamedTuple):
+    path: str
+    coordinates: np.ndarray
+    texts: np.ndarray
+    signatures: np.ndarray
+
+
+def package_signatures(path: str, package: Package, num_perm: int = NUM_PERM) -> PackSignatures:
+    coordinates: List[Tuple[int, int, int]] = []
+    texts: List[str] = []
+    shingles: List[List[int]] = []
+    for round_i, _round in enumerate(package.rounds):
+        for theme_i, theme in enumerate(_round.themes):
+            for question_i, question in enumerate(theme.questions):
+                text = question_fingerprint_text(question)
+                hashes = shingle_hashes(text)
+                if not hashes:
+                    continue
+                coordinates.append((round_i, theme_i, question_i))
+                texts.append(text[:80])
+                shingles.append(hashes)
+    return PackSignatures(path, np.array(coordinates, dtype=np.int32).reshape(-1, 3),
+                          np.array(texts, dtype=str), minhash_signatures(shingles, num_perm))
+
+
+def load_signatures(path: str | pathlib.Path, filetype: str, num_perm: int = NUM_PERM,
+                    cache: None | pathlib.Path = None) -> PackSignatures:
+    """
+    Signatures of all questions of a package, cached by the hash of its content so unchanged packs are not parsed.
+    """
+    require_numpy()
+    cache = cache or cache_dir() / "dedupe"
+    key = str(pathlib.Path(path).resolve())
+    cached = cache / f"{content_hash(path, filetype)}-{num_perm}-{SHINGLE_SIZE}-{SEED}-{HASH_VERSION}.npz"
+    if cached.exists():
+        with np.load(cached) as data:
+            return PackSignatures(key, data["coordinates"], data["texts"], data["signatures"])
+    pack = package_signatures(key, SIDocument.read_as(path, filetype).package, num_perm)
+    cache.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".tmp.npz")
+    np.savez(tmp, coordinates=pack.coordinates, texts=pack.texts, signatures=pack.signatures)
+    tmp.replace(cached)
+    return pack
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Bands and rows per band whose LSH threshold (1 / bands) ** (1 / rows) is closest to threshold without exceeding it.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+def find_duplicates(packs: Iterable[PackSignatures], threshold: float = 0.8) -> List[DuplicateCluster]:
+    """
+    Group questions whose estimated Jaccard similarity is at least threshold.
+    """
+    require_numpy()
+    packs = [pack for pack in packs if len(pack.signatures)]
+    if not packs:
+        return []
+    signatures = np.concatenate([pack.signatures for pack in packs])
+    refs = [QuestionRef(pack.path, int(r), int(t), int(q), str(text))
+            for pack in packs for (r, t, q), text in zip(pack.coordinates, pack.texts)]
+    num_perm = signatures.shape[1]
+    bands, rows = lsh_params(num_perm, threshold)
+
+    candidates = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band_rows = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i, row in enumerate(band_rows):
+            buckets[row.tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) > MAX_BUCKET_PAIRWISE:
+                candidates.update((members[0], j) for j in members[1:])
+            else:
+                candidates.update((i, j) for n, i in enumerate(members) for j in members[n + 1:])
+
+    parent = list(range(len(refs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    similarity: Dict[int, float] = {}
+    for i, j in candidates:
+        score = float(np.count_nonzero(signatures[i] == signatures[j])) / num_perm
+        if score < threshold:
+            continue
+        root_i, root_j = find(i), find(j)
+        low = min(score, similarity.pop(root_i, 1.0), similarity.pop(root_j, 1.0) if root_i != root_j else 1.0)
+        parent[root_j] = root_i
+        similarity[root_i] = low
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(refs)):
+        root = find(i)
+        if root in similarity:
+            clusters[root].append(i)
+    result = [DuplicateCluster([refs[i] for i in members], similarity[root]) for root, members in clusters.items()]
+    result.sort(key=lambda cluster: (-len(cluster.questions), -cluster.similarity))
+    return result
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import copy
+from typing import Any, Dict, List, NamedTuple, Tuple
+from zipfile import ZipFile
+
+from sigame_tools import helper
+from sigame_tools.datatypes import InfoOwner, ModelList, Package, Question, Round, SIDocument, Theme
+from sigame_tools.lazy import LazyList
+
+# Attribute holding the children of each container
+CHILDREN = {Package: "rounds", Round: "themes", Theme: "questions"}
+
+Key = Tuple[Any, int]
+# A child along with the raw content it was lazily read from, None if unknown
+Entry = Tuple[InfoOwner, Any]
+
+
+class Change(NamedTuple):
+    kind: str
+    path: Tuple[str, ...]
+    old: Any = None
+    new: Any = None
+    # Changed fields of questions, e.g. "scenario" or "right"
+    fields: Tuple[str, ...] = ()
+
+    def __repr__(self) -> str:
+        mark = {"added": "+", "removed": "-", "changed": "~"}[self.kind]
+        fields = f" ({', '.join(self.fields)})" if self.fields else ""
+        return f"{mark} {' / '.join(self.path)}{fields}"
+
+
+class Conflict(NamedTuple):
+    path: Tuple[str, ...]
+    reason: str
+
+    def __repr__(self) -> str:
+        return f"! {' / '.join(self.path)}: {self.reason}"
+
+
+def _entries(item: InfoOwner) -> Dict[Key, Entry]:
+    items = item.digest_children()
+    lazy = isinstance(items, LazyList)
+    seen: Dict[Any, int] = {}
+    keyed: Dict[Key, Entry] = {}
+    for index, child in enumerate(items):
+        label = child.price if isinstance(child, Question) else child.name
+        n = seen.get(label, 0)
+        seen[label] = n + 1
+        keyed[(label, n)] = child, items.source(index) if lazy else None
+    return keyed
+
+
+def children(item: InfoOwner) -> Dict[Key, InfoOwner]:
+    """
+    Children of a package, round or theme by key.
+    Siblings are told apart by name (price for questions) and by their occurrence among equally named ones.
+    """
+    return {key: child for key, (child, _) in _entries(item).items()}
+
+
+def _question_content(question: Question) -> Tuple[Any, ...]:
+    # Everything but the price
+    return question.digest_fields()[1:]
+
+
+def _match_questions(old: Dict[Key, Entry], new: Dict[Key, Entry]) -> Dict[Key, Entry]:
+    """
+    Questions of new keyed like their old versions where their price changed: a question whose key is not in old
+    takes the key of an unmatched old question with the same content apart from the price,
+    or else of the unmatched old question at the same position.
+    """
+    unmatched = {key: position for position, key in enumerate(old) if key not in new}
+    added = [key for key in new if key not in old]
+    if not unmatched or not added:
+        return new
+    by_content: Dict[Tuple[Any, ...], List[Key]] = {}
+    for key in unmatched:
+        by_content.setdefault(_question_content(old[key][0]), []).append(key)
+    keys: Dict[Key, Key] = {}
+    for key in added:
+        same = by_content.get(_question_content(new[key][0]))
+        if same:
+            keys[key] = same.pop(0)
+            del unmatched[keys[key]]
+    by_position = {position: key for key, position in unmatched.items()}
+    for position, key in enumerate(new):
+        if key in added and key not in keys and position in by_position:
+            keys[key] = by_position.pop(position)
+    return {keys.get(key, key): entry for key, entry in new.items()}
+
+
+def _child_entries(old: None | InfoOwner, new: InfoOwner) -> Dict[Key, Entry]:
+    entries = _entries(new)
+    if isinstance(new, Theme) and old is not None:
+        return _match_questions(_entries(old), entries)
+    return entries
+
+
+def _same(a: None | Entry, b: None | Entry, by_source: bool) -> bool:
+    if a is None or b is None:
+        return a is b
+    if not by_source:
+        return a[0].digest == b[0].digest
+    # Equal raw content means equal items without loading them, other ones are compared by their children
+    # rather than hashed, which would read their unchanged subtrees too
+    if a[1] is not None and a[1] == b[1]:
+        return True
+    if isinstance(a[0], Question):
+        return a[0].digest == b[0].digest
+    if a[0].digest_fields() != b[0].digest_fields():
+        return False
+    a_children, b_children = _entries(a[0]), _entries(b[0])
+    return list(a_children) == list(b_children) and all(
+        _same(entry, b_children[key], by_source) for key, entry in a_children.items())
+
+
+def _label(key: Key) -> str:
+    label, n = key
+    return f"{label}" if n == 0 else f"{label} ({n + 1})"
+
+
+def _diff_items(old: Entry, new: Entry, path: Tuple[str, ...], changes: List[Change], by_source: bool) -> None:
+    if _same(old, new, by_source):
+        return
+    (old, _), (new, _) = old, new
+    old_fields, new_fields = old.digest_fields(), new.digest_fields()
+    if isinstance(old, Question):
+        changes.append(Change("changed", path, old, new, tuple(
+            name for name, old_value, new_value in zip(Question.DIGEST_FIELDS, old_fields, new_fields)
+            if old_value != new_value
+        )))
+        return
+    if old_fields != new_fields:
+        changes.append(Change("changed", path, old, new))
+    old_children = _entries(old)
+    new_children = _child_entries(old, new)
+    for key, (child, _) in old_children.items():
+        if key not in new_children:
+            changes.append(Change("removed", path + (_label(key),), old=child))
+    for key, entry in new_children.items():
+        old_entry = old_children.get(key)
+        if old_entry is None:
+            changes.append(Change("added", path + (_label(key),), new=entry[0]))
+        else:
+            _diff_items(old_entry, entry, path + (_label(key),), changes, by_source)
+
+
+def diff_packages(old: Package, new: Package, by_source: bool = False) -> List[Change]:
+    """
+    Changes between two packages, rounds and themes are matched by name and questions by price,
+    or by content and position when their price changed.
+    Subtrees with equal digests are skipped, so once both packages are hashed only changed paths are walked.
+    With by_source, subtrees of lazily read packages with equal raw content are skipped without reading them,
+    which only holds for packages not edited since they were read.
+    """
+    changes: List[Change] = []
+    _diff_items((old, None), (new, None), (), changes, by_source)
+    return changes
+
+
+def media_members(path) -> Dict[str, Tuple[int, int]]:
+    """
+    CRC and size of asset members, taken from the zip directory without reading the data.
+    """
+    with ZipFile(path, "r") as zipfile:
+        return {info.filename: (info.CRC, info.file_size) for info in zipfile.infolist()
+                if SIDocument.is_asset(info.filename)}
+
+
+def diff_media(old_path, new_path) -> List[Change]:
+    old, new = media_members(old_path), media_members(new_path)
+    changes = [Change("removed", ("media", name)) for name in old if name not in new]
+    for name, crc in new.items():
+        if name not in old:
+            changes.append(Change("added", ("media", name)))
+        elif old[name] != crc:
+            changes.append(Change("changed", ("media", name)))
+    return changes
+
+
+def same_content(path, other) -> bool:
+    """
+    Whether two package files have the same content member, told from their zip directories alone.
+    """
+    with ZipFile(path, "r") as zipfile, ZipFile(other, "r") as other_zipfile:
+        (filetype, info), (other_type, other_info) = (SIDocument.content_info(zipfile),
+                                                      SIDocument.content_info(other_zipfile))
+    return filetype == other_type and (info.CRC, info.file_size) == (other_info.CRC, other_info.file_size)
+
+
+def diff_files(old_path, old_type: str, new_path, new_type: str) -> List[Change]:
+    changes = []
+    if not same_content(old_path, new_path):
+        # Read lazily, only subtrees whose content differs are parsed and hashed
+        old = SIDocument.read_as(old_path, old_type, lazy=True).package
+        new = SIDocument.read_as(new_path, new_type, lazy=True).package
+        changes = diff_packages(old, new, by_source=True)
+    return changes + diff_media(old_path, new_path)
+
+
+def _merge_items(base: None | Entry, ours: None | Entry, theirs: None | Entry, path: Tuple[str, ...],
+                 conflicts: List[Conflict], by_source: bool) -> None | InfoOwner:
+    # Returns the merged item, None when it is removed
+    if _same(ours, theirs, by_source) or _same(base, theirs, by_source):
+        return ours and ours[0]
+    if _same(base, ours, by_source):
+        return theirs and theirs[0]
+
+    if ours is None or theirs is None:
+        conflicts.append(Conflict(path, "removed on one side, changed on the other"))
+        # Keep the changed version
+        return (ours or theirs)[0]
+    base, ours, theirs = base and base[0], ours[0], theirs[0]
+    if isinstance(ours, Question):
+        conflicts.append(Conflict(path, "changed on both sides"))
+        return ours
+
+    base_fields = base.digest_fields() if base is not None else None
+    our_fields, their_fields = ours.digest_fields(), theirs.digest_fields()
+    source = ours
+    if our_fields == base_fields:
+        source = theirs
+    elif their_fields not in (base_fields, our_fields):
+        conflicts.append(Conflict(path, "fields changed on both sides"))
+    base_children = _entries(base) if base is not None else {}
+    our_children, their_children = _child_entries(base, ours), _child_entries(base, theirs)
+    merged = ModelList()
+    for key in list(our_children) + [key for key in their_children if key not in our_children]:
+        child = _merge_items(base_children.get(key), our_children.get(key), their_children.get(key),
+                             path + (_label(key),), conflicts, by_source)
+        if child is not None:
+            merged.append(child)
+    item = copy.copy(source)
+    setattr(item, CHILDREN[type(item)], merged)
+    return item
+
+
+def merge_packages(base: Package, ours: Package, theirs: Package,
+                   by_source: bool = False) -> Tuple[Package, List[Conflict]]:
+    """
+    Three-way merge, taking every subtree changed on one side only from that side.
+    Subtrees changed on both sides are merged by their children, conflicting questions are kept as in ours.
+    Unchanged objects are shared with the inputs rather than copied. by_source is the same as in diff_packages.
+    """
+    conflicts: List[Conflict] = []
+    package = _merge_items((base, None), (ours, None), (theirs, None), (), conflicts, by_source)
+    return package, conflicts
+
+
+def merge_files(base_path, ours_path, theirs_path, dst, filetypes: Tuple[str, str, str], output_type: str,
+                **kwargs) -> List[Conflict]:
+    """
+    Merge three revisions of a package into dst.
+    Media comes from ours, along with media added in theirs.
+    """
+    base, ours, theirs = (SIDocument.read_as(path, filetype, lazy=True).package
+                          for path, filetype in zip((base_path, ours_path, theirs_path), filetypes))
+    package, conflicts = merge_packages(base, ours, theirs, by_source=True)
+    doc = SIDocument(package)
+    doc.origin = ours_path
+    # Media is read from ours while writing, which dst may be
+    with helper.replacing(dst) as tmp:
+        doc.save_as(tmp, output_type, **kwargs)
+        added = media_members(theirs_path).keys() - media_members(base_path).keys() - media_members(ours_path).keys()
+        if added:
+            with ZipFile(tmp, "a") as zipfile, ZipFile(theirs_path, "r") as ziptheirs:
+                for name in sorted(added):
+                    info = ziptheirs.getinfo(name)
+                    if helper.can_copy_raw(info):
+                        helper.copy_member_raw(ziptheirs, zipfile, info)
+                    else:
+                        zipfile.writestr(info, ziptheirs.read(info))
+    return conflicts
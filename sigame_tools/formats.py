@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import time
+from abc import ABC, abstractmethod
+from typing import IO, Dict, Iterable, Iterator, Tuple
+from xml.dom.minidom import Document, parse
+from zipfile import BadZipFile, ZipFile, ZipInfo, ZIP_DEFLATED
+
+from sigame_tools import helper, profiling
+from sigame_tools.datatypes import (Package, Round, SIDocument, SIDocumentTypes, SIQReaders, SIQWriters,
+                                    json_iterencode_package)
+
+# Bytes of the content member read to sniff its format
+SNIFF_SIZE = 64
+_BOM = b"\xef\xbb\xbf"
+
+
+class Format(ABC):
+    """
+    Package format: a zip with a content member and media.
+    Besides whole documents, formats read and write packages as a package shell followed by a stream of rounds,
+    which is what conversions use.
+    """
+    name = ""
+    # File name suffix, e.g. ".siq"
+    suffix = ""
+    # Name of the content member inside the zip
+    content_name = ""
+
+    @abstractmethod
+    def sniff(self, head: bytes) -> bool:
+        """
+        Whether the first bytes of the content member belong to this format.
+        """
+        pass
+
+    @abstractmethod
+    def stream_package(self, fp: IO[bytes]) -> Tuple[Package, Iterator[Round]]:
+        """
+        Read the content member into a Package without rounds and an iterator of its rounds.
+        """
+        pass
+
+    @abstractmethod
+    def write_stream(self, fp: IO[bytes], package: Package, rounds: Iterable[Round], **kwargs) -> None:
+        """
+        Write the content member from package with rounds taken from the iterable.
+        """
+        pass
+
+    def read(self, path, lazy: bool = False) -> SIDocument:
+        """
+        Read a whole document. With lazy, rounds, themes and questions may be built on first access instead,
+        formats which cannot do that build them right away.
+        """
+        with profiling.phase("zip open"):
+            zipfile = ZipFile(path, "r")
+        with zipfile, zipfile.open(self.content_name) as fp, profiling.phase("parse"):
+            package, rounds = self.stream_package(fp)
+            package.rounds.extend(rounds)
+        doc = SIDocument(package)
+        doc.origin = path
+        return doc
+
+    def open_content(self, zipfile: ZipFile) -> IO[bytes]:
+        return zipfile.open(self.content_name, "w")
+
+    def write_content(self, doc: SIDocument, zipfile: ZipFile, **kwargs) -> None:
+        with profiling.phase("serialize"), self.open_content(zipfile) as fp:
+            self.write_stream(fp, doc.package, doc.package.rounds, **kwargs)
+
+    def save(self, doc: SIDocument, path, raw_assets: bool = True, store_media: bool = False, **kwargs) -> None:
+        with ZipFile(path, "w") as zipfile:
+            self.write_content(doc, zipfile, **kwargs)
+            doc.save_assets(zipfile, raw=raw_assets, store_media=store_media)
+
+
+class SIQFormat(Format):
+    name = SIDocumentTypes.SIQ
+    suffix = ".siq"
+    content_name = "content.xml"
+
+    def sniff(self, head: bytes) -> bool:
+        if head.startswith(_BOM):
+            head = head[len(_BOM):]
+        return head.lstrip().startswith(b"<")
+
+    def stream_package(self, fp: IO[bytes]) -> Tuple[Package, Iterator[Round]]:
+        from sigame_tools import siq_reader
+        return siq_reader.stream_package(fp)
+
+    def write_stream(self, fp: IO[bytes], package: Package, rounds: Iterable[Round]) -> None:
+        from sigame_tools import siq_writer
+        siq_writer.write_package(fp, package, rounds)
+
+    def read(self, path, reader: str = SIQReaders.ITERPARSE, lazy: bool = False,
+             workers: None | int = None) -> SIDocument:
+        # reader picks the parser engine, see SIQReaders
+        with profiling.phase("zip open"):
+            zipfile = ZipFile(path, "r")
+        with zipfile:
+            with zipfile.open(self.content_name) as fp:
+                if reader == SIQReaders.MINIDOM and not lazy:
+                    with profiling.phase("parse"):
+                        document: Document = parse(fp)
+                    with profiling.phase("build"):
+                        package = Package.from_document(document)
+                else:
+                    # The other readers build objects while parsing, so both count as parsing
+                    with profiling.phase("parse"):
+                        if lazy:
+                            from sigame_tools import lazy as lazy_reader
+                            package = lazy_reader.read_siq_package(fp.read())
+                        elif reader == SIQReaders.ITERPARSE:
+                            from sigame_tools import siq_reader
+                            package = siq_reader.read_package(fp)
+                        elif reader == SIQReaders.PARALLEL:
+                            from sigame_tools import parallel_reader
+                            package = parallel_reader.read_package(fp.read(), workers)
+                        else:
+                            raise ValueError(f"Read error: Incorrect SIQ reader: '{reader}'")
+        doc = SIDocument(package)
+        doc.origin = path
+        return doc
+
+    @staticmethod
+    def check_writer(writer: str) -> None:
+        if writer not in (SIQWriters.STREAM, SIQWriters.MINIDOM):
+            raise ValueError(f"Save error: Incorrect SIQ writer: '{writer}'")
+
+    def write_content(self, doc: SIDocument, zipfile: ZipFile, writer: str = SIQWriters.STREAM) -> None:
+        self.check_writer(writer)
+        if writer == SIQWriters.STREAM:
+            super().write_content(doc, zipfile)
+            return
+        with profiling.phase("serialize"), self.open_content(zipfile) as fp:
+            root = Document()
+            root.appendChild(doc.package.write_xml(root))
+            fp.write(root.toprettyxml(indent="    ").encode("utf-8"))
+
+    def save(self, doc: SIDocument, path, raw_assets: bool = True, store_media: bool = False,
+             writer: str = SIQWriters.STREAM) -> None:
+        # Checked before the file is opened, so a bad writer leaves it as it was
+        self.check_writer(writer)
+        super().save(doc, path, raw_assets, store_media, writer=writer)
+
+
+class JSIQFormat(Format):
+    name = SIDocumentTypes.JSIQ
+    suffix = ".jsiq.zip"
+    content_name = "content.json"
+
+    def sniff(self, head: bytes) -> bool:
+        return head.lstrip().startswith(b"{")
+
+    def stream_package(self, fp: IO[bytes]) -> Tuple[Package, Iterator[Round]]:
+        # JSON has no pull parser in the standard library, so only building objects happens round by round
+        d = json.load(fp)
+        package = Package.json_deserialize({**d, "rounds": []})
+        return package, (Round.json_deserialize(d_round) for d_round in d["rounds"])
+
+    def write_stream(self, fp: IO[bytes], package: Package, rounds: Iterable[Round], indent: None | int = None,
+                     ensure_ascii: bool = False) -> None:
+        helper.write_chunks(fp, json_iterencode_package(package, indent=indent, ensure_ascii=ensure_ascii,
+                                                        rounds=rounds))
+
+    def read(self, path, lazy: bool = False) -> SIDocument:
+        with profiling.phase("zip open"):
+            zipfile = ZipFile(path, "r")
+        with zipfile:
+            with zipfile.open(self.content_name) as fp:
+                with profiling.phase("parse"):
+                    d = json.load(fp)
+                with profiling.phase("build"):
+                    if lazy:
+                        from sigame_tools import lazy as lazy_reader
+                        package = lazy_reader.read_jsiq_package(d)
+                    else:
+                        package = Package.json_deserialize(d)
+        doc = SIDocument(package)
+        doc.origin = path
+        return doc
+
+
+class BSIQFormat(Format):
+    name = SIDocumentTypes.BSIQ
+    suffix = ".bsiq"
+    content_name = "content.bin"
+
+    def sniff(self, head: bytes) -> bool:
+        from sigame_tools import binary
+        return head.startswith(binary.MAGIC)
+
+    def stream_package(self, fp: IO[bytes]) -> Tuple[Package, Iterator[Round]]:
+        from sigame_tools import binary
+        return binary.stream_package(fp.read())
+
+    def write_stream(self, fp: IO[bytes], package: Package, rounds: Iterable[Round]) -> None:
+        from sigame_tools import binary
+        binary.write_package(fp, package, rounds)
+
+    def open_content(self, zipfile: ZipFile) -> IO[bytes]:
+        # Deflate costs little to inflate compared to building objects and takes the content down several times
+        info = ZipInfo(self.content_name, time.localtime()[:6])
+        info.compress_type = ZIP_DEFLATED
+        return zipfile.open(info, "w")
+
+    # Binary content builds objects faster than a lazy package would find them, so read ignores lazy
+
+
+FORMATS: Dict[str, Format] = {}
+
+
+def register(fmt: Format) -> Format:
+    """
+    Make a format available to SIDocument.read_as/save_as, sniffing, conversions and the CLI.
+    """
+    if fmt.name in FORMATS:
+        raise ValueError(f"Format '{fmt.name}' is already registered")
+    FORMATS[fmt.name] = fmt
+    SIDocument.CONTENT_NAMES[fmt.name] = fmt.content_name
+    return fmt
+
+
+for _fmt in (SIQFormat(), JSIQFormat(), BSIQFormat()):
+    register(_fmt)
+
+
+def get_format(name: str) -> Format:
+    fmt = FORMATS.get(name)
+    if fmt is None:
+        raise ValueError(f"Incorrect file type: '{name}'")
+    return fmt
+
+
+def from_suffix(name: str) -> None | Format:
+    """
+    Format told by a file name, the longest matching suffix wins.
+    """
+    matches = [fmt for fmt in FORMATS.values() if name.endswith(fmt.suffix)]
+    return max(matches, key=lambda fmt: len(fmt.suffix), default=None)
+
+
+def sniff(path) -> None | Format:
+    """
+    Format of a package file told by its content member and the first bytes of it, None if nothing matches.
+    Only the zip directory and a few bytes are read.
+    """
+    try:
+        zipfile = ZipFile(path, "r")
+    except (BadZipFile, OSError):
+        return None
+    with zipfile:
+        names = set(zipfile.namelist())
+        for fmt in FORMATS.values():
+            if fmt.content_name not in names:
+                continue
+            with zipfile.open(fmt.content_name) as fp:
+                if fmt.sniff(fp.read(SNIFF_SIZE)):
+                    return fmt
+    return None
+
+
+def guess(path) -> None | Format:
+    """
+    Format of an existing package file as sniffed, falling back to its name for files which are not packages
+    (so reading them fails with a proper error) or do not exist yet.
+    """
+    path = pathlib.Path(path)
+    fmt = sniff(path) if path.is_file() else None
+    return fmt or from_suffix(path.name)
+
+
+def convert(src, dst, input_type: None | str = None, output_type: None | str = None, raw_assets: bool = True,
+            store_media: bool = False, **kwargs) -> None:
+    """
+    Convert a package by piping the rounds of the reader into the writer, so the whole Package is never built.
+    For SIQ input only a single round is parsed at a time. Formats are guessed when not given,
+    kwargs go to the writer. dst is only replaced once the conversion succeeds.
+    """
+    input_format = get_format(input_type) if input_type else sniff(src)
+    if input_format is None:
+        raise ValueError(f"Read error: Unable to tell the format of '{src}'")
+    output_format = get_format(output_type) if output_type else from_suffix(pathlib.Path(dst).name)
+    if output_format is None:
+        raise ValueError(f"Save error: Unable to tell the format of '{dst}'")
+    with helper.replacing(dst) as tmp:
+        if not _convert_stream(src, tmp, input_format, output_format, raw_assets, store_media, **kwargs):
+            # SIQ allows package info and tags after the rounds, which the package written before the rounds
+            # misses, such packages are converted as a whole instead
+            doc = input_format.read(src)
+            output_format.save(doc, tmp, raw_assets=raw_assets, store_media=store_media, **kwargs)
+
+
+def _convert_stream(src, dst, input_format: Format, output_format: Format, raw_assets: bool, store_media: bool,
+                    **kwargs) -> bool:
+    # Tells whether the package was complete before its rounds were read
+    with profiling.phase("zip open"):
+        zipsrc = ZipFile(src, "r")
+    with zipsrc, zipsrc.open(input_format.content_name) as fp, ZipFile(dst, "w") as zipdst:
+        # Reading and writing interleave, so both count as serializing
+        with profiling.phase("serialize"), output_format.open_content(zipdst) as out:
+            package, rounds = input_format.stream_package(fp)
+            fields = package.digest_fields()
+            output_format.write_stream(out, package, rounds, **kwargs)
+        if package.digest_fields() != fields:
+            return False
+        doc = SIDocument(package)
+        doc.origin = src
+        doc.save_assets(zipdst, raw=raw_assets, store_media=store_media)
+    return True
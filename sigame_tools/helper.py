@@ -1,4 +1,16 @@
-from xml.dom.minidom import Element, Text
+import copy
+import os
+import pathlib
+import shutil
+import struct
+from contextlib import contextmanager
+from typing import IO, Iterable, Iterator, List
+from xml.dom.minidom import Element, Node, Text
+from zipfile import ZipFile, ZipInfo, BadZipFile, ZIP64_LIMIT, sizeFileHeader, stringFileHeader
+
+# Data descriptor flag: CRC and sizes follow the data instead of being in the local header
+_FLAG_DATA_DESCRIPTOR = 0x08
+_COPY_BUFSIZE = 1024 * 1024
 
 
 def get_text(el: Element) -> str:
@@ -6,3 +18,92 @@ def get_text(el: Element) -> str:
         return ""
     text: Text = el.childNodes[0]
     return text.data
+
+
+def child_elements(el: Element) -> Iterator[Element]:
+    return (node for node in el.childNodes if node.nodeType == Node.ELEMENT_NODE)
+
+
+def can_copy_raw(info: ZipInfo) -> bool:
+    return info.file_size < ZIP64_LIMIT and info.compress_size < ZIP64_LIMIT
+
+
+def copy_member_raw(src: ZipFile, dst: ZipFile, info: ZipInfo) -> None:
+    """
+    Copy a member from src to dst as is, without decompressing and compressing its data again.
+    dst has to be open for writing and must not have another member open at the moment.
+    """
+    src.fp.seek(info.header_offset)
+    header = src.fp.read(sizeFileHeader)
+    if len(header) != sizeFileHeader or header[0:4] != stringFileHeader:
+        raise BadZipFile(f"Bad local file header for '{info.filename}'")
+    filename_length, extra_length = struct.unpack("<HH", header[26:30])
+    src.fp.seek(filename_length + extra_length, 1)
+
+    zinfo = copy.copy(info)
+    # CRC and sizes are already known, so they go to the local header
+    zinfo.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    dst.fp.seek(dst.start_dir)
+    zinfo.header_offset = dst.fp.tell()
+    dst.fp.write(zinfo.FileHeader(False))
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = src.fp.read(min(remaining, _COPY_BUFSIZE))
+        if not chunk:
+            raise BadZipFile(f"Truncated data for '{info.filename}'")
+        dst.fp.write(chunk)
+        remaining -= len(chunk)
+    dst.start_dir = dst.fp.tell()
+    dst.filelist.append(zinfo)
+    dst.NameToInfo[zinfo.filename] = zinfo
+    dst._didModify = True
+
+
+def drop_member(zipfile: ZipFile, info: ZipInfo) -> None:
+    """
+    Leave a member out of the central directory of a zipfile open in append mode.
+    If it is stored last, new members overwrite its data, otherwise the data stays in the file unreferenced.
+    """
+    zipfile.filelist.remove(info)
+    del zipfile.NameToInfo[info.filename]
+    if all(other.header_offset < info.header_offset for other in zipfile.filelist):
+        zipfile.start_dir = info.header_offset
+        zipfile.fp.seek(zipfile.start_dir)
+    zipfile._didModify = True
+
+
+def write_chunks(fp: IO[bytes], chunks: Iterable[str], buffer_size: int = 1 << 16) -> None:
+    """
+    Encode text chunks to UTF-8 and write them to fp in batches of about buffer_size characters.
+    """
+    parts: List[str] = []
+    buffered = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        buffered += len(chunk)
+        if buffered >= buffer_size:
+            fp.write("".join(parts).encode("utf-8"))
+            parts.clear()
+            buffered = 0
+    if parts:
+        fp.write("".join(parts).encode("utf-8"))
+
+
+@contextmanager
+def replacing(path) -> Iterator[pathlib.Path]:
+    """
+    Temporary file next to path to write instead of it, moved over path once the block succeeds
+    and removed otherwise, so path is never left half written. An existing path keeps its mode.
+    """
+    path = pathlib.Path(path)
+    tmp = path.with_name(f".{path.name}.{os.urandom(4).hex()}.tmp")
+    # Created like a new path would be, with the mode given by the umask
+    os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+    try:
+        yield tmp
+        if path.exists():
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink()
+        raise
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import pathlib
+import sqlite3
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+from zipfile import ZipFile
+
+from sigame_tools import formats
+from sigame_tools.datatypes import Package, SIDocument
+
+CONTENT_NAMES = SIDocument.CONTENT_NAMES
+
+SORT_KEYS = ("path", "name", "date", "difficulty", "rounds", "themes", "questions")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    filetype TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    publisher TEXT NOT NULL,
+    date TEXT NOT NULL,
+    language TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    themes INTEGER NOT NULL,
+    questions INTEGER NOT NULL,
+    min_price INTEGER,
+    max_price INTEGER,
+    question_types TEXT NOT NULL,
+    round_summary TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT NOT NULL REFERENCES packages(path) ON DELETE CASCADE,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag);
+CREATE INDEX IF NOT EXISTS tags_path ON tags(path);
+"""
+
+
+def cache_dir() -> pathlib.Path:
+    cache = os.environ.get("SIGAME_TOOLS_CACHE")
+    if cache:
+        return pathlib.Path(cache)
+    base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base, "sigame_tools")
+
+
+def default_index_path() -> pathlib.Path:
+    return cache_dir() / "index.sqlite3"
+
+
+class RoundSummary(NamedTuple):
+    name: str
+    final: bool
+    themes: int
+    questions: int
+
+
+class PackageSummary(NamedTuple):
+    path: str
+    filetype: str
+    name: str
+    id: str
+    authors: List[str]
+    tags: List[str]
+    publisher: str
+    date: str
+    language: str
+    difficulty: int
+    rounds: List[RoundSummary]
+    themes: int
+    questions: int
+    min_price: None | int
+    max_price: None | int
+    question_types: Dict[str, int]
+
+    @classmethod
+    def from_package(cls, path: str, filetype: str, package: Package) -> PackageSummary:
+        rounds: List[RoundSummary] = []
+        prices: List[int] = []
+        question_types: Counter = Counter()
+        for _round in package.rounds:
+            count = 0
+            for theme in _round.themes:
+                for question in theme.questions:
+                    count += 1
+                    prices.append(question.price)
+                    question_types[question.q_type.name] += 1
+            rounds.append(RoundSummary(_round.name, _round.final, len(_round.themes), count))
+        return cls(path, filetype, package.name, package.id, list(package.info.authors), list(package.tags),
+                   package.publisher, package.date, package.language, package.difficulty, rounds,
+                   sum(r.themes for r in rounds), sum(r.questions for r in rounds),
+                   min(prices, default=None), max(prices, default=None), dict(question_types))
+
+    def __repr__(self) -> str:
+        # Same as Package.__repr__, so query prints the same line from the index
+        return f"SIGame Package {self.name}, authors: {', '.join(self.authors)}, num of rounds: {len(self.rounds)}"
+
+
+def content_hash(path: str | pathlib.Path, filetype: str) -> str:
+    digest = hashlib.sha256()
+    with ZipFile(path, "r") as zipfile:
+        with zipfile.open(CONTENT_NAMES[filetype]) as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def like_contains(text: str) -> str:
+    """
+    LIKE pattern matching text anywhere, with wildcards in text taken literally by LIKE ... ESCAPE '\\'.
+    """
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def read_content(path: str | pathlib.Path, filetype: str) -> Tuple[str, bytes]:
+    """
+    Hash and bytes of the content member, so a package which turns out to be changed is parsed without reading
+    it again.
+    """
+    with ZipFile(path, "r") as zipfile:
+        data = zipfile.read(CONTENT_NAMES[filetype])
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def parse_content(data: bytes, filetype: str) -> Package:
+    package, rounds = formats.get_format(filetype).stream_package(io.BytesIO(data))
+    package.rounds.extend(rounds)
+    return package
+
+
+class PackageIndex:
+    """
+    On-disk index of package metadata.
+    Entries are fresh while the file size and mtime stay the same. A file that changed on disk is hashed first
+    and only parsed again if its content.xml/content.json changed too.
+    """
+
+    def __init__(self, path: None | str | pathlib.Path = None) -> None:
+        self.path = pathlib.Path(path) if path else default_index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> PackageIndex:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def key(path: str | pathlib.Path) -> str:
+        return str(pathlib.Path(path).resolve())
+
+    def lookup(self, path: str | pathlib.Path) -> None | PackageSummary:
+        """
+        Summary of the package if its index entry is fresh, None otherwise.
+        """
+        stat = os.stat(path)
+        row = self.db.execute("SELECT size, mtime_ns FROM packages WHERE path = ?", (self.key(path),)).fetchone()
+        if row is None or row != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return self.get(path)
+
+    def get(self, path: str | pathlib.Path) -> None | PackageSummary:
+        summaries = self.select("WHERE path = ?", (self.key(path),))
+        return summaries[0] if summaries else None
+
+    def update(self, path: str | pathlib.Path, filetype: str) -> Tuple[PackageSummary, bool]:
+        """
+        Bring the index entry of a package up to date.
+        Returns the summary and whether the package had to be parsed again.
+        """
+        key = self.key(path)
+        stat = os.stat(path)
+        row = self.db.execute("SELECT size, mtime_ns, content_hash FROM packages WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return self.get(path), False
+        digest, data = read_content(path, filetype)
+        if row is not None and row[2] == digest:
+            with self.db:
+                self.db.execute("UPDATE packages SET size = ?, mtime_ns = ? WHERE path = ?",
+                                (stat.st_size, stat.st_mtime_ns, key))
+            return self.get(path), False
+        package = parse_content(data, filetype)
+        summary = PackageSummary.from_package(key, filetype, package)
+        self.store(summary, stat.st_size, stat.st_mtime_ns, digest)
+        return summary, True
+
+    def store(self, summary: PackageSummary, size: int, mtime_ns: int, digest: str) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM packages WHERE path = ?", (summary.path,))
+            self.db.execute(
+                "INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (summary.path, size, mtime_ns, digest, summary.filetype, summary.name, summary.id,
+                 json.dumps(summary.authors, ensure_ascii=False), json.dumps(summary.tags, ensure_ascii=False),
+                 summary.publisher, summary.date, summary.language,
+                 summary.difficulty, len(summary.rounds), summary.themes, summary.questions,
+                 summary.min_price, summary.max_price, json.dumps(summary.question_types),
+                 json.dumps(summary.rounds, ensure_ascii=False), time.time())
+            )
+            self.db.executemany("INSERT INTO tags VALUES (?, ?)", ((summary.path, tag) for tag in summary.tags))
+
+    def prune(self, keep: Iterable[str | pathlib.Path] = ()) -> int:
+        """
+        Drop entries of packages which no longer exist, returning how many were removed.
+        """
+        keep = {self.key(path) for path in keep}
+        gone = [(path,) for path, in self.db.execute("SELECT path FROM packages")
+                if path not in keep and not os.path.exists(path)]
+        with self.db:
+            self.db.executemany("DELETE FROM packages WHERE path = ?", gone)
+        return len(gone)
+
+    def select(self, where: str = "", params: Tuple[Any, ...] = (), order_by: str = "path",
+               descending: bool = False) -> List[PackageSummary]:
+        if order_by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: '{order_by}'")
+        rows = self.db.execute(
+            "SELECT path, filetype, name, id, authors, tags, publisher, date, language, difficulty, themes, questions, "
+            "min_price, max_price, question_types, round_summary "
+            f"FROM packages {where} ORDER BY {order_by} {'DESC' if descending else 'ASC'}, path",
+            params
+        ).fetchall()
+        return [
+            PackageSummary(path, filetype, name, p_id, json.loads(authors), json.loads(tags), publisher, date,
+                           language, difficulty, [RoundSummary(*r) for r in json.loads(round_summary)], themes,
+                           questions, min_price, max_price, json.loads(question_types))
+            for (path, filetype, name, p_id, authors, tags, publisher, date, language, difficulty, themes, questions,
+                 min_price, max_price, question_types, round_summary) in rows
+        ]
+
+    def find(self, name: None | str = None, author: None | str = None, tag: None | str = None,
+             question_type: None | str = None, order_by: str = "path",
+             descending: bool = False) -> List[PackageSummary]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        if name:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(like_contains(name))
+        if author:
+            conditions.append("authors LIKE ? ESCAPE '\\'")
+            params.append(like_contains(json.dumps(author, ensure_ascii=False)[1:-1]))
+        if tag:
+            conditions.append("path IN (SELECT path FROM tags WHERE tag = ?)")
+            params.append(tag)
+        if question_type:
+            conditions.append("question_types LIKE ? ESCAPE '\\'")
+            params.append(like_contains(f"{json.dumps(question_type)}:"))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.select(where, tuple(params), order_by, descending)
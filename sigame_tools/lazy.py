@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import io
+import re
+from collections.abc import MutableSequence
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from xml.etree.ElementTree import Element, fromstring
+
+from sigame_tools import siq_reader
+from sigame_tools.datatypes import InfoOwner, Package, Question, Round, Theme, Tracked
+
+
+class _Pending:
+    __slots__ = ("load",)
+
+    def __init__(self, load: Callable[[], Any]) -> None:
+        self.load = load
+
+
+class LazyList(Tracked, MutableSequence):
+    """
+    List whose items are built by their loaders on first access.
+    len() never loads anything, so counting rounds/themes/questions stays cheap.
+    """
+    # Tracked like ModelList, loading items is not an edit
+    __slots__ = ("__items", "__sources", "_owners")
+
+    def __init__(self, loaders: Iterable[Callable[[], Any]] = (), sources: None | Iterable[Any] = None) -> None:
+        self.__items: List[Any] = [_Pending(load) for load in loaders]
+        self.__sources: List[Any] = list(sources) if sources is not None else [None] * len(self.__items)
+
+    def __load(self, index: int) -> Any:
+        item = self.__items[index]
+        if isinstance(item, _Pending):
+            item = self.__items[index] = item.load()
+        return item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__load(i) for i in range(*index.indices(len(self.__items)))]
+        return self.__load(index)
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            value = list(value)
+            self.__items[index] = value
+            self.__sources[index] = [None] * len(value)
+        else:
+            self.__items[index] = value
+            self.__sources[index] = None
+        self.changed()
+
+    def __delitem__(self, index) -> None:
+        del self.__items[index]
+        del self.__sources[index]
+        self.changed()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def insert(self, index: int, value: Any) -> None:
+        self.__items.insert(index, value)
+        self.__sources.insert(index, None)
+        self.changed()
+
+    def source(self, index: int) -> Any:
+        """
+        Raw content the item at index was read from, e.g. the bytes of its element, None for items put in later.
+        Items with equal sources are equal unless one of them was edited since it was read.
+        """
+        return self.__sources[index]
+
+    @property
+    def loaded(self) -> int:
+        return sum(1 for item in self.__items if not isinstance(item, _Pending))
+
+    def __repr__(self) -> str:
+        return f"LazyList({self.loaded}/{len(self)} loaded)"
+
+
+# XML
+
+def _start_tag(tag: str) -> re.Pattern:
+    # Quoted attribute values may contain '>', so they are matched as a whole
+    return re.compile(rb"<" + tag.encode() + rb"""(?=[\s/>])(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+
+_START_TAGS: Dict[str, re.Pattern] = {tag: _start_tag(tag) for tag in ("rounds", "round", "themes", "theme",
+                                                                         "questions", "question")}
+
+
+def can_scan(data: bytes) -> bool:
+    """
+    Whether elements of content.xml can be located by the byte scan, which would take tags in comments and CDATA
+    sections for real ones.
+    """
+    return b"<!--" not in data and b"<![CDATA[" not in data
+
+
+def element_slices(data: bytes, tag: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """
+    Find byte ranges of all (non-nested) <tag> elements in data[start:end] without parsing it.
+    """
+    pattern = _START_TAGS[tag]
+    close = f"</{tag}>".encode()
+    slices: List[Tuple[int, int]] = []
+    pos = start
+    while True:
+        match = pattern.search(data, pos, end)
+        if match is None:
+            return slices
+        if match.group().endswith(b"/>"):
+            pos = match.end()
+        else:
+            pos = data.index(close, match.end(), end) + len(close)
+        slices.append((match.start(), pos))
+
+
+def _children_range(data: bytes, start: int, end: int, tag: str) -> Tuple[int, int]:
+    # Byte range of the <tag>...</tag> container (e.g. <themes>) inside data[start:end], or (end, end)
+    match = _START_TAGS[tag].search(data, start, end)
+    if match is None:
+        return end, end
+    if match.group().endswith(b"/>"):
+        return match.start(), match.end()
+    close = f"</{tag}>".encode()
+    return match.start(), data.rindex(close, match.end(), end) + len(close)
+
+
+def _shell(data: bytes, start: int, end: int, children_tag: str) -> Tuple[Element, int, int]:
+    # Parse an element with its container of children cut out, returning the container's range as well
+    children_start, children_end = _children_range(data, start, end, children_tag)
+    return fromstring(data[start:children_start] + data[children_end:end]), children_start, children_end
+
+
+def _read_owner_children(owner: InfoOwner, el: Element) -> None:
+    for child in el:
+        if siq_reader.local_name(child.tag) == "info":
+            siq_reader.read_info(owner, child)
+
+
+def _sources(data: bytes, slices: List[Tuple[int, int]]) -> List[memoryview]:
+    # Elements are compared by their bytes without copying them
+    view = memoryview(data)
+    return [view[start:end] for start, end in slices]
+
+
+def _xml_question(data: bytes, start: int, end: int) -> Question:
+    return siq_reader.read_question(fromstring(data[start:end]))
+
+
+def _xml_theme(data: bytes, start: int, end: int) -> Theme:
+    el, children_start, children_end = _shell(data, start, end, "questions")
+    theme = Theme(el.get("name", ""))
+    _read_owner_children(theme, el)
+    slices = element_slices(data, "question", children_start, children_end)
+    theme.questions = LazyList(((lambda s=s, e=e: _xml_question(data, s, e)) for s, e in slices),
+                               _sources(data, slices))
+    return theme
+
+
+def _xml_round(data: bytes, start: int, end: int) -> Round:
+    el, children_start, children_end = _shell(data, start, end, "themes")
+    _round = Round(el.get("name", ""), el.get("type") == "final")
+    _read_owner_children(_round, el)
+    slices = element_slices(data, "theme", children_start, children_end)
+    _round.themes = LazyList(((lambda s=s, e=e: _xml_theme(data, s, e)) for s, e in slices), _sources(data, slices))
+    return _round
+
+
+def read_package_shell(data: bytes) -> Tuple[Package, List[Tuple[int, int]]]:
+    """
+    Parse package attributes, info and tags of content.xml, returning byte ranges of its rounds unparsed.
+    """
+    el, children_start, children_end = _shell(data, 0, len(data), "rounds")
+    package = Package()
+    siq_reader.read_package_attrs(package, el)
+    for child in el:
+        tag = siq_reader.local_name(child.tag)
+        if tag == "info":
+            siq_reader.read_info(package, child)
+        elif tag == "tags":
+            package.tags.extend(siq_reader.get_text(el_tag) for el_tag in child)
+    return package, element_slices(data, "round", children_start, children_end)
+
+
+def read_siq_package(data: bytes) -> Package:
+    """
+    Build a Package from content.xml where only package metadata is parsed upfront.
+    Rounds, themes and questions are located by a byte scan and parsed from their slice on first access.
+    Content the scan cannot handle is read eagerly instead.
+    """
+    if not can_scan(data):
+        return siq_reader.read_package(io.BytesIO(data))
+    package, slices = read_package_shell(data)
+    package.rounds = LazyList(((lambda s=s, e=e: _xml_round(data, s, e)) for s, e in slices), _sources(data, slices))
+    return package
+
+
+# JSON
+
+def _json_theme(d: Dict[str, Any]) -> Theme:
+    theme = Theme(d["name"])
+    theme.json_read_info(d)
+    theme.questions = LazyList(((lambda q=q: Question.json_deserialize(q)) for q in d["questions"]), d["questions"])
+    return theme
+
+
+def _json_round(d: Dict[str, Any]) -> Round:
+    _round = Round(d["name"], d.get("final", False))
+    _round.json_read_info(d)
+    _round.themes = LazyList(((lambda t=t: _json_theme(t)) for t in d["themes"]), d["themes"])
+    return _round
+
+
+def read_jsiq_package(d: Dict[str, Any]) -> Package:
+    """
+    Build a Package from plain decoded content.json, converting rounds, themes and questions on first access.
+    """
+    package = Package.json_deserialize({**d, "rounds": []})
+    package.rounds = LazyList(((lambda r=r: _json_round(r)) for r in d["rounds"]), d["rounds"])
+    return package
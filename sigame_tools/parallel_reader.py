@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import io
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Tuple
+from xml.etree.ElementTree import fromstring
+
+from sigame_tools import siq_reader
+from sigame_tools.datatypes import Package, Round
+from sigame_tools.lazy import can_scan, read_package_shell
+
+
+def parse_round(chunk: bytes) -> Round:
+    return siq_reader.read_round(fromstring(chunk))
+
+
+def read_package(data: bytes, workers: None | int = None, executor: None | Executor = None) -> Package:
+    """
+    Build a Package from content.xml with its rounds parsed in worker processes.
+    Rounds are located by a byte scan, the biggest ones are handed out first and put back in document order.
+    A given executor is reused instead of starting a new process pool.
+    """
+    if not can_scan(data):
+        return siq_reader.read_package(io.BytesIO(data))
+    package, slices = read_package_shell(data)
+    workers = workers or os.cpu_count() or 1
+    if executor is None and (workers == 1 or len(slices) < 2):
+        # Nothing to spread over processes, the streaming reader is faster on a single core
+        return siq_reader.read_package(io.BytesIO(data))
+
+    order: List[Tuple[int, Tuple[int, int]]] = sorted(enumerate(slices), key=lambda s: s[1][0] - s[1][1])
+    pool = executor or ProcessPoolExecutor(max_workers=min(workers, len(slices)))
+    try:
+        futures = [(i, pool.submit(parse_round, data[start:end])) for i, (start, end) in order]
+        rounds: List[None | Round] = [None] * len(slices)
+        for i, future in futures:
+            rounds[i] = future.result()
+    finally:
+        if executor is None:
+            pool.shutdown()
+    package.rounds.extend(rounds)
+    return package
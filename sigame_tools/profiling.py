@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import cProfile
+import gc
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Profiler of the running command, phases are not recorded while it is None
+_current: None | Profiler = None
+# Object counts walk the whole heap, so they are only taken at the end of outer phases
+COUNT_OBJECTS_DEPTH = 1
+
+
+def max_rss() -> None | int:
+    """
+    Peak resident set size of the whole process since it started, it never goes down between phases.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def io_counters() -> Tuple[None | int, None | int]:
+    """
+    Bytes read and written by this process so far, (None, None) where /proc is not available.
+    """
+    try:
+        with open("/proc/self/io", "rb") as fp:
+            counters = dict(line.split(b":") for line in fp.read().splitlines())
+        return int(counters[b"rchar"]), int(counters[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def object_counts() -> Dict[str, int]:
+    """
+    Live instances of sigame_tools classes by class name.
+    """
+    counts = Counter(type(o).__name__ for o in gc.get_objects() if _counted(type(o)))
+    return dict(counts.most_common())
+
+
+def _counted(cls: type) -> bool:
+    # Some extension types have a descriptor instead of a string as __module__
+    module = getattr(cls, "__module__", None)
+    return isinstance(module, str) and module.startswith("sigame_tools.") and module != __name__
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.traced_peak: None | int = None
+        self.__stack: List[str] = []
+        # Traced peak of each open phase from before its current subphase, tracemalloc has only one peak to reset
+        self.__peaks: List[int] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.__stack.append(name)
+        read_start, written_start = io_counters()
+        start = time.perf_counter()
+        record: Dict[str, Any] = {"name": "/".join(self.__stack), "depth": len(self.__stack) - 1,
+                                  "start": start - self.started}
+        # Phases are listed in the order they started
+        self.phases.append(record)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if self.__peaks:
+                self.__peaks[-1] = max(self.__peaks[-1], tracemalloc.get_traced_memory()[1])
+            self.__peaks.append(0)
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            record["wall"] = time.perf_counter() - start
+            record["max_rss"] = max_rss()
+            if tracing:
+                peak = max(self.__peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record["traced_peak"] = peak
+                tracemalloc.reset_peak()
+                if self.__peaks:
+                    self.__peaks[-1] = max(self.__peaks[-1], peak)
+            read_end, written_end = io_counters()
+            if read_start is not None and read_end is not None:
+                record["read_bytes"] = read_end - read_start
+                record["written_bytes"] = written_end - written_start
+            if record["depth"] <= COUNT_OBJECTS_DEPTH:
+                record["objects"] = object_counts()
+            self.__stack.pop()
+
+    def report(self) -> Dict[str, Any]:
+        return {"phases": self.phases, "traced_peak_bytes": self.traced_peak}
+
+    def format_report(self) -> str:
+        lines = [f"{'phase':<32} {'wall':>9} {'traced peak':>11} {'max RSS *':>11} {'read':>11} {'written':>11}"]
+        for record in self.phases:
+            name = "  " * record["depth"] + record["name"].rpartition("/")[2]
+            lines.append(f"{name:<32} {record['wall']:8.3f}s {_mib(record.get('traced_peak'))} "
+                         f"{_mib(record.get('max_rss'))} "
+                         f"{_mib(record.get('read_bytes'))} {_mib(record.get('written_bytes'))}")
+        lines.append("* peak of the whole process up to the end of the phase, not of the phase itself")
+        for record in self.phases:
+            if record.get("objects") and record["depth"] > 0:
+                objects = ", ".join(f"{name}: {count}" for name, count in record["objects"].items())
+                lines.append(f"objects after {record['name']}: {objects}")
+        if self.traced_peak is not None:
+            lines.append(f"peak traced memory: {self.traced_peak / 2 ** 20:.1f} MiB")
+        return "\n".join(lines)
+
+
+def _mib(value: None | int) -> str:
+    return f"{'-':>11}" if value is None else f"{value / 2 ** 20:7.1f} MiB"
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Record a phase of the running command, does nothing unless profiling is enabled.
+    """
+    if _current is None:
+        yield
+        return
+    with _current.phase(name):
+        yield
+
+
+@contextmanager
+def profiled(name: str = "total", cprofile_path: None | str = None,
+             tracemalloc_path: None | str = None) -> Iterator[Profiler]:
+    """
+    Enable phase recording for the duration of the block,
+    optionally dumping cProfile stats and a tracemalloc snapshot to the given files.
+    """
+    global _current
+    profiler = Profiler()
+    _current = profiler
+    cprofile = cProfile.Profile() if cprofile_path else None
+    if tracemalloc_path:
+        tracemalloc.start()
+    try:
+        if cprofile is not None:
+            cprofile.enable()
+        try:
+            with profiler.phase(name):
+                yield profiler
+        finally:
+            if cprofile is not None:
+                cprofile.disable()
+    finally:
+        _current = None
+        if cprofile is not None:
+            cprofile.dump_stats(cprofile_path)
+        if tracemalloc_path:
+            tracemalloc.take_snapshot().dump(tracemalloc_path)
+            # Phases reset the tracemalloc peak, the outermost one has the peak of the whole block
+            profiler.traced_peak = profiler.phases[0].get("traced_peak")
+            tracemalloc.stop()
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import re
+import sqlite3
+from typing import Iterable, List, NamedTuple, Set, Tuple
+
+from sigame_tools.datatypes import AtomTypes, Package, Question, Theme
+from sigame_tools.index import cache_dir, parse_content, read_content
+
+_WORD = re.compile(r"\w+")
+# Atoms which hold text rather than a reference to a media file
+TEXT_ATOM_TYPES = frozenset((AtomTypes.TEXT, AtomTypes.ORAL))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packs (
+    pack_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    question_id INTEGER PRIMARY KEY,
+    pack_id INTEGER NOT NULL REFERENCES packs(pack_id) ON DELETE CASCADE,
+    round INTEGER NOT NULL,
+    theme INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    round_name TEXT NOT NULL,
+    theme_name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    answer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_pack ON questions(pack_id);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES questions(question_id) ON DELETE CASCADE,
+    PRIMARY KEY (term, question_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_question ON postings(question_id);
+"""
+
+
+def normalize(text: str) -> str:
+    # "ё" is commonly written as "е", so both spellings have to match
+    return text.casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+def prefix_end(prefix: str) -> str:
+    """
+    Least string above every string starting with prefix, so that term >= prefix AND term < prefix_end(prefix)
+    is an exact prefix match. SQLite compares UTF-8 text in code point order.
+    """
+    code = ord(prefix[-1]) + 1
+    # Surrogates cannot be stored, the next code point that can is above them
+    if 0xD800 <= code < 0xE000:
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+
+def question_text(question: Question) -> str:
+    return " ".join(atom.text for atom in question.scenario if atom.type in TEXT_ATOM_TYPES)
+
+
+def question_terms(theme: Theme, question: Question) -> Set[str]:
+    """
+    Terms a question is found by: its text atoms, answers, comments, and the name and comments of its theme.
+    """
+    parts = [question_text(question), theme.name, *question.right, *question.wrong]
+    if question.has_info:
+        parts.append(question.info.comments)
+    if theme.has_info:
+        parts.append(theme.info.comments)
+    return {term for part in parts for term in tokenize(part)}
+
+
+class SearchHit(NamedTuple):
+    path: str
+    round: int
+    theme: int
+    question: int
+    round_name: str
+    theme_name: str
+    price: int
+    text: str
+    answer: str
+
+    def __repr__(self) -> str:
+        return (f"{self.path}: round {self.round + 1} \"{self.round_name}\", theme {self.theme + 1} "
+                f"\"{self.theme_name}\", question {self.question + 1} ({self.price}): {self.text} -> {self.answer}")
+
+
+def default_search_index_path() -> pathlib.Path:
+    return cache_dir() / "search.sqlite3"
+
+
+class SearchIndex:
+    """
+    Inverted index over question texts, answers, theme names and comments of many packages.
+    Terms are case-folded words, a query matches questions that contain all of its terms.
+    """
+
+    def __init__(self, path: None | str | pathlib.Path = None) -> None:
+        self.path = pathlib.Path(path) if path else default_search_index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> SearchIndex:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def key(path: str | pathlib.Path) -> str:
+        return str(pathlib.Path(path).resolve())
+
+    def update(self, path: str | pathlib.Path, filetype: str) -> bool:
+        """
+        Bring the index up to date with a package, returning whether it had to be parsed and indexed again.
+        """
+        key = self.key(path)
+        stat = os.stat(path)
+        row = self.db.execute("SELECT pack_id, size, mtime_ns, content_hash FROM packs WHERE path = ?",
+                              (key,)).fetchone()
+        if row is not None and row[1:3] == (stat.st_size, stat.st_mtime_ns):
+            return False
+        digest, data = read_content(path, filetype)
+        if row is not None and row[3] == digest:
+            with self.db:
+                self.db.execute("UPDATE packs SET size = ?, mtime_ns = ? WHERE pack_id = ?",
+                                (stat.st_size, stat.st_mtime_ns, row[0]))
+            return False
+        package = parse_content(data, filetype)
+        with self.db:
+            self.db.execute("DELETE FROM packs WHERE path = ?", (key,))
+            pack_id = self.db.execute("INSERT INTO packs (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                                      (key, stat.st_size, stat.st_mtime_ns, digest)).lastrowid
+            self.add_package(pack_id, package)
+        return True
+
+    def add_package(self, pack_id: int, package: Package) -> None:
+        for round_i, _round in enumerate(package.rounds):
+            for theme_i, theme in enumerate(_round.themes):
+                for question_i, question in enumerate(theme.questions):
+                    question_id = self.db.execute(
+                        "INSERT INTO questions (pack_id, round, theme, question, round_name, theme_name, price, "
+                        "text, answer) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (pack_id, round_i, theme_i, question_i, _round.name, theme.name, question.price,
+                         question_text(question), " / ".join(question.right))
+                    ).lastrowid
+                    self.db.executemany("INSERT INTO postings VALUES (?, ?)",
+                                        ((term, question_id) for term in question_terms(theme, question)))
+
+    def prune(self, keep: Iterable[str | pathlib.Path] = ()) -> int:
+        keep = {self.key(path) for path in keep}
+        gone = [(path,) for path, in self.db.execute("SELECT path FROM packs")
+                if path not in keep and not os.path.exists(path)]
+        with self.db:
+            self.db.executemany("DELETE FROM packs WHERE path = ?", gone)
+        return len(gone)
+
+    def search(self, query: str, limit: None | int = 100) -> List[SearchHit]:
+        """
+        Find questions containing every word of query. A trailing "*" makes a word match as a prefix.
+        """
+        selects: List[str] = []
+        params: List[str | int] = []
+        for word in query.split():
+            terms = tokenize(word)
+            for i, term in enumerate(terms):
+                if word.endswith("*") and i == len(terms) - 1:
+                    selects.append("SELECT question_id FROM postings WHERE term >= ? AND term < ?")
+                    params.extend((term, prefix_end(term)))
+                else:
+                    selects.append("SELECT question_id FROM postings WHERE term = ?")
+                    params.append(term)
+        if not selects:
+            return []
+        sql = (
+            "SELECT packs.path, round, theme, question, round_name, theme_name, price, text, answer "
+            "FROM questions JOIN packs USING (pack_id) "
+            f"WHERE question_id IN ({' INTERSECT '.join(selects)}) "
+            "ORDER BY question_id"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [SearchHit(*row) for row in self.db.execute(sql, params)]
+
+    def stats(self) -> Tuple[int, int, int]:
+        packs, = self.db.execute("SELECT COUNT(*) FROM packs").fetchone()
+        questions, = self.db.execute("SELECT COUNT(*) FROM questions").fetchone()
+        terms, = self.db.execute("SELECT COUNT(*) FROM postings").fetchone()
+        return packs, questions, terms
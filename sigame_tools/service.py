@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Deque, Dict, NamedTuple, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from sigame_tools.batch import ConversionJob, ConversionResult, convert_file
+from sigame_tools import formats
+
+CHUNK_SIZE = 1 << 16
+# Number of recent requests latency percentiles are computed from
+LATENCY_WINDOW = 1000
+MAX_UPLOAD = 1 << 30
+MAX_HEADER_LINES = 100
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ServiceResult(NamedTuple):
+    result: ConversionResult
+    queue_wait: float
+    latency: float
+
+
+def percentile(values: Deque[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ServiceMetrics:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queued = 0
+        self.running = 0
+        # Process pools replaced after a worker died
+        self.restarts = 0
+        self.bytes_in = 0
+        self.queue_wait_total = 0.0
+        self.latency_total = 0.0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.queue_waits: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, result: ServiceResult) -> None:
+        if result.result.error:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.bytes_in += result.result.size
+        self.queue_wait_total += result.queue_wait
+        self.latency_total += result.latency
+        self.queue_waits.append(result.queue_wait)
+        self.latencies.append(result.latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started
+        finished = self.completed + self.failed
+        return {
+            "uptime": uptime,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queued": self.queued,
+            "running": self.running,
+            "restarts": self.restarts,
+            "throughput": finished / uptime if uptime else 0.0,
+            "bytes_per_second": self.bytes_in / uptime if uptime else 0.0,
+            "queue_wait": {
+                "mean": self.queue_wait_total / finished if finished else 0.0,
+                "p50": percentile(self.queue_waits, 0.5),
+                "p95": percentile(self.queue_waits, 0.95),
+            },
+            "latency": {
+                "mean": self.latency_total / finished if finished else 0.0,
+                "p50": percentile(self.latencies, 0.5),
+                "p95": percentile(self.latencies, 0.95),
+            },
+        }
+
+
+class ConversionService:
+    """
+    Runs conversions in a process pool without blocking the event loop.
+    At most `workers` conversions run at once, up to `max_queue` more wait for a free worker
+    and anything beyond that is rejected with QueueFull.
+    """
+
+    def __init__(self, workers: None | int = None, max_queue: int = 64) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.metrics = ServiceMetrics()
+        self.__executor: None | ProcessPoolExecutor = None
+        self.__slots: None | asyncio.Semaphore = None
+        self.__restart_lock: None | asyncio.Lock = None
+
+    def __new_executor(self) -> ProcessPoolExecutor:
+        # Workers are started on demand while requests are handled, forked ones would inherit the open client
+        # connections and keep them from closing
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def start(self) -> None:
+        self.__executor = self.__new_executor()
+        self.__slots = asyncio.Semaphore(self.workers)
+        self.__restart_lock = asyncio.Lock()
+
+    async def __restart(self, broken: ProcessPoolExecutor) -> None:
+        async with self.__restart_lock:
+            # Every job of the broken pool fails at once, only the first one replaces it
+            if self.__executor is not broken:
+                return
+            self.__executor = self.__new_executor()
+            self.metrics.restarts += 1
+            await asyncio.get_running_loop().run_in_executor(None, broken.shutdown)
+
+    async def __run(self, job: ConversionJob, options: Dict[str, Any]) -> ConversionResult:
+        loop = asyncio.get_running_loop()
+        for retry in (True, False):
+            executor = self.__executor
+            try:
+                return await loop.run_in_executor(executor, convert_file, job, options)
+            except BrokenProcessPool:
+                # A worker died, e.g. killed for its memory, taking down the pool with every job it was running.
+                # Those are tried once more in a new pool, a job breaking that one as well is reported failed
+                await self.__restart(executor)
+                if not retry:
+                    raise
+
+    async def close(self) -> None:
+        if self.__executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.__executor.shutdown)
+            self.__executor = None
+
+    async def __aenter__(self) -> ConversionService:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def full(self) -> bool:
+        return self.metrics.queued >= self.max_queue
+
+    async def convert(self, job: ConversionJob, options: None | Dict[str, Any] = None) -> ServiceResult:
+        if self.__executor is None:
+            raise RuntimeError("Conversion service is not started")
+        if self.full:
+            self.metrics.rejected += 1
+            raise QueueFull(f"{self.metrics.queued} conversions are already queued")
+        self.metrics.submitted += 1
+        self.metrics.queued += 1
+        submitted = time.perf_counter()
+        queued = True
+        try:
+            async with self.__slots:
+                self.metrics.queued -= 1
+                queued = False
+                queue_wait = time.perf_counter() - submitted
+                self.metrics.running += 1
+                try:
+                    result = await self.__run(job, options or {})
+                except Exception as e:
+                    result = ConversionResult(job, 0, 0.0, f"{type(e).__name__}: {e}")
+                finally:
+                    self.metrics.running -= 1
+        finally:
+            if queued:
+                self.metrics.queued -= 1
+        service_result = ServiceResult(result, queue_wait, time.perf_counter() - submitted)
+        self.metrics.record(service_result)
+        return service_result
+
+    async def convert_stream(self, job: ConversionJob, options: None | Dict[str, Any] = None,
+                             chunk_size: int = CHUNK_SIZE) -> Tuple[ServiceResult, AsyncIterator[bytes]]:
+        """
+        Convert and return the result along with an iterator over chunks of the converted file.
+        """
+        result = await self.convert(job, options)
+        return result, read_chunks(job.dst, chunk_size)
+
+
+async def read_chunks(path: pathlib.Path, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as fp:
+        while True:
+            chunk = await loop.run_in_executor(None, fp.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str]]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise ConnectionResetError
+    try:
+        method, target, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Bad Request", f"Malformed request line: '{request_line}'")
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            return method, target, headers
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError(431, "Request Header Fields Too Large", "Too many headers")
+
+
+async def write_response(writer: asyncio.StreamWriter, status: int, reason: str, headers: Dict[str, Any],
+                         body: bytes | AsyncIterator[bytes] = b"") -> None:
+    if isinstance(body, bytes):
+        headers["Content-Length"] = len(body)
+    lines = [f"HTTP/1.1 {status} {reason}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    if isinstance(body, bytes):
+        writer.write(body)
+    else:
+        async for chunk in body:
+            writer.write(chunk)
+            # Slow clients hold back reading instead of the whole file piling up in the transport buffer
+            await writer.drain()
+    await writer.drain()
+
+
+async def write_json(writer: asyncio.StreamWriter, status: int, reason: str, data: Any) -> None:
+    await write_response(writer, status, reason, {"Content-Type": "application/json"},
+                         json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+class ConversionServer:
+    """
+    Minimal HTTP front end of a ConversionService.
+
+    POST /convert?in=siq&out=jsiq.zip with the package as the body responds with the converted package,
+    GET /metrics with the service metrics as JSON.
+    """
+
+    def __init__(self, service: ConversionService, max_upload: int = MAX_UPLOAD) -> None:
+        self.service = service
+        self.max_upload = max_upload
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix="sigame_tools-"))
+
+    def close(self) -> None:
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, target, headers = await read_request(reader)
+            url = urlsplit(target)
+            if url.path == "/metrics" and method == "GET":
+                await write_json(writer, 200, "OK", self.service.metrics.snapshot())
+            elif url.path == "/convert" and method == "POST":
+                await self.convert(reader, writer, parse_qs(url.query), headers)
+            else:
+                raise HTTPError(404, "Not Found", f"No route for {method} {url.path}")
+        except HTTPError as e:
+            await write_json(writer, e.status, e.reason, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def convert(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                      query: Dict[str, list], headers: Dict[str, str]) -> None:
+        types = formats.FORMATS
+        output_type = query.get("out", [""])[0]
+        if output_type not in types:
+            raise HTTPError(400, "Bad Request", f"'out' has to be one of {', '.join(types)}")
+        # Without 'in' the format is sniffed from the upload
+        input_type = query.get("in", [""])[0]
+        if input_type and input_type not in types:
+            raise HTTPError(400, "Bad Request", f"'in' has to be one of {', '.join(types)}")
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HTTPError(411, "Length Required", "Content-Length is required")
+        if length > self.max_upload:
+            raise HTTPError(413, "Payload Too Large", f"Packages over {self.max_upload} bytes are not accepted")
+        # Reject before reading the body, so a full queue does not cost an upload
+        if self.service.full:
+            self.service.metrics.rejected += 1
+            raise HTTPError(503, "Service Unavailable", "Conversion queue is full")
+
+        work_dir = pathlib.Path(tempfile.mkdtemp(dir=self.tmp_dir))
+        try:
+            src = work_dir / "input"
+            with open(src, "wb") as fp:
+                remaining = length
+                while remaining:
+                    chunk = await reader.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    fp.write(chunk)
+                    remaining -= len(chunk)
+            job = ConversionJob(src, work_dir / ("output" + types[output_type].suffix), input_type, output_type)
+            options = {"store_media": query.get("store_media", ["0"])[0] in ("1", "true")}
+            try:
+                result, chunks = await self.service.convert_stream(job, options)
+            except QueueFull as e:
+                raise HTTPError(503, "Service Unavailable", str(e))
+            if result.result.error:
+                raise HTTPError(422, "Unprocessable Entity", result.result.error)
+            await write_response(writer, 200, "OK", {
+                "Content-Type": "application/zip",
+                "Content-Length": job.dst.stat().st_size,
+                "X-Queue-Wait": f"{result.queue_wait:.6f}",
+                "X-Conversion-Time": f"{result.result.elapsed:.6f}",
+            }, chunks)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080, unix: None | str | pathlib.Path = None,
+                workers: None | int = None, max_queue: int = 64, max_upload: int = MAX_UPLOAD) -> None:
+    async with ConversionService(workers, max_queue) as service:
+        server = ConversionServer(service, max_upload)
+        try:
+            if unix:
+                listener = await asyncio.start_unix_server(server.handle, path=str(unix))
+            else:
+                listener = await asyncio.start_server(server.handle, host, port)
+            async with listener:
+                for sock in listener.sockets:
+                    print(f"Serving on {sock.getsockname()} with {service.workers} workers")
+                await listener.serve_forever()
+        finally:
+            server.close()
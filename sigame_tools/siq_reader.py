@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import IO, Dict, Iterator, List, Tuple
+from xml.etree.ElementTree import Element, iterparse
+
+from sigame_tools.datatypes import Atom, AtomTypes, InfoOwner, Package, Question, QuestionType, Round, Theme
+
+
+# Tags come with the package namespace, e.g. "{http://vladimirkhil.com/ygpackage3.0.xsd}question"
+_local_names: Dict[str, str] = {}
+
+
+def local_name(tag: str) -> str:
+    name = _local_names.get(tag)
+    if name is None:
+        name = _local_names[tag] = tag.rpartition("}")[2]
+    return name
+
+
+def get_text(el: Element) -> str:
+    return el.text or ""
+
+
+def read_info(owner: InfoOwner, el: Element) -> None:
+    for child in el:
+        tag = local_name(child.tag)
+        if tag == "authors":
+            owner.info.authors.extend(get_text(el_author) for el_author in child)
+        elif tag == "sources":
+            owner.info.sources.extend(get_text(el_source) for el_source in child)
+        elif tag == "comments":
+            owner.info.comments = get_text(child)
+
+
+def read_package_attrs(package: Package, el: Element) -> None:
+    package.name = el.get("name", "")
+    package.version = float(el.get("version") or package.version)
+    package.id = el.get("id", "")
+    package.restriction = el.get("restriction", "")
+    package.date = el.get("date", "")
+    package.publisher = el.get("publisher", "")
+    package.difficulty = int(el.get("difficulty") or package.difficulty)
+    package.logo = el.get("logo", "")
+    package.language = el.get("language", "")
+
+
+def read_atom(el: Element) -> Atom:
+    time = el.get("time", "")
+    return Atom(text=get_text(el), a_type=el.get("type") or AtomTypes.TEXT, time=0 if time == "" else time)
+
+
+def read_question(el: Element) -> Question:
+    question = Question()
+    question.price = int(el.get("price") or question.price)
+    for child in el:
+        tag = local_name(child.tag)
+        if tag == "info":
+            read_info(question, child)
+        elif tag == "type":
+            q_type = QuestionType(child.get("name", ""))
+            for el_param in child:
+                q_type[el_param.get("name", "")] = get_text(el_param)
+            question.q_type = q_type
+        elif tag == "scenario":
+            question.scenario.extend(read_atom(el_atom) for el_atom in child)
+        elif tag == "right":
+            question.right.extend(get_text(el_answer) for el_answer in child)
+        elif tag == "wrong":
+            question.wrong.extend(get_text(el_answer) for el_answer in child)
+    return question
+
+
+def read_theme(el: Element) -> Theme:
+    theme = Theme(el.get("name", ""))
+    for child in el:
+        tag = local_name(child.tag)
+        if tag == "info":
+            read_info(theme, child)
+        elif tag == "questions":
+            theme.questions.extend(read_question(el_question) for el_question in child)
+    return theme
+
+
+def read_round(el: Element) -> Round:
+    _round = Round(el.get("name", ""), el.get("type") == "final")
+    for child in el:
+        tag = local_name(child.tag)
+        if tag == "info":
+            read_info(_round, child)
+        elif tag == "themes":
+            _round.themes.extend(read_theme(el_theme) for el_theme in child)
+    return _round
+
+
+def _iter_rounds(fp: IO[bytes], package: Package) -> Iterator[None | Round]:
+    # Yields None once <rounds> starts, then every round as soon as it is closed
+    # Currently open Package/Round/Theme objects along with their elements
+    owners: List[Tuple[InfoOwner, Element]] = []
+    elements: List[Element] = []
+    in_question = False
+    for event, el in iterparse(fp, events=("start", "end")):
+        tag = local_name(el.tag)
+        if event == "start":
+            elements.append(el)
+            if in_question:
+                continue
+            if tag == "question":
+                in_question = True
+            elif tag == "theme":
+                owners.append((Theme(el.get("name", "")), el))
+            elif tag == "round":
+                owners.append((Round(el.get("name", ""), el.get("type") == "final"), el))
+            elif tag == "rounds" and len(owners) == 1:
+                yield None
+            elif tag == "package":
+                read_package_attrs(package, el)
+                owners.append((package, el))
+            continue
+
+        elements.pop()
+        if tag == "question":
+            in_question = False
+            theme: Theme = owners[-1][0]
+            theme.questions.append(read_question(el))
+            el.clear()
+        elif in_question:
+            continue
+        elif tag == "info":
+            owner, owner_el = owners[-1]
+            if elements and elements[-1] is owner_el:
+                read_info(owner, el)
+            el.clear()
+        elif tag == "theme":
+            theme, _ = owners.pop()
+            _round: Round = owners[-1][0]
+            _round.themes.append(theme)
+            el.clear()
+        elif tag == "round":
+            _round, _ = owners.pop()
+            el.clear()
+            yield _round
+        elif tag == "tags":
+            if elements and elements[-1] is owners[-1][1]:
+                package.tags.extend(get_text(el_tag) for el_tag in el)
+            el.clear()
+
+
+def stream_package(fp: IO[bytes]) -> Tuple[Package, Iterator[Round]]:
+    """
+    Read package attributes, tags and info from content.xml, returning its rounds as an iterator
+    which parses them one at a time. Anything written after the rounds is only read once the iterator is exhausted.
+    """
+    package = Package()
+    rounds = _iter_rounds(fp, package)
+    # Runs up to <rounds>, everything before it is in package then
+    next(rounds, None)
+    return package, rounds
+
+
+def read_package(fp: IO[bytes]) -> Package:
+    """
+    Build a Package from content.xml with a single pull-parsing pass.
+    Questions are built as soon as their element is closed and each finished subtree is cleared right away,
+    so only the current question is ever held as an element tree.
+    """
+    package, rounds = stream_package(fp)
+    package.rounds.extend(rounds)
+    return package
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import itertools
+from typing import IO, Iterable, List, Tuple
+
+from sigame_tools.datatypes import Atom, AtomTypes, InfoOwner, Package, Question, QuestionTypes, Round, Theme
+
+Attrs = Iterable[Tuple[str, str]]
+
+PACKAGE_XMLNS = "http://vladimirkhil.com/ygpackage3.0.xsd"
+
+
+def escape(data: str) -> str:
+    # Same escaping as xml.dom.minidom, so the output matches Document.toprettyxml()
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+class XMLStreamWriter:
+    """
+    Writes indented XML in the exact layout of Document.toprettyxml(indent="    "), flushing encoded
+    chunks to a binary stream as it goes, so the whole document is never held in memory.
+    """
+
+    def __init__(self, fp: IO[bytes], indent: str = "    ", buffer_size: int = 1 << 16) -> None:
+        self.fp = fp
+        self.indent = indent
+        self.buffer_size = buffer_size
+        self.depth = 0
+        self.__parts: List[str] = []
+        self.__buffered = 0
+
+    def write(self, data: str) -> None:
+        self.__parts.append(data)
+        self.__buffered += len(data)
+        if self.__buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self.fp.write("".join(self.__parts).encode("utf-8"))
+        self.__parts.clear()
+        self.__buffered = 0
+
+    def declaration(self) -> None:
+        self.write('<?xml version="1.0" ?>\n')
+
+    def __tag(self, tag: str, attrs: Attrs) -> str:
+        return self.indent * self.depth + "<" + tag + "".join(f' {name}="{escape(value)}"' for name, value in attrs)
+
+    def start(self, tag: str, attrs: Attrs = ()) -> None:
+        self.write(self.__tag(tag, attrs) + ">\n")
+        self.depth += 1
+
+    def end(self, tag: str) -> None:
+        self.depth -= 1
+        self.write(f"{self.indent * self.depth}</{tag}>\n")
+
+    def element(self, tag: str, text: None | str = None, attrs: Attrs = ()) -> None:
+        """
+        Write an element without child elements.
+        None text gives an empty <tag/>, while an empty string still gives <tag></tag> like an empty text node.
+        """
+        if text is None:
+            self.write(self.__tag(tag, attrs) + "/>\n")
+        else:
+            self.write(f"{self.__tag(tag, attrs)}>{escape(text)}</{tag}>\n")
+
+
+def write_texts(writer: XMLStreamWriter, tag: str, item_tag: str, items: List[str]) -> None:
+    if not items:
+        writer.element(tag)
+        return
+    writer.start(tag)
+    for item in items:
+        writer.element(item_tag, item or None)
+    writer.end(tag)
+
+
+def write_info(writer: XMLStreamWriter, owner: InfoOwner) -> None:
+    if not owner.has_info:
+        return
+    writer.start("info")
+    if owner.info.authors:
+        write_texts(writer, "authors", "author", owner.info.authors)
+    if owner.info.sources:
+        write_texts(writer, "sources", "source", owner.info.sources)
+    if owner.info.comments:
+        writer.element("comments", owner.info.comments)
+    writer.end("info")
+
+
+def write_atom(writer: XMLStreamWriter, atom: Atom) -> None:
+    attrs = []
+    if atom.time:
+        attrs.append(("time", str(atom.time)))
+    if atom.type != AtomTypes.TEXT:
+        attrs.append(("type", atom.type))
+    writer.element("atom", atom.text or None, attrs)
+
+
+def write_question(writer: XMLStreamWriter, question: Question) -> None:
+    writer.start("question", (("price", str(question.price)),))
+    write_info(writer, question)
+
+    if question.q_type.name != QuestionTypes.SIMPLE:
+        type_attrs = (("name", question.q_type.name),)
+        if len(question.q_type) == 0:
+            writer.element("type", attrs=type_attrs)
+        else:
+            writer.start("type", type_attrs)
+            for name, value in question.q_type.items():
+                writer.element("param", value or None, (("name", name),))
+            writer.end("type")
+
+    if question.scenario:
+        writer.start("scenario")
+        for atom in question.scenario:
+            write_atom(writer, atom)
+        writer.end("scenario")
+    else:
+        writer.element("scenario")
+
+    write_texts(writer, "right", "answer", question.right)
+    if question.wrong:
+        write_texts(writer, "wrong", "answer", question.wrong)
+    writer.end("question")
+
+
+def write_theme(writer: XMLStreamWriter, theme: Theme) -> None:
+    attrs = (("name", theme.name),)
+    if not (theme.has_info or theme.questions):
+        writer.element("theme", attrs=attrs)
+        return
+    writer.start("theme", attrs)
+    write_info(writer, theme)
+    if theme.questions:
+        writer.start("questions")
+        for question in theme.questions:
+            write_question(writer, question)
+        writer.end("questions")
+    writer.end("theme")
+
+
+def write_round(writer: XMLStreamWriter, _round: Round) -> None:
+    attrs = [("name", _round.name)]
+    if _round.final:
+        attrs.append(("type", "final"))
+    if not (_round.has_info or _round.themes):
+        writer.element("round", attrs=attrs)
+        return
+    writer.start("round", attrs)
+    write_info(writer, _round)
+    if _round.themes:
+        writer.start("themes")
+        for theme in _round.themes:
+            write_theme(writer, theme)
+        writer.end("themes")
+    writer.end("round")
+
+
+def package_attrs(package: Package) -> List[Tuple[str, str]]:
+    attrs = [("xmlns", PACKAGE_XMLNS), ("name", package.name), ("version", f"{package.version:g}")]
+    for name in ("id", "restriction", "date", "publisher"):
+        if getattr(package, name):
+            attrs.append((name, getattr(package, name)))
+    if package.difficulty:
+        attrs.append(("difficulty", str(package.difficulty)))
+    for name in ("logo", "language"):
+        if getattr(package, name):
+            attrs.append((name, getattr(package, name)))
+    return attrs
+
+
+def write_package(fp: IO[bytes], package: Package, rounds: None | Iterable[Round] = None) -> None:
+    """
+    Serialize package as content.xml straight into fp, one question at a time.
+    Rounds are taken from the given iterable instead of package.rounds if there is one.
+    """
+    rounds = iter(package.rounds if rounds is None else rounds)
+    first_round = next(rounds, None)
+    writer = XMLStreamWriter(fp)
+    writer.declaration()
+    attrs = package_attrs(package)
+    if not (package.tags or package.has_info or first_round is not None):
+        writer.element("package", attrs=attrs)
+        writer.flush()
+        return
+    writer.start("package", attrs)
+    if package.tags:
+        writer.start("tags")
+        for tag in package.tags:
+            writer.element("tag", tag)
+        writer.end("tags")
+    write_info(writer, package)
+    if first_round is not None:
+        writer.start("rounds")
+        for _round in itertools.chain((first_round,), rounds):
+            write_round(writer, _round)
+        writer.end("rounds")
+    writer.end("package")
+    writer.flush()
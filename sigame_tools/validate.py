@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from typing import IO, Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple
+from xml.etree.ElementTree import Element, ParseError, fromstring
+from zipfile import BadZipFile, ZipFile
+
+from sigame_tools import formats
+from sigame_tools.assets import atom_member, normalize_member
+from sigame_tools.datatypes import DEFAULT_QUESTION_TYPE, AtomTypes, QuestionTypes, Round, SIDocumentTypes
+from sigame_tools.lazy import can_scan, read_package_shell
+from sigame_tools.siq_reader import get_text, local_name
+
+KNOWN_QUESTION_TYPES = frozenset(value for name, value in vars(QuestionTypes).items() if name.isupper())
+KNOWN_ATOM_TYPES = frozenset(value for name, value in vars(AtomTypes).items() if name.isupper())
+# Malformed XML or JSON, JSON of the wrong shape and broken binary packages, UnicodeDecodeError is a ValueError
+FORMAT_ERRORS = (ParseError, ValueError)
+
+
+class Location(NamedTuple):
+    round: int
+    theme: int
+    question: int
+
+    def __repr__(self) -> str:
+        return f"round {self.round + 1}, theme {self.theme + 1}, question {self.question + 1}"
+
+
+class Problem(NamedTuple):
+    rule: str
+    message: str
+    # None for problems of the package as a whole
+    location: None | Location = None
+
+    def __repr__(self) -> str:
+        where = f"{self.location!r}: " if self.location is not None else ""
+        return f"{where}{self.message} [{self.rule}]"
+
+
+class AtomRecord(NamedTuple):
+    type: str
+    text: str
+    # Raw value as written in the package, None when absent
+    time: None | Any = None
+
+
+class QuestionRecord(NamedTuple):
+    """
+    Raw question data rules check, None marks absent elements.
+    Unlike Question nothing is converted, so values which would break loading are kept as written.
+    """
+    location: Location
+    price: None | Any
+    type: None | str
+    scenario: None | List[AtomRecord]
+    right: None | List[str]
+
+
+class Context(NamedTuple):
+    filetype: str
+    # Normalized names of all package members
+    members: FrozenSet[str]
+
+
+class Rule(ABC):
+    # Used to select rules and shown with each problem
+    name = ""
+
+    @abstractmethod
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        """
+        Yield a message for every problem found in the question.
+        """
+        pass
+
+
+class ScenarioRule(Rule):
+    name = "scenario"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        if question.scenario is None:
+            yield "No scenario"
+        elif not question.scenario:
+            yield "Empty scenario"
+
+
+class AnswerRule(Rule):
+    name = "answer"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        if not question.right:
+            yield "No right answer"
+
+
+class PriceRule(Rule):
+    name = "price"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        price = question.price
+        if price is None:
+            # SIQ readers fall back to the default price, JSIQ requires one
+            if context.filetype == SIDocumentTypes.JSIQ:
+                yield "No price"
+            return
+        if isinstance(price, str):
+            try:
+                price = int(price)
+            except ValueError:
+                yield f"Price '{price}' is not an integer"
+                return
+        if isinstance(price, bool) or not isinstance(price, int):
+            yield f"Price {price!r} is not an integer"
+        elif price < 0:
+            yield f"Negative price {price}"
+
+
+class QuestionTypeRule(Rule):
+    name = "question-type"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        if question.type is not None and question.type not in KNOWN_QUESTION_TYPES:
+            yield f"Unknown question type '{question.type}'"
+
+
+class AtomTypeRule(Rule):
+    name = "atom-type"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        for atom in question.scenario or ():
+            if atom.type not in KNOWN_ATOM_TYPES:
+                yield f"Unknown atom type '{atom.type}'"
+
+
+class AtomTimeRule(Rule):
+    name = "atom-time"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        for atom in question.scenario or ():
+            if atom.time is None or isinstance(atom.time, int) and not isinstance(atom.time, bool):
+                continue
+            if isinstance(atom.time, str):
+                try:
+                    int(atom.time)
+                    continue
+                except ValueError:
+                    pass
+            yield f"Atom time {atom.time!r} is not an integer"
+
+
+class MediaRule(Rule):
+    name = "media"
+
+    def check(self, question: QuestionRecord, context: Context) -> Iterator[str]:
+        for atom in question.scenario or ():
+            name = atom_member(atom.type, atom.text)
+            if name is not None and normalize_member(name) not in context.members:
+                yield f"Missing media '{name}'"
+
+
+RULES: Dict[str, Rule] = {rule.name: rule for rule in (
+    ScenarioRule(), AnswerRule(), PriceRule(), QuestionTypeRule(), AtomTypeRule(), AtomTimeRule(), MediaRule(),
+)}
+
+
+def _children(el: Element, tag: str) -> Iterator[Element]:
+    # Children of the <tag> container of el, e.g. questions of a theme
+    for child in el:
+        if local_name(child.tag) == tag:
+            yield from child
+
+
+def siq_question(el: Element, location: Location) -> QuestionRecord:
+    q_type = scenario = right = None
+    for child in el:
+        tag = local_name(child.tag)
+        if tag == "type":
+            q_type = child.get("name", "")
+        elif tag == "scenario":
+            scenario = [AtomRecord(el_atom.get("type") or AtomTypes.TEXT, get_text(el_atom),
+                                   el_atom.get("time") or None) for el_atom in child]
+        elif tag == "right":
+            right = [get_text(el_answer) for el_answer in child]
+    return QuestionRecord(location, el.get("price") or None, q_type, scenario, right)
+
+
+def siq_questions(data: bytes) -> Iterator[QuestionRecord]:
+    """
+    Yield question records of content.xml round by round.
+    Rounds are located by a byte scan and parsed one at a time, so only a single round is held as a tree.
+    Content the scan cannot handle is parsed as a whole.
+    """
+    if can_scan(data):
+        _, slices = read_package_shell(data)
+        el_rounds: Iterable[Element] = (fromstring(data[start:end]) for start, end in slices)
+    else:
+        el_rounds = _children(fromstring(data), "rounds")
+    for round_i, el_round in enumerate(el_rounds):
+        for theme_i, el_theme in enumerate(_children(el_round, "themes")):
+            for question_i, el_question in enumerate(_children(el_theme, "questions")):
+                yield siq_question(el_question, Location(round_i, theme_i, question_i))
+
+
+def _json_object(value: Any, what: str) -> Dict[str, Any]:
+    if not isinstance(value, dict):
+        raise ValueError(f"{what} is not an object")
+    return value
+
+
+def _json_list(d: Dict[str, Any], key: str, what: str) -> List[Any]:
+    value = d.get(key, [])
+    if not isinstance(value, list):
+        raise ValueError(f"'{key}' of {what} is not a list")
+    return value
+
+
+def _json_str(d: Dict[str, Any], key: str, what: str, default: str = "") -> str:
+    value = d.get(key, default)
+    if not isinstance(value, str):
+        raise ValueError(f"'{key}' of {what} is not a string")
+    return value
+
+
+def jsiq_atom(d: Dict[str, Any]) -> AtomRecord:
+    return AtomRecord(_json_str(d, "type", "atom", AtomTypes.TEXT), _json_str(d, "text", "atom"), d.get("time"))
+
+
+def jsiq_questions(d: Any) -> Iterator[QuestionRecord]:
+    """
+    Yield question records of content.json. Values rules check are kept as written,
+    anything of the wrong shape for the records themselves raises ValueError.
+    """
+    d = _json_object(d, "Package")
+    for round_i, d_round in enumerate(_json_list(d, "rounds", "package")):
+        d_round = _json_object(d_round, "Round")
+        for theme_i, d_theme in enumerate(_json_list(d_round, "themes", "round")):
+            d_theme = _json_object(d_theme, "Theme")
+            for question_i, d_question in enumerate(_json_list(d_theme, "questions", "theme")):
+                d_question = _json_object(d_question, "Question")
+                d_type = d_question.get("type")
+                scenario = None if d_question.get("scenario") is None else [
+                    jsiq_atom(_json_object(d_atom, "Atom")) for d_atom in _json_list(d_question, "scenario", "question")
+                ]
+                q_type = None if d_type is None else _json_str(_json_object(d_type, "Question type"), "name", "type")
+                answers = _json_object(d_question.get("answers", {}), "Answers")
+                yield QuestionRecord(Location(round_i, theme_i, question_i), d_question.get("price"), q_type,
+                                     scenario, answers.get("right"))
+
+
+def package_questions(rounds: Iterable[Round]) -> Iterator[QuestionRecord]:
+    # Records of formats without a raw reader, e.g. binary packages which load faster than they could be checked raw
+    for round_i, _round in enumerate(rounds):
+        for theme_i, theme in enumerate(_round.themes):
+            for question_i, question in enumerate(theme.questions):
+                q_type = question.q_type
+                scenario = [AtomRecord(atom.type, atom.text, atom.time or None) for atom in question.scenario]
+                yield QuestionRecord(Location(round_i, theme_i, question_i), question.price,
+                                     q_type.name if q_type is not DEFAULT_QUESTION_TYPE else None, scenario,
+                                     question.right)
+
+
+def content_questions(fp: IO[bytes], filetype: str) -> Iterator[QuestionRecord]:
+    if filetype == SIDocumentTypes.SIQ:
+        yield from siq_questions(fp.read())
+    elif filetype == SIDocumentTypes.JSIQ:
+        yield from jsiq_questions(json.load(fp))
+    else:
+        _, rounds = formats.FORMATS[filetype].stream_package(fp)
+        yield from package_questions(rounds)
+
+
+def iter_problems(path, filetype: None | str, rules: Iterable[Rule] = RULES.values()) -> Iterator[Problem]:
+    """
+    Check a package in a single pass without building its objects, yielding problems as they are found.
+    Stop iterating to stop checking, for SIQ the rounds left are not parsed then.
+    """
+    rules = list(rules)
+    fmt = formats.FORMATS.get(filetype)
+    if fmt is None:
+        yield Problem("format", f"Unknown file type '{filetype}'" if filetype else "Not a SI Game package")
+        return
+    content_name = fmt.content_name
+    try:
+        zipfile = ZipFile(path, "r")
+    except BadZipFile as e:
+        yield Problem("format", f"Not a zip file: {e}")
+        return
+    with zipfile:
+        members = frozenset(normalize_member(name) for name in zipfile.namelist())
+        if content_name not in members:
+            yield Problem("format", f"No {content_name}")
+            return
+        context = Context(filetype, members)
+        with zipfile.open(content_name) as fp:
+            questions = content_questions(fp, filetype)
+            while True:
+                # Only reading is guarded, errors of rules are bugs and propagate
+                try:
+                    question = next(questions, None)
+                except FORMAT_ERRORS as e:
+                    yield Problem("format", f"Malformed {content_name}: {e}")
+                    return
+                if question is None:
+                    return
+                for rule in rules:
+                    for message in rule.check(question, context):
+                        yield Problem(rule.name, message, question.location)
+
+
+def validate(path, filetype: None | str, rules: Iterable[Rule] = RULES.values(),
+             fail_fast: bool = False) -> List[Problem]:
+    """
+    List problems of a package, only the first one with fail_fast.
+    """
+    problems: List[Problem] = []
+    for problem in iter_problems(path, filetype, rules):
+        problems.append(problem)
+        if fail_fast:
+            break
+    return problems
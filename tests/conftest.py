@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+import pathlib
+from typing import Any, Dict
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from benchmarks.generate import PackSpec, generate_siq
+from sigame_tools.datatypes import Package, json_default
+
+# Small pack with every feature the generator has: info, question types, oral and media atoms, wrong answers
+SPEC = PackSpec(rounds=3, themes=3, questions=4, info=0.5, wrong=0.5, oral=0.3, media=0.5, special=0.5,
+                media_files=2, media_size=256, seed=1)
+
+
+def package_dict(package: Package) -> Dict[str, Any]:
+    """
+    Package as plain JSON data, for comparing packages read by different readers.
+    """
+    return json.loads(json.dumps(package, default=json_default, ensure_ascii=False))
+
+
+def write_siq(path: pathlib.Path, content_xml: str, media: Dict[str, bytes] = None) -> pathlib.Path:
+    with ZipFile(path, "w", ZIP_DEFLATED) as zipfile:
+        zipfile.writestr("content.xml", content_xml.encode("utf-8"))
+        for name, data in (media or {}).items():
+            zipfile.writestr(name, data, ZIP_STORED)
+    return path
+
+
+@pytest.fixture
+def siq_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    path = tmp_path / "pack.siq"
+    generate_siq(path, SPEC)
+    return path
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import pytest
+
+from conftest import write_siq
+from sigame_tools import assets
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+CONTENT = ('<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><rounds><round name="R"><themes>'
+           '<theme name="T"><questions>'
+           '<question price="100"><scenario><atom type="image">@My picture.jpg</atom>'
+           '<atom type="voice">@gone.mp3</atom></scenario><right><answer>A</answer></right></question>'
+           '<question price="200"><scenario><atom type="image">@My picture.jpg</atom><atom>@not media</atom>'
+           '<atom type="video">https://example.com/v.mp4</atom></scenario><right><answer>A</answer></right></question>'
+           '</questions></theme></themes></round></rounds></package>')
+MEDIA = {
+    # Member names are URL-encoded by SIGame
+    "Images/My%20picture.jpg": b"\xff\xd8 picture",
+    "Audio/unused.mp3": b"ID3 sound",
+    "Texts/notes.txt": b"notes",
+}
+
+
+@pytest.fixture
+def package(tmp_path):
+    return write_siq(tmp_path / "pack.siq", CONTENT, MEDIA)
+
+
+def members(path):
+    with ZipFile(path) as zipfile:
+        return {name: zipfile.read(name) for name in zipfile.namelist()}
+
+
+def test_inventory(package, tmp_path):
+    with assets.AssetHashCache(tmp_path / "cache.sqlite3") as cache:
+        inventory = assets.take_inventory(package, SIDocumentTypes.SIQ, cache)
+    assert {asset.name: asset.size for asset in inventory.assets} == {name: len(d) for name, d in MEDIA.items()}
+    assert inventory.missing == [assets.MediaRef("Audio/gone.mp3", 0, 0, 0)]
+    # Texts/ is never referenced by atoms, so it is not reported
+    assert inventory.orphaned == ["Audio/unused.mp3"]
+
+
+def test_hash_cache(package, tmp_path):
+    with assets.AssetHashCache(tmp_path / "cache.sqlite3") as cache:
+        hashed = assets.hash_assets(package, cache)
+        assert cache.get(package) == {asset.name: asset for asset in hashed}
+        # Cached hashes are used as long as the file is unchanged
+        fake = [asset._replace(sha256="0" * 64) for asset in hashed]
+        cache.put(package, fake)
+        assert assets.hash_assets(package, cache) == fake
+        stat = os.stat(package)
+        os.utime(package, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert cache.get(package) is None
+        assert assets.hash_assets(package, cache) == hashed
+
+
+def test_store(package, tmp_path):
+    store = assets.BlobStore(tmp_path / "store")
+    hashed = assets.hash_assets(package, store=store)
+    for asset in hashed:
+        assert asset.sha256 in store and store.path(asset.sha256).read_bytes() == MEDIA[asset.name]
+    # The same data is stored once
+    copy = write_siq(tmp_path / "copy.siq", CONTENT, {"Images/other.jpg": MEDIA["Images/My%20picture.jpg"]})
+    with ZipFile(copy) as zipfile:
+        assert store.add_member(zipfile, zipfile.getinfo("Images/other.jpg"))[2] is False
+    assert len([blob for blob in (tmp_path / "store" / "objects").rglob("*") if blob.is_file()]) == len(MEDIA)
+    assert list((tmp_path / "store" / "tmp").iterdir()) == []
+
+
+def test_strip_and_restore(package, tmp_path):
+    store = assets.BlobStore(tmp_path / "store")
+    hashed = assets.hash_assets(package, store=store)
+    stripped = tmp_path / "stripped.siq"
+    assets.strip_package(package, stripped, hashed)
+    assert set(members(stripped)) == {"content.xml", assets.MANIFEST_NAME}
+    restored = tmp_path / "restored.siq"
+    assets.restore_package(stripped, restored, store)
+    assert members(restored) == members(package)
+    SIDocument.read_siq(restored)
+
+
+def test_restored_members_keep_attributes(package, tmp_path):
+    with ZipFile(package, "a") as zipfile:
+        zipfile.writestr("Images/deflated.jpg", b"image", compress_type=ZIP_DEFLATED)
+    store = assets.BlobStore(tmp_path / "store")
+    hashed = assets.hash_assets(package, store=store)
+    assets.strip_package(package, tmp_path / "stripped.siq", hashed)
+    assets.restore_package(tmp_path / "stripped.siq", tmp_path / "restored.siq", store)
+    with ZipFile(package) as zipfile, ZipFile(tmp_path / "restored.siq") as restored:
+        for info in zipfile.infolist():
+            same = restored.getinfo(info.filename)
+            assert (same.date_time, same.compress_type, same.external_attr) == (
+                info.date_time, info.compress_type, info.external_attr)
+    # Manifests without attributes give writable members rather than the mode of read-only blobs
+    manifest = {asset.name: {"sha256": asset.sha256, "size": asset.size} for asset in hashed}
+    write_siq(tmp_path / "old.siq", CONTENT, {assets.MANIFEST_NAME: json.dumps(manifest).encode()})
+    assets.restore_package(tmp_path / "old.siq", tmp_path / "restored.siq", store)
+    with ZipFile(tmp_path / "restored.siq") as restored:
+        assert {info.external_attr >> 16 for info in restored.infolist() if info.filename in manifest} == {0o600}
+
+
+def test_restore_without_blobs(package, tmp_path):
+    hashed = assets.hash_assets(package)
+    assets.strip_package(package, tmp_path / "stripped.siq", hashed)
+    with pytest.raises(ValueError, match="3 assets are not in the store"):
+        assets.restore_package(tmp_path / "stripped.siq", tmp_path / "restored.siq",
+                               assets.BlobStore(tmp_path / "empty"))
+
+
+def test_link_package(package, tmp_path):
+    store = assets.BlobStore(tmp_path / "store")
+    hashed = assets.hash_assets(package, store=store)
+    assets.link_package(package, tmp_path / "pack.d", hashed, store)
+    picture = tmp_path / "pack.d" / "Images" / "My%20picture.jpg"
+    assert picture.read_bytes() == MEDIA["Images/My%20picture.jpg"]
+    assert (tmp_path / "pack.d" / "content.xml").exists()
+    assert os.path.samefile(picture, store.path(hashed[0].sha256))
+    with pytest.raises(ValueError, match="Unsafe member name"):
+        assets.link_package(package, tmp_path / "pack.d", [hashed[0]._replace(name="../evil.jpg")], store)
+
+
+def test_atom_member():
+    assert assets.atom_member("image", "@a.png") == "Images/a.png"
+    assert assets.atom_member("voice", "@a.mp3") == "Audio/a.mp3"
+    assert assets.atom_member("video", "https://example.com/a.mp4") is None
+    assert assets.atom_member("text", "@a") is None
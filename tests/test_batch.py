@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools import batch, cli
+from sigame_tools.batch import ConversionJob, convert_many
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+
+def run(*argv: str):
+    args = cli.parser.parse_args(list(argv))
+    args.func(args)
+
+
+def test_convert_many_reports_errors_per_file(siq_path, tmp_path):
+    broken = tmp_path / "broken.siq"
+    broken.write_bytes(b"not a zip file")
+    jobs = [ConversionJob(siq_path, tmp_path / "out" / "pack.jsiq.zip", SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ),
+            ConversionJob(broken, tmp_path / "out" / "broken.jsiq.zip", SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ)]
+    results = {result.job.src: result for result in convert_many(jobs, workers=1)}
+    assert results[siq_path].error is None and results[siq_path].size == siq_path.stat().st_size
+    assert results[broken].error
+    assert package_dict(SIDocument.read_jsiq(tmp_path / "out" / "pack.jsiq.zip").package) == \
+        package_dict(SIDocument.read_siq(siq_path).package)
+
+
+def test_globs_keep_directory_layout(siq_path, tmp_path, monkeypatch):
+    for directory in ("packs/a", "packs/b"):
+        (tmp_path / directory).mkdir(parents=True)
+        shutil.copy(siq_path, tmp_path / directory / "x.siq")
+    monkeypatch.chdir(tmp_path)
+    run("convert-many", "-o", "jsiq.zip", "-j", "1", "packs/**/*.siq", "out")
+    assert sorted(path.relative_to(tmp_path / "out").as_posix() for path in (tmp_path / "out").rglob("*.zip")) == \
+        ["a/x.jsiq.zip", "b/x.jsiq.zip"]
+
+
+def test_globs_skip_other_files(siq_path, tmp_path, monkeypatch):
+    (tmp_path / "packs").mkdir()
+    shutil.copy(siq_path, tmp_path / "packs" / "x.siq")
+    (tmp_path / "packs" / "notes.txt").write_text("notes")
+    monkeypatch.chdir(tmp_path)
+    run("convert-many", "-o", "jsiq.zip", "-j", "1", "packs/*", "out")
+    assert [path.name for path in (tmp_path / "out").iterdir()] == ["x.jsiq.zip"]
+
+
+def test_same_file_from_several_sources(siq_path, tmp_path, monkeypatch):
+    (tmp_path / "a").mkdir()
+    shutil.copy(siq_path, tmp_path / "a" / "x.siq")
+    monkeypatch.chdir(tmp_path)
+    run("convert-many", "-o", "jsiq.zip", "-j", "1", "a", "a/*.siq", "out")
+    assert [path.name for path in (tmp_path / "out").rglob("*.zip")] == ["x.jsiq.zip"]
+
+
+@pytest.mark.parametrize("sources", [("a", "b"), ("a/*.siq", "b/*.siq")])
+def test_duplicate_targets_fail(siq_path, tmp_path, monkeypatch, sources):
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        shutil.copy(siq_path, tmp_path / directory / "x.siq")
+    monkeypatch.chdir(tmp_path)
+    # Files are placed relative to their directory or pattern base, both end up at out/x.jsiq.zip
+    with pytest.raises(ValueError, match="would both be converted"):
+        run("convert-many", "-o", "jsiq.zip", "-j", "1", *sources, "out")
+    assert not (tmp_path / "out").exists()
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers have to inherit the patched function")
+def test_dead_worker_fails_only_its_job(siq_path, tmp_path, monkeypatch):
+    crash = tmp_path / "crash.siq"
+    # Largest, so it starts first and other jobs run along with it
+    crash.write_bytes(siq_path.read_bytes() * 2)
+    convert = batch.convert_file
+
+    def convert_or_crash(job, options):
+        if job.src == crash:
+            os._exit(1)
+        return convert(job, options)
+    monkeypatch.setattr(batch, "convert_file", convert_or_crash)
+    jobs = [ConversionJob(src, tmp_path / "out" / f"{src.stem}{n}.bsiq", SIDocumentTypes.SIQ, SIDocumentTypes.BSIQ)
+            for n, src in enumerate([crash] + [siq_path] * 4)]
+    results = {result.job.dst.name: result.error for result in convert_many(jobs, workers=2)}
+    assert results.pop("crash0.bsiq").startswith("BrokenProcessPool")
+    assert results == {f"pack{n}.bsiq": None for n in range(1, 5)}
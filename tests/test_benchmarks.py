@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from zipfile import ZipFile
+
+import pytest
+
+from benchmarks import run
+from benchmarks.generate import PackSpec, generate_content_xml, generate_siq
+from conftest import SPEC
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+
+def test_generator_is_deterministic(tmp_path):
+    assert generate_content_xml(SPEC) == generate_content_xml(SPEC)
+    assert generate_content_xml(SPEC) != generate_content_xml(SPEC._replace(seed=2))
+    generate_siq(tmp_path / "a.siq", SPEC)
+    generate_siq(tmp_path / "b.siq", SPEC)
+    with ZipFile(tmp_path / "a.siq") as a, ZipFile(tmp_path / "b.siq") as b:
+        assert [(i.filename, i.CRC) for i in a.infolist()] == [(i.filename, i.CRC) for i in b.infolist()]
+
+
+def test_generated_pack(siq_path):
+    package = SIDocument.read_siq(siq_path).package
+    assert len(package.rounds) == SPEC.rounds and package.rounds[-1].final
+    questions = [q for r in package.rounds for t in r.themes for q in t.questions]
+    assert len(questions) == SPEC.question_count
+    assert [q.price for q in package.rounds[0].themes[0].questions] == [100, 200, 300, 400]
+    with ZipFile(siq_path) as zipfile:
+        media = [name for name in zipfile.namelist() if SIDocument.is_asset(name)]
+    assert len(media) == 3 * SPEC.media_files
+
+
+def test_no_media(tmp_path):
+    generate_siq(tmp_path / "a.siq", PackSpec(rounds=1, themes=1, questions=1))
+    with ZipFile(tmp_path / "a.siq") as zipfile:
+        assert zipfile.namelist() == ["content.xml"]
+
+
+@pytest.mark.parametrize("case", run.CASES, ids=lambda case: case.name)
+def test_case_runs(case, tmp_path):
+    workspace = run.Workspace(tmp_path, tmp_path / "pack.siq", tmp_path / "pack.jsiq.zip", tmp_path / "pack.bsiq")
+    generate_siq(workspace.siq, PackSpec(rounds=2, themes=2, questions=2, media_files=1, media_size=64))
+    doc = SIDocument.read_siq(workspace.siq)
+    doc.save_as(workspace.jsiq, SIDocumentTypes.JSIQ)
+    doc.save_as(workspace.bsiq, SIDocumentTypes.BSIQ)
+    result = run.measure(case, workspace, repeat=2)
+    assert len(result["times"]) == 2 and result["min"] <= result["median"] and result["peak_bytes"] > 0
+
+
+def test_compare(capsys):
+    baseline = {"commit": "abc", "results": [{"case": "a", "questions": 10, "median": 1.0, "peak_bytes": 100},
+                                             {"case": "b", "questions": 10, "median": 1.0, "peak_bytes": 100}]}
+    results = [{"case": "a", "questions": 10, "median": 1.05, "peak_bytes": 100},
+               {"case": "b", "questions": 10, "median": 1.0, "peak_bytes": 150},
+               {"case": "c", "questions": 10, "median": 9.0, "peak_bytes": 900}]
+    assert run.compare(results, baseline, 1.1) == 1
+    assert "REGRESSION" in capsys.readouterr().err
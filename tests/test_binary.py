@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import io
+import struct
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools import binary, cli
+from sigame_tools.datatypes import Atom, Package, Question, QuestionType, Round, SIDocument, SIDocumentTypes, Theme
+
+
+@pytest.fixture
+def bsiq_path(siq_path, tmp_path):
+    path = tmp_path / "pack.bsiq"
+    SIDocument.read_siq(siq_path).save_as(path, SIDocumentTypes.BSIQ)
+    return path
+
+
+def test_round_trip(siq_path, bsiq_path):
+    doc = SIDocument.read_as(bsiq_path, SIDocumentTypes.BSIQ)
+    assert package_dict(doc.package) == package_dict(SIDocument.read_siq(siq_path).package)
+    with ZipFile(siq_path) as zipsiq, ZipFile(bsiq_path) as zipbsiq:
+        assert sorted(zipbsiq.namelist()) == sorted(set(zipsiq.namelist()) - {"content.xml"} | {"content.bin"})
+
+
+def test_edge_values():
+    package = Package("П")
+    package.tags.extend(["", "t"])
+    _round = Round("R", final=True)
+    theme = Theme("")
+    question = Question(QuestionType("bagcat"), price=0)
+    question.q_type["cost"] = ""
+    question.info.comments = "c"
+    # Times are kept as written: absent, a number or any other text
+    question.scenario.extend([Atom("a"), Atom("b", "say", 5), Atom("c", "voice", "1.5"), Atom("", "marker")])
+    question.right.append("")
+    theme.questions.append(question)
+    _round.themes.append(theme)
+    package.rounds.append(_round)
+    fp = io.BytesIO()
+    binary.write_package(fp, package)
+    read = binary.read_package(fp.getvalue())
+    assert package_dict(read) == package_dict(package)
+    assert [atom.time for atom in read.rounds[0].themes[0].questions[0].scenario] == [0, 5, "1.5", 0]
+
+
+def test_broken_content():
+    fp = io.BytesIO()
+    binary.write_package(fp, Package("P"))
+    data = fp.getvalue()
+    with pytest.raises(ValueError, match="Not a binary SIQ package"):
+        binary.read_package(b"XXXX" + data[4:])
+    with pytest.raises(ValueError, match="Truncated"):
+        binary.read_package(data[:-1])
+
+
+def content() -> bytes:
+    fp = io.BytesIO()
+    package = Package("P")
+    question = Question(price=100)
+    question.right.extend(["A", "B"])
+    theme = Theme("T")
+    theme.questions.extend([question, Question(price=200)])
+    _round = Round("R")
+    _round.themes.append(theme)
+    package.rounds.append(_round)
+    binary.write_package(fp, package)
+    return fp.getvalue()
+
+
+def replace_section(data: bytes, name: str, edit) -> bytes:
+    # Apply edit to the bytes of a section, keeping its length in the header right
+    count = len(binary.SECTIONS)
+    lengths = list(struct.unpack_from(f"<{count}I", data, 8))
+    index = binary.SECTIONS.index(name)
+    start = 8 + 4 * count + sum(lengths[:index])
+    end = start + lengths[index]
+    section = edit(data[start:end])
+    lengths[index] = len(section)
+    return data[:8] + struct.pack(f"<{count}I", *lengths) + data[8 + 4 * count:start] + section + data[end:]
+
+
+@pytest.mark.parametrize("edit, message", [
+    (lambda data: replace_section(data, "answers", lambda s: struct.pack("<i", 1000) + s[4:]),
+     "String index out of range in answers section"),
+    (lambda data: replace_section(data, "answers", lambda s: s[:-4]), "answers section has 1 records, 2 expected"),
+    (lambda data: replace_section(data, "questions", lambda s: s[:-24]), "questions section has 1 records"),
+    (lambda data: replace_section(data, "questions", lambda s: s[:-4]), "Truncated questions section"),
+    (lambda data: replace_section(data, "questions", lambda s: s[:8] + struct.pack("<i", 2) + s[12:]),
+     "Malformed flag in questions section"),
+    (lambda data: data[:-4], "Truncated binary package"),
+    (lambda data: data + b"\0", "Trailing bytes after binary package"),
+])
+def test_corrupt_content(edit, message):
+    data = content()
+    assert package_dict(binary.read_package(data))["rounds"][0]["themes"][0]["questions"][0]["answers"] == {
+        "right": ["A", "B"]}
+    with pytest.raises(ValueError, match=f"Read error: {message}"):
+        binary.read_package(edit(data))
+
+
+def test_lazy_is_ignored(siq_path, bsiq_path):
+    # Callers ask every format for a lazy package, binary ones are read eagerly anyway
+    doc = SIDocument.read_as(bsiq_path, SIDocumentTypes.BSIQ, lazy=True)
+    assert package_dict(doc.package) == package_dict(SIDocument.read_siq(siq_path).package)
+
+
+def test_query_without_index(bsiq_path, capsys):
+    args = cli.parser.parse_args(["query", "--no-index", str(bsiq_path)])
+    args.func(args)
+    assert capsys.readouterr().out.startswith("SIGame Package Synthetic pack")
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import pytest
+
+from sigame_tools.columnar import Corpus, export_corpus
+from sigame_tools.datatypes import Package, Question, QuestionType, Round, SIDocument, Theme
+
+np = pytest.importorskip("numpy")
+
+
+def questions(package: Package):
+    return [question for _round in package.rounds for theme in _round.themes for question in theme.questions]
+
+
+@pytest.fixture
+def packages(siq_path):
+    package = SIDocument.read_siq(siq_path).package
+    custom = Package("Другой")
+    _round = Round("Финал", final=True)
+    theme = Theme("T")
+    theme.questions.append(Question(QuestionType("riddle"), 700))
+    _round.themes.append(theme)
+    custom.rounds.extend([_round, Round("Empty")])
+    return [("pack.siq", package), ("custom.siq", custom)]
+
+
+def test_export_and_aggregates(packages, tmp_path):
+    rows = export_corpus(packages, tmp_path / "corpus")
+    corpus = Corpus(tmp_path / "corpus")
+    all_questions = [q for _, package in packages for q in questions(package)]
+    assert rows == corpus.meta["rows"]
+    assert corpus.rows("packs") == 2 and corpus.rows("questions") == len(all_questions)
+    assert corpus.price_distribution() == dict(Counter(q.price for q in all_questions))
+    # Unknown types get codes of their own
+    assert corpus.question_type_counts() == dict(Counter(q.q_type.name for q in all_questions))
+    assert "riddle" in corpus.question_types
+
+
+def test_strings(packages, tmp_path):
+    export_corpus(packages, tmp_path / "corpus")
+    corpus = Corpus(tmp_path / "corpus")
+    assert [corpus.string("packs", "name", i) for i in range(2)] == [packages[0][1].name, "Другой"]
+    assert corpus.string("packs", "path", 1) == "custom.siq"
+    rounds = [r for _, package in packages for r in package.rounds]
+    assert [corpus.string("rounds", "name", i) for i in range(len(rounds))] == [r.name for r in rounds]
+    assert corpus.column("rounds", "final").tolist() == [int(r.final) for r in rounds]
+    first = questions(packages[0][1])[0]
+    assert corpus.string("questions", "answer", 0) == (first.right[0] if first.right else "")
+    assert corpus.string("atoms", "text", 0) == first.scenario[0].text
+
+
+def test_atom_type_mix(packages, tmp_path):
+    export_corpus(packages, tmp_path / "corpus")
+    corpus = Corpus(tmp_path / "corpus")
+    mix = corpus.atom_type_mix()
+    rounds = [r for _, package in packages for r in package.rounds]
+    assert mix.shape == (len(rounds), len(corpus.atom_types))
+    for i, _round in enumerate(rounds):
+        counts = Counter(atom.type for theme in _round.themes for q in theme.questions for atom in q.scenario)
+        assert {corpus.atom_types[t]: int(n) for t, n in enumerate(mix[i]) if n} == dict(counts)
+
+
+def test_empty_corpus(tmp_path):
+    export_corpus([], tmp_path / "corpus")
+    corpus = Corpus(tmp_path / "corpus")
+    assert corpus.price_distribution() == {} and corpus.question_type_counts() == {}
+    assert corpus.atom_type_mix().shape == (0, len(corpus.atom_types))
+
+
+def test_unsupported_version(tmp_path):
+    export_corpus([], tmp_path / "corpus")
+    meta = tmp_path / "corpus" / "meta.json"
+    meta.write_text(meta.read_text(encoding="utf-8").replace('"version": 1', '"version": 99'), encoding="utf-8")
+    with pytest.raises(ValueError, match="Unsupported columnar export version"):
+        Corpus(tmp_path / "corpus")
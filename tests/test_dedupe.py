@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+from conftest import write_siq
+from sigame_tools import dedupe
+from sigame_tools.datatypes import SIDocumentTypes
+
+np = pytest.importorskip("numpy")
+
+
+def content(*questions) -> str:
+    xml = "".join(f'<question price="100"><scenario><atom>{text}</atom></scenario>'
+                  f'<right><answer>{answer}</answer></right></question>' for text, answer in questions)
+    return (f'<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><rounds><round name="R"><themes>'
+            f'<theme name="T"><questions>{xml}</questions></theme></themes></round></rounds></package>')
+
+
+QUESTION = "Какая река самая длинная в Южной Америке и впадает в Атлантический океан"
+
+
+def test_shingle_hashes():
+    assert dedupe.shingle_hashes("  ") == []
+    # Case, "ё" and whitespace runs do not matter
+    assert sorted(dedupe.shingle_hashes("Ёлка  Ель")) == sorted(dedupe.shingle_hashes("елка ель"))
+    assert len(dedupe.shingle_hashes("abc")) == 1
+
+
+def test_minhash_estimates_similarity():
+    a = dedupe.shingle_hashes(QUESTION)
+    b = dedupe.shingle_hashes(QUESTION + "?")
+    c = dedupe.shingle_hashes("Completely unrelated text about something else entirely")
+    signatures = dedupe.minhash_signatures([a, b, c], batch_shingles=16)
+    assert signatures.shape == (3, dedupe.NUM_PERM) and signatures.dtype == np.uint32
+    assert np.count_nonzero(signatures[0] == signatures[1]) / dedupe.NUM_PERM > 0.8
+    assert np.count_nonzero(signatures[0] == signatures[2]) / dedupe.NUM_PERM < 0.2
+    # Batching does not change the result
+    assert (dedupe.minhash_signatures([a, b, c]) == signatures).all()
+
+
+def test_lsh_params():
+    bands, rows = dedupe.lsh_params(128, 0.8)
+    assert bands * rows == 128 and (1 / bands) ** (1 / rows) <= 0.8
+
+
+def test_find_duplicates(tmp_path):
+    first = write_siq(tmp_path / "first.siq", content((QUESTION, "Амазонка"), ("Столица Франции", "Париж")))
+    second = write_siq(tmp_path / "second.siq", content(("Другой вопрос про горы", "Эверест"),
+                                                        (QUESTION + "?", "Амазонка")))
+    cache = tmp_path / "cache"
+    packs = [dedupe.load_signatures(path, SIDocumentTypes.SIQ, cache=cache) for path in (first, second)]
+    cluster, = dedupe.find_duplicates(packs)
+    assert [(pathlib_name(ref.path), ref.question) for ref in cluster.questions] == [("first.siq", 0),
+                                                                                    ("second.siq", 1)]
+    assert 0.8 <= cluster.similarity <= 1
+    assert dedupe.find_duplicates(packs, threshold=1.0) == []
+
+
+def test_signatures_are_cached(tmp_path):
+    path = write_siq(tmp_path / "pack.siq", content((QUESTION, "Амазонка")))
+    cache = tmp_path / "cache"
+    pack = dedupe.load_signatures(path, SIDocumentTypes.SIQ, cache=cache)
+    assert len(list(cache.glob("*.npz"))) == 1
+    cached = dedupe.load_signatures(path, SIDocumentTypes.SIQ, cache=cache)
+    assert (cached.signatures == pack.signatures).all() and list(cached.texts) == list(pack.texts)
+    assert cached.coordinates.tolist() == [[0, 0, 0]]
+
+
+def pathlib_name(path: str) -> str:
+    return path.replace("\\", "/").rsplit("/", 1)[-1]
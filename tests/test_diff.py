@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import pickle
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools import diff
+from sigame_tools.datatypes import Atom, Package, Question, QuestionType, Round, SIDocument, SIDocumentTypes, Theme
+
+
+def make_package() -> Package:
+    package = Package("P")
+    for r in ("R1", "R2"):
+        _round = Round(r)
+        for t in ("T1", "T2"):
+            theme = Theme(t)
+            for price in (100, 200):
+                question = Question(price=price)
+                question.scenario.append(Atom(f"{r} {t} {price}"))
+                question.right.append("A")
+                theme.questions.append(question)
+            _round.themes.append(theme)
+        package.rounds.append(_round)
+    return package
+
+
+def copy(package: Package) -> Package:
+    return pickle.loads(pickle.dumps(package))
+
+
+def question(package: Package, r: int, t: int, q: int) -> Question:
+    return package.rounds[r].themes[t].questions[q]
+
+
+def changes(old: Package, new: Package):
+    return [(change.kind, change.path, change.fields) for change in diff.diff_packages(old, new)]
+
+
+def test_no_changes():
+    assert changes(make_package(), make_package()) == []
+
+
+def test_question_changes():
+    old = make_package()
+    new = copy(old)
+    question(new, 0, 1, 0).right.append("B")
+    question(new, 0, 1, 0).q_type = QuestionType("cat")
+    question(new, 1, 0, 1).info.comments = "C"
+    assert changes(old, new) == [
+        ("changed", ("R1", "T2", "100"), ("type", "right")),
+        ("changed", ("R2", "T1", "200"), ("info",)),
+    ]
+
+
+def test_structure_changes():
+    old = make_package()
+    new = copy(old)
+    new.name = "Q"
+    new.rounds[0].name = "Renamed"
+    del new.rounds[1].themes[0].questions[0]
+    new.rounds[1].themes[1].questions.append(Question(price=300))
+    # Equally named siblings are told apart by their position among each other
+    new.rounds[1].themes.append(Theme("T1"))
+    assert changes(old, new) == [
+        ("changed", (), ()),
+        ("removed", ("R1",), ()),
+        ("added", ("Renamed",), ()),
+        ("removed", ("R2", "T1", "100"), ()),
+        ("added", ("R2", "T2", "300"), ()),
+        ("added", ("R2", "T1 (2)"), ()),
+    ]
+
+
+def test_repriced_questions():
+    old = make_package()
+    new = copy(old)
+    question(new, 0, 0, 1).price = 300
+    # Both prices and the question change, the position tells it
+    question(new, 1, 1, 0).price = 150
+    question(new, 1, 1, 0).right.append("B")
+    assert changes(old, new) == [
+        ("changed", ("R1", "T1", "200"), ("price",)),
+        ("changed", ("R2", "T2", "100"), ("price", "right")),
+    ]
+    # Reordered questions are matched by their content
+    new = copy(old)
+    questions = new.rounds[0].themes[0].questions
+    questions.reverse()
+    questions[0].price, questions[1].price = 300, 400
+    assert changes(old, new) == [
+        ("changed", ("R1", "T1", "200"), ("price",)),
+        ("changed", ("R1", "T1", "100"), ("price",)),
+    ]
+
+
+def test_merge_repriced_question():
+    base = make_package()
+    ours, theirs = copy(base), copy(base)
+    question(ours, 0, 0, 1).price = 300
+    question(theirs, 0, 0, 1).right.append("Theirs")
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert [(c.path, c.reason) for c in conflicts] == [(("R1", "T1", "200"), "changed on both sides")]
+    assert [q.price for q in merged.rounds[0].themes[0].questions] == [100, 300]
+    question(theirs, 0, 0, 1).right.pop()
+    question(theirs, 0, 0, 0).right.append("Theirs")
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert conflicts == [] and [q.price for q in merged.rounds[0].themes[0].questions] == [100, 300]
+    assert question(merged, 0, 0, 0).right == ["A", "Theirs"]
+
+
+def test_merge_edits_of_both_sides():
+    base = make_package()
+    ours, theirs = copy(base), copy(base)
+    question(ours, 0, 0, 0).right.append("Ours")
+    question(theirs, 1, 1, 1).right.append("Theirs")
+    theirs.rounds[0].themes[1].questions.append(Question(price=300))
+    ours.name = "Ours"
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert conflicts == []
+    assert merged.name == "Ours"
+    assert question(merged, 0, 0, 0).right == ["A", "Ours"] and question(merged, 1, 1, 1).right == ["A", "Theirs"]
+    assert [q.price for q in merged.rounds[0].themes[1].questions] == [100, 200, 300]
+    # Unchanged subtrees are shared, the inputs stay as they were
+    assert merged.rounds[0].themes[0] is ours.rounds[0].themes[0] and merged.rounds[1] is theirs.rounds[1]
+    assert package_dict(base) == package_dict(make_package())
+    assert [q.price for q in ours.rounds[0].themes[1].questions] == [100, 200]
+
+
+def test_merge_question_changed_on_both_sides():
+    base = make_package()
+    ours, theirs = copy(base), copy(base)
+    question(ours, 0, 0, 0).right.append("Ours")
+    question(theirs, 0, 0, 0).right.append("Theirs")
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert [(c.path, c.reason) for c in conflicts] == [(("R1", "T1", "100"), "changed on both sides")]
+    assert question(merged, 0, 0, 0).right == ["A", "Ours"]
+
+
+def test_merge_removed_and_changed():
+    base = make_package()
+    ours, theirs = copy(base), copy(base)
+    del ours.rounds[1].themes[0].questions[1]
+    question(theirs, 1, 0, 1).wrong.append("W")
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert [(c.path, c.reason) for c in conflicts] == [
+        (("R2", "T1", "200"), "removed on one side, changed on the other")
+    ]
+    # The changed version is kept
+    assert question(merged, 1, 0, 1).wrong == ["W"]
+
+
+def test_merge_fields_changed_on_both_sides():
+    base = make_package()
+    ours, theirs = copy(base), copy(base)
+    ours.rounds[0].info.comments = "Ours"
+    theirs.rounds[0].info.comments = "Theirs"
+    theirs.rounds[0].themes[0].questions.append(Question(price=300))
+    merged, conflicts = diff.merge_packages(base, ours, theirs)
+    assert [(c.path, c.reason) for c in conflicts] == [(("R1",), "fields changed on both sides")]
+    assert merged.rounds[0].info.comments == "Ours"
+    assert [q.price for q in merged.rounds[0].themes[0].questions] == [100, 200, 300]
+
+
+@pytest.fixture
+def revisions(siq_path, tmp_path):
+    base = tmp_path / "base.siq"
+    base.write_bytes(siq_path.read_bytes())
+    ours, theirs = tmp_path / "ours.siq", tmp_path / "theirs.siq"
+    doc = SIDocument.read_siq(base)
+    doc.package.rounds[0].name = "Ours"
+    doc.save_as(ours, SIDocumentTypes.SIQ)
+    doc = SIDocument.read_siq(base)
+    doc.package.rounds[1].themes[0].questions[0].right.append("Theirs")
+    doc.save_as(theirs, SIDocumentTypes.SIQ)
+    with ZipFile(theirs, "a") as zipfile:
+        zipfile.writestr("Images/new.jpg", b"new image")
+    return base, ours, theirs
+
+
+def test_diff_files(revisions):
+    base, ours, theirs = revisions
+    found = [(c.kind, c.path) for c in diff.diff_files(base, SIDocumentTypes.SIQ, theirs, SIDocumentTypes.SIQ)]
+    assert found[-1] == ("added", ("media", "Images/new.jpg"))
+    assert found[0][0] == "changed" and len(found) == 2
+    assert diff.diff_files(base, SIDocumentTypes.SIQ, base, SIDocumentTypes.SIQ) == []
+
+
+def test_lazy_diff(revisions):
+    base, _, theirs = revisions
+    # Written the same way as theirs, so only the edited question differs in content
+    saved = base.with_name("saved.siq")
+    SIDocument.read_siq(base).save_as(saved, SIDocumentTypes.SIQ)
+    old, new = (SIDocument.read_siq(path, lazy=True).package for path in (saved, theirs))
+    assert [c.path for c in diff.diff_packages(old, new, by_source=True)] == [
+        (new.rounds[1].name, new.rounds[1].themes[0].name, str(new.rounds[1].themes[0].questions[0].price))]
+    # Siblings on the changed path are read for their names, nothing below them is
+    assert [_round.themes.loaded for _round in old.rounds] == [0, len(old.rounds[1].themes), 0]
+    assert [theme.questions.loaded for theme in old.rounds[1].themes][1:] == [0] * (len(old.rounds[1].themes) - 1)
+
+
+def test_merge_files(revisions, tmp_path):
+    base, ours, theirs = revisions
+    dst = tmp_path / "merged.siq"
+    conflicts = diff.merge_files(base, ours, theirs, dst, (SIDocumentTypes.SIQ,) * 3, SIDocumentTypes.SIQ)
+    assert conflicts == []
+    merged = SIDocument.read_siq(dst).package
+    assert merged.rounds[0].name == "Ours" and merged.rounds[1].themes[0].questions[0].right[-1] == "Theirs"
+    with ZipFile(dst) as zipfile:
+        assert zipfile.read("Images/new.jpg") == b"new image" and zipfile.testzip() is None
+    assert diff.diff_media(ours, dst) == [diff.Change("added", ("media", "Images/new.jpg"))]
+
+
+def test_merge_into_ours(revisions, tmp_path):
+    base, ours, theirs = revisions
+    kept = tmp_path / "kept.siq"
+    kept.write_bytes(ours.read_bytes())
+    # Media is still read from ours while it is being replaced
+    diff.merge_files(base, ours, theirs, ours, (SIDocumentTypes.SIQ,) * 3, SIDocumentTypes.SIQ)
+    assert diff.diff_media(kept, ours) == [diff.Change("added", ("media", "Images/new.jpg"))]
+    assert SIDocument.read_siq(ours).package.rounds[0].name == "Ours"
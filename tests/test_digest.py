@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import copy
+import pickle
+
+import pytest
+
+from sigame_tools.datatypes import (Atom, ModelList, Package, Question, QuestionType, Round, SIDocument, SIDocumentTypes,
+                                   Theme)
+
+
+def make_package() -> Package:
+    package = Package("P")
+    package.tags.append("tag")
+    for r in ("R1", "R2"):
+        _round = Round(r)
+        for t in ("T1", "T2"):
+            theme = Theme(t)
+            for price in (100, 200):
+                question = Question(price=price)
+                question.scenario.append(Atom(f"{r} {t} {price}"))
+                question.right.append("A")
+                theme.questions.append(question)
+            _round.themes.append(theme)
+        package.rounds.append(_round)
+    return package
+
+
+def fresh_digest(package: Package) -> bytes:
+    # Copies have no cached digests
+    return pickle.loads(pickle.dumps(package)).digest
+
+
+def test_same_digest_across_formats(siq_path, tmp_path):
+    doc = SIDocument.read_siq(siq_path)
+    for filetype in (SIDocumentTypes.JSIQ, SIDocumentTypes.BSIQ):
+        path = tmp_path / f"pack.{filetype}"
+        doc.save_as(path, filetype)
+        assert SIDocument.read_as(path, filetype).package.digest == doc.package.digest
+
+
+def test_digest_is_cached():
+    package = make_package()
+    digest = package.digest
+    assert package.digest is digest
+    # Reading fields is not an edit, neither is allocating an empty info
+    question = package.rounds[0].themes[0].questions[0]
+    assert not question.info.comments and package.digest is digest
+
+
+EDITS = {
+    "price": lambda p: setattr(p.rounds[1].themes[0].questions[1], "price", 300),
+    "atom": lambda p: setattr(p.rounds[1].themes[0].questions[1].scenario[0], "text", "X"),
+    "scenario": lambda p: p.rounds[1].themes[0].questions[1].scenario.append(Atom("X")),
+    "right": lambda p: p.rounds[1].themes[0].questions[1].right.insert(0, "B"),
+    "wrong": lambda p: p.rounds[1].themes[0].questions[1].wrong.extend(["W"]),
+    "answers": lambda p: setattr(p.rounds[1].themes[0].questions[1], "right", ["B"]),
+    "type": lambda p: setattr(p.rounds[1].themes[0].questions[1], "q_type", QuestionType("cat")),
+    "comments": lambda p: setattr(p.rounds[1].themes[0].questions[1].info, "comments", "C"),
+    "authors": lambda p: p.rounds[1].themes[0].info.authors.append("A"),
+    "theme name": lambda p: setattr(p.rounds[1].themes[0], "name", "X"),
+    "questions": lambda p: p.rounds[1].themes[0].questions.pop(),
+    "sort": lambda p: p.rounds[1].themes[0].questions.sort(key=lambda q: -q.price),
+    "final": lambda p: setattr(p.rounds[1], "final", True),
+    "themes": lambda p: p.rounds[1].themes.__setitem__(0, Theme("X")),
+    "tags": lambda p: p.tags.clear(),
+    "rounds": lambda p: p.rounds.__delitem__(1),
+}
+
+
+@pytest.mark.parametrize("edit", EDITS.values(), ids=EDITS.keys())
+def test_edits_change_digest(edit):
+    package = make_package()
+    digest, untouched = package.digest, package.rounds[0].digest
+    edit(package)
+    assert package.digest != digest
+    assert package.digest == fresh_digest(package)
+    # Objects outside the edited path keep their cached digest
+    assert package.rounds[0].digest is untouched
+
+
+def test_edits_of_parameters_and_reverts():
+    package = make_package()
+    question = package.rounds[0].themes[1].questions[0]
+    question.q_type = QuestionType("cat")
+    digest = package.digest
+    question.q_type["theme"] = "T"
+    assert package.digest != digest
+    del question.q_type["theme"]
+    assert package.digest == digest
+
+
+def test_repeated_edits():
+    package = make_package()
+    question = package.rounds[0].themes[0].questions[0]
+    digests = set()
+    for answer in "BCD":
+        question.right.append(answer)
+        digests.add(package.digest)
+    assert len(digests) == 3 and package.digest == fresh_digest(package)
+
+
+def test_moved_question():
+    package = make_package()
+    package.digest
+    question = package.rounds[0].themes[0].questions.pop()
+    package.rounds[1].themes[1].questions.append(question)
+    package.digest
+    question.price = 500
+    assert package.digest == fresh_digest(package)
+
+
+def test_shared_values():
+    package = make_package()
+    _round = package.rounds[0]
+    _round.info.comments = "R"
+    shallow = copy.copy(_round)
+    # The copy shares its themes and info with the original
+    assert shallow.themes is _round.themes
+    package.digest, shallow.digest
+    _round.themes[0].questions[0].right.append("B")
+    shallow.info.comments = "C"
+    assert _round.info.comments == "C"
+    assert package.digest == fresh_digest(package) and shallow.digest == pickle.loads(pickle.dumps(shallow)).digest
+
+
+def test_copies_leave_owners_behind():
+    package = make_package()
+    _round = package.rounds[0]
+    data = pickle.dumps(_round)
+    package.digest
+    # Pickles of hashed objects do not drag their parents along
+    assert pickle.dumps(_round) == data
+    digest = _round.digest
+    copied = copy.deepcopy(_round)
+    copied.themes[0].name = "X"
+    assert copied.digest != digest and _round.digest is digest
+
+
+def test_lazy_lists(siq_path):
+    package, eager = SIDocument.read_siq(siq_path, lazy=True).package, SIDocument.read_siq(siq_path).package
+    assert package.digest == eager.digest
+    del package.rounds[0].themes[0].questions[0]
+    package.rounds[1].themes.append(Theme("T"))
+    del eager.rounds[0].themes[0].questions[0]
+    eager.rounds[1].themes.append(Theme("T"))
+    assert package.digest == eager.digest
+
+
+def test_loaded_objects_are_untracked(siq_path):
+    package = SIDocument.read_siq(siq_path).package
+    question = package.rounds[0].themes[0].questions[0]
+    assert type(package) is Package and type(question) is Question and type(question.right) is ModelList
+    package.digest
+    assert type(question) is not Question and isinstance(question, Question)
+    # Tracking stops at the first edit, copies are plain objects again
+    assert type(copy.copy(package)) is Package
+    question.price += 1
+    assert type(question) is Question
+
+
+def test_assigned_lists():
+    package = make_package()
+    theme = package.rounds[0].themes[0]
+    package.digest
+    questions = [Question(price=500)]
+    theme.questions = questions
+    digest = package.digest
+    # The list is kept as given, so edits of it are edits of the model, noticed without a cached digest
+    questions.append(Question(price=600))
+    assert [q.price for q in theme.questions] == [500, 600]
+    assert package.digest != digest and package.digest == fresh_digest(package)
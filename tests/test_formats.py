@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from xml.etree.ElementTree import ParseError
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict, write_siq
+from sigame_tools import cli, formats
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes, SIQReaders, SIQWriters
+
+TYPES = (SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ, SIDocumentTypes.BSIQ)
+
+
+def members(path):
+    with ZipFile(path) as zipfile:
+        return {info.filename: zipfile.read(info) for info in zipfile.infolist()}
+
+
+@pytest.mark.parametrize("src_type", TYPES)
+@pytest.mark.parametrize("dst_type", TYPES)
+def test_round_trips(siq_path, tmp_path, src_type, dst_type):
+    expected = SIDocument.read_siq(siq_path)
+    src, dst = tmp_path / f"src.{src_type}", tmp_path / f"dst.{dst_type}"
+    expected.save_as(src, src_type)
+    SIDocument.read_as(src, src_type).save_as(dst, dst_type)
+    doc = SIDocument.read_as(dst, dst_type)
+    assert package_dict(doc.package) == package_dict(expected.package)
+    assert doc.package.digest == expected.package.digest
+    media = {name: data for name, data in members(siq_path).items() if SIDocument.is_asset(name)}
+    assert {name: data for name, data in members(dst).items() if SIDocument.is_asset(name)} == media
+
+
+@pytest.mark.parametrize("dst_type, options", [
+    (SIDocumentTypes.SIQ, {}),
+    (SIDocumentTypes.JSIQ, {}),
+    (SIDocumentTypes.JSIQ, {"indent": 2, "ensure_ascii": True}),
+    (SIDocumentTypes.BSIQ, {}),
+])
+def test_convert_matches_documents(siq_path, tmp_path, dst_type, options):
+    fmt = formats.get_format(dst_type)
+    streamed, saved = tmp_path / f"streamed{fmt.suffix}", tmp_path / f"saved{fmt.suffix}"
+    formats.convert(siq_path, streamed, **options)
+    SIDocument.read_siq(siq_path).save_as(saved, dst_type, **options)
+    assert members(streamed) == members(saved)
+
+
+# Package info and tags may come after the rounds in SIQ
+LATE_HEADER = """<?xml version="1.0" encoding="utf-8"?>
+<package name="P" version="4" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd">
+  <rounds><round name="R"><themes><theme name="T"><questions><question price="100">
+    <scenario><atom>Q</atom></scenario><right><answer>A</answer></right>
+  </question></questions></theme></themes></round></rounds>
+  <tags><tag>late</tag></tags>
+  <info><authors><author>Author</author></authors></info>
+</package>"""
+
+
+@pytest.mark.parametrize("dst_type", TYPES)
+def test_convert_late_header(tmp_path, dst_type):
+    src = write_siq(tmp_path / "late.siq", LATE_HEADER)
+    dst = tmp_path / f"dst.{dst_type}"
+    formats.convert(src, dst, output_type=dst_type)
+    package = SIDocument.read_as(dst, dst_type).package
+    assert package_dict(package) == package_dict(SIDocument.read_siq(src).package)
+    assert list(package.tags) == ["late"] and list(package.info.authors) == ["Author"]
+
+
+def test_failed_convert_keeps_dst(siq_path, tmp_path):
+    content = members(siq_path)["content.xml"].decode("utf-8")
+    src = write_siq(tmp_path / "broken.siq", content[:content.index("</round>")] + "<broken")
+    dst = tmp_path / "dst.bsiq"
+    dst.write_bytes(b"kept")
+    with pytest.raises(ParseError):
+        formats.convert(src, dst)
+    assert dst.read_bytes() == b"kept"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["broken.siq", "dst.bsiq", "pack.siq"]
+    formats.convert(siq_path, dst)
+    assert package_dict(SIDocument.read_as(dst, SIDocumentTypes.BSIQ).package) == package_dict(
+        SIDocument.read_siq(siq_path).package)
+
+
+def test_readers_agree(siq_path):
+    expected = package_dict(SIDocument.read_siq(siq_path).package)
+    for reader in (SIQReaders.MINIDOM, SIQReaders.PARALLEL):
+        assert package_dict(SIDocument.read_siq(siq_path, reader=reader, workers=2).package) == expected
+    assert package_dict(SIDocument.read_siq(siq_path, lazy=True).package) == expected
+    with pytest.raises(ValueError, match="Incorrect SIQ reader"):
+        SIDocument.read_siq(siq_path, reader="sax")
+
+
+def test_minidom_writer(siq_path, tmp_path):
+    doc = SIDocument.read_siq(siq_path)
+    doc.save_siq(tmp_path / "out.siq", writer=SIQWriters.MINIDOM)
+    assert package_dict(SIDocument.read_siq(tmp_path / "out.siq").package) == package_dict(doc.package)
+    # Bad writers are told before the file is opened
+    (tmp_path / "kept.siq").write_bytes(b"kept")
+    with pytest.raises(ValueError, match="Incorrect SIQ writer"):
+        doc.save_siq(tmp_path / "kept.siq", writer="sax")
+    assert (tmp_path / "kept.siq").read_bytes() == b"kept"
+
+
+def test_sniff(siq_path, tmp_path):
+    doc = SIDocument.read_siq(siq_path)
+    for filetype in TYPES:
+        # Misnamed on purpose, only the content tells the format
+        path = tmp_path / f"{filetype}.zip"
+        doc.save_as(path, filetype)
+        assert formats.sniff(path).name == filetype
+        assert formats.guess(path).name == filetype
+    (tmp_path / "text.siq").write_text("text")
+    assert formats.sniff(tmp_path / "text.siq") is None
+    assert formats.guess(tmp_path / "text.siq").name == SIDocumentTypes.SIQ
+    assert formats.guess(tmp_path / "new.jsiq.zip").name == SIDocumentTypes.JSIQ
+    assert formats.from_suffix("pack.zip") is None
+
+
+def test_unknown_types(siq_path, tmp_path):
+    with pytest.raises(ValueError, match="Incorrect file type"):
+        formats.get_format("doc")
+    with pytest.raises(ValueError, match="Read error"):
+        SIDocument.read_as(siq_path, "doc")
+    with pytest.raises(ValueError, match="Save error"):
+        SIDocument.read_siq(siq_path).save_as(tmp_path / "out.doc", "doc")
+    with pytest.raises(ValueError, match="already registered"):
+        formats.register(formats.SIQFormat())
+
+
+class TextJSIQFormat(formats.JSIQFormat):
+    name = "tjsiq"
+    suffix = ".tjsiq"
+    content_name = "content.tjson"
+
+
+@pytest.fixture
+def registered():
+    fmt = formats.register(TextJSIQFormat())
+    yield fmt
+    del formats.FORMATS[fmt.name], SIDocument.CONTENT_NAMES[fmt.name]
+
+
+def test_registered_format(registered, siq_path, tmp_path):
+    path = tmp_path / "pack.tjsiq"
+    expected = SIDocument.read_siq(siq_path)
+    expected.save_as(path, registered.name)
+    assert "content.tjson" in members(path) and formats.sniff(path) is registered
+    doc = SIDocument.read_as(path, registered.name)
+    assert package_dict(doc.package) == package_dict(expected.package)
+    doc.package.name = "Edited"
+    doc.save_in_place()
+    assert SIDocument.read_as(path, registered.name).package.name == "Edited"
+    # The CLI picks up formats registered before arguments are parsed
+    args = cli.parser.parse_args(["convert", str(path), str(tmp_path / "pack.siq")])
+    args.func(args)
+    assert SIDocument.read_siq(tmp_path / "pack.siq").package.name == "Edited"
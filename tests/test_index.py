@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import shutil
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import SPEC, write_siq
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+from sigame_tools.index import PackageIndex, PackageSummary
+
+CONTENT = ('<package name="Other" difficulty="2" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd">'
+           '<tags><tag>music</tag></tags><info><authors><author>Иван</author></authors></info>'
+           '<rounds><round name="R"><themes><theme name="T"><questions>'
+           '<question price="100"><scenario><atom>Q</atom></scenario><right><answer>A</answer></right></question>'
+           '<question price="500"><type name="auction" /><scenario><atom>Q</atom></scenario>'
+           '<right><answer>A</answer></right></question>'
+           '</questions></theme></themes></round></rounds></package>')
+
+
+@pytest.fixture
+def index(tmp_path):
+    with PackageIndex(tmp_path / "index.sqlite3") as index:
+        yield index
+
+
+def test_summary(siq_path, index):
+    summary, parsed = index.update(siq_path, SIDocumentTypes.SIQ)
+    assert parsed
+    package = SIDocument.read_siq(siq_path).package
+    assert summary == PackageSummary.from_package(index.key(siq_path), SIDocumentTypes.SIQ, package)
+    assert (summary.name, summary.tags) == (package.name, package.tags)
+    assert len(summary.rounds) == SPEC.rounds and summary.questions == SPEC.question_count
+    assert sum(summary.question_types.values()) == SPEC.question_count
+    # Stored summaries read back the same
+    assert index.lookup(siq_path) == summary
+
+
+def test_fresh_entries_are_not_parsed_again(siq_path, index):
+    index.update(siq_path, SIDocumentTypes.SIQ)
+    assert index.update(siq_path, SIDocumentTypes.SIQ)[1] is False
+    # Touched but with the same content, only hashed
+    stat = os.stat(siq_path)
+    os.utime(siq_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert index.lookup(siq_path) is None
+    assert index.update(siq_path, SIDocumentTypes.SIQ)[1] is False
+    assert index.lookup(siq_path) is not None
+
+
+def test_changed_content_is_parsed_again(siq_path, tmp_path, index):
+    index.update(siq_path, SIDocumentTypes.SIQ)
+    write_siq(siq_path, CONTENT)
+    summary, parsed = index.update(siq_path, SIDocumentTypes.SIQ)
+    assert parsed and summary.name == "Other"
+    assert (summary.min_price, summary.max_price) == (100, 500)
+    assert summary.question_types == {"simple": 1, "auction": 1}
+
+
+def test_changed_content_is_read_once(siq_path, index, monkeypatch):
+    index.update(siq_path, SIDocumentTypes.SIQ)
+    write_siq(siq_path, CONTENT)
+    opened = []
+    open_member = ZipFile.open
+
+    def spy(self, name, *args, **kwargs):
+        opened.append(getattr(name, "filename", name))
+        return open_member(self, name, *args, **kwargs)
+
+    monkeypatch.setattr(ZipFile, "open", spy)
+    # The content is hashed and parsed from the same read
+    assert index.update(siq_path, SIDocumentTypes.SIQ)[1]
+    assert opened == ["content.xml"]
+
+
+def test_find(siq_path, tmp_path, index):
+    other = write_siq(tmp_path / "other.siq", CONTENT)
+    index.update(siq_path, SIDocumentTypes.SIQ)
+    index.update(other, SIDocumentTypes.SIQ)
+    assert [s.name for s in index.find(tag="music")] == ["Other"]
+    assert [s.name for s in index.find(author="Иван")] == ["Other"]
+    assert [s.name for s in index.find(name="synth")] == ["Synthetic pack"]
+    assert [s.name for s in index.find(question_type="auction", order_by="difficulty")] == ["Other", "Synthetic pack"]
+    with pytest.raises(ValueError, match="Unknown sort key"):
+        index.find(order_by="size; DROP TABLE packages")
+
+
+def test_find_wildcards_are_literal(tmp_path, index):
+    for name in ("100%", "a_b", "axb", "back\\slash"):
+        index.update(write_siq(tmp_path / f"{len(index.select())}.siq", CONTENT.replace("Other", name)),
+                     SIDocumentTypes.SIQ)
+    assert [s.name for s in index.find(name="%")] == ["100%"]
+    assert [s.name for s in index.find(name="a_")] == ["a_b"]
+    assert [s.name for s in index.find(name="k\\s")] == ["back\\slash"]
+    assert [s.name for s in index.find(question_type="auc%")] == []
+
+
+def test_prune(siq_path, tmp_path, index):
+    copy = shutil.copy(siq_path, tmp_path / "copy.siq")
+    index.update(siq_path, SIDocumentTypes.SIQ)
+    index.update(copy, SIDocumentTypes.SIQ)
+    os.remove(copy)
+    assert index.prune() == 1
+    assert [s.path for s in index.select()] == [index.key(siq_path)]
+    # Tags of removed packages go with them
+    assert index.db.execute("SELECT COUNT(*) FROM tags WHERE path = ?", (index.key(copy),)).fetchone() == (0,)
+
+
+def test_jsiq_entries(siq_path, tmp_path, index):
+    dst = tmp_path / "pack.jsiq.zip"
+    SIDocument.read_siq(siq_path).save_as(dst, SIDocumentTypes.JSIQ)
+    summary, _ = index.update(dst, SIDocumentTypes.JSIQ)
+    assert summary.filetype == SIDocumentTypes.JSIQ and summary.questions == SPEC.question_count
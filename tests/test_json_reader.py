@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from conftest import package_dict
+from sigame_tools.datatypes import AtomTypes, Package, QuestionTypes, SIDocument, SIDocumentTypes
+
+CONTENT = {
+    "name": "P",
+    "version": 4,
+    "id": "id",
+    "difficulty": 3,
+    "tags": ["t"],
+    "info": {"authors": ["A"], "comments": "C"},
+    "rounds": [{
+        "name": "R",
+        "final": True,
+        "themes": [{
+            "name": "T",
+            "questions": [
+                {"price": 100, "answers": {"right": ["yes"], "wrong": ["no"]},
+                 "scenario": [{"text": "Q"}, {"text": "@a.mp3", "type": "voice", "time": 10}]},
+                {"price": 200, "answers": {"right": ["x"]}, "type": {"name": "cat", "param": {"cost": "5"}},
+                 "info": {"sources": ["S"]}, "scenario": []},
+            ],
+        }],
+    }],
+}
+
+
+def test_deserialize_structure():
+    package = Package.json_deserialize(CONTENT)
+    assert (package.name, package.id, package.difficulty, package.tags) == ("P", "id", 3, ["t"])
+    assert package.info.authors == ["A"] and package.info.comments == "C"
+    _round = package.rounds[0]
+    assert _round.final and _round.themes[0].name == "T"
+    first, second = _round.themes[0].questions
+    assert [(a.type, a.text, a.time) for a in first.scenario] == [(AtomTypes.TEXT, "Q", 0),
+                                                                  (AtomTypes.AUDIO, "@a.mp3", 10)]
+    assert first.right == ["yes"] and first.wrong == ["no"] and first.q_type.name == QuestionTypes.SIMPLE
+    assert second.q_type.name == QuestionTypes.CAT and second.q_type["cost"] == "5"
+    assert second.info.sources == ["S"]
+
+
+def test_serialize_round_trip():
+    package = Package.json_deserialize(CONTENT)
+    assert package_dict(Package.json_deserialize(package_dict(package))) == package_dict(package)
+
+
+def test_jsiq_file_round_trip(siq_path, tmp_path):
+    package = SIDocument.read_siq(siq_path).package
+    SIDocument.read_siq(siq_path).save_as(tmp_path / "pack.jsiq.zip", SIDocumentTypes.JSIQ)
+    assert package_dict(SIDocument.read_jsiq(tmp_path / "pack.jsiq.zip").package) == package_dict(package)
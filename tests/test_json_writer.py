@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+from zipfile import ZipFile
+
+import pytest
+
+from sigame_tools.datatypes import Package, SIDocument, json_default, json_iterencode_package
+
+
+def dumps(package: Package, indent, ensure_ascii: bool) -> str:
+    separators = (",", ":") if indent is None else (",", ": ")
+    return json.dumps(package, default=json_default, indent=indent, ensure_ascii=ensure_ascii, separators=separators)
+
+
+@pytest.mark.parametrize("indent", [None, 0, 2])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_iterencode_matches_dumps(siq_path, indent, ensure_ascii):
+    package = SIDocument.read_siq(siq_path).package
+    assert "".join(json_iterencode_package(package, indent, ensure_ascii)) == dumps(package, indent, ensure_ascii)
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_empty_package(indent):
+    package = Package("Empty")
+    assert "".join(json_iterencode_package(package, indent)) == dumps(package, indent, False)
+
+
+def test_saved_content(siq_path, tmp_path):
+    doc = SIDocument.read_siq(siq_path)
+    doc.save_jsiq(tmp_path / "pack.jsiq.zip", indent=2)
+    with ZipFile(tmp_path / "pack.jsiq.zip") as zipfile:
+        content = zipfile.read("content.json").decode("utf-8")
+        names = zipfile.namelist()
+    assert content == dumps(doc.package, 2, False)
+    # Media is copied along with the content
+    assert any(name.startswith("Images/") for name in names)
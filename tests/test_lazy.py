@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from zipfile import ZipFile
+
+from conftest import package_dict, write_siq
+from sigame_tools import validate
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes, SIQReaders
+from sigame_tools.lazy import LazyList
+
+# Tags in comments and CDATA sections are text, which a byte scan would take for elements
+HIDDEN_TAGS = """<?xml version="1.0" encoding="utf-8"?>
+<package name="P" version="4" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><rounds>
+  <!-- <round name="Commented"><themes></themes></round> -->
+  <round name="R"><themes><theme name="T"><questions>
+    <question price="100"><scenario><atom><![CDATA[</question> <themes/>]]></atom></scenario>
+      <right><answer>A</answer></right></question>
+    <question price="200"><scenario><atom>Q</atom></scenario><right><answer>B</answer></right></question>
+  </questions></theme></themes></round>
+</rounds></package>"""
+
+
+def test_lazy_siq_matches_eager(siq_path):
+    eager = SIDocument.read_siq(siq_path).package
+    lazy = SIDocument.read_siq(siq_path, lazy=True).package
+    assert isinstance(lazy.rounds, LazyList)
+    assert package_dict(lazy) == package_dict(eager)
+
+
+def test_lazy_jsiq_matches_eager(siq_path, tmp_path):
+    path = tmp_path / "pack.jsiq.zip"
+    SIDocument.read_siq(siq_path).save_as(path, SIDocumentTypes.JSIQ)
+    eager = SIDocument.read_jsiq(path).package
+    lazy = SIDocument.read_jsiq(path, lazy=True).package
+    assert package_dict(lazy) == package_dict(eager)
+
+
+def test_hidden_tags(tmp_path):
+    path = write_siq(tmp_path / "hidden.siq", HIDDEN_TAGS)
+    eager = SIDocument.read_siq(path).package
+    assert [_round.name for _round in eager.rounds] == ["R"]
+    assert eager.rounds[0].themes[0].questions[0].scenario[0].text == "</question> <themes/>"
+    assert package_dict(SIDocument.read_siq(path, lazy=True).package) == package_dict(eager)
+    parallel = SIDocument.read_siq(path, reader=SIQReaders.PARALLEL, workers=2).package
+    assert package_dict(parallel) == package_dict(eager)
+    with ZipFile(path) as zipfile:
+        data = zipfile.read("content.xml")
+    assert [(q.location, q.right) for q in validate.siq_questions(data)] == [
+        (validate.Location(0, 0, 0), ["A"]), (validate.Location(0, 0, 1), ["B"])]
+
+
+def test_rounds_load_on_access(siq_path):
+    package = SIDocument.read_siq(siq_path, lazy=True).package
+    rounds = package.rounds
+    # Counting and package metadata need no rounds
+    assert len(rounds) == 3 and package.name == "Synthetic pack"
+    assert rounds.loaded == 0
+    themes = rounds[1].themes
+    assert rounds.loaded == 1 and themes.loaded == 0
+    assert len(themes[0].questions) == 4
+    assert themes.loaded == 1 and themes[0].questions.loaded == 0
+
+
+def test_lazy_list_edits():
+    loads = []
+    items = LazyList((lambda i=i: loads.append(i) or i) for i in range(3))
+    items.append(10)
+    del items[0]
+    assert loads == [] and len(items) == 3
+    assert list(items) == [1, 2, 10]
+    assert loads == [1, 2]
+    assert items[0:2] == [1, 2]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pickle
+
+import pytest
+
+from sigame_tools.datatypes import DEFAULT_QUESTION_TYPE, Atom, Info, Question, QuestionType
+
+
+@pytest.mark.parametrize("obj", [Atom(), Question(), QuestionType("cat"), Info()])
+def test_slotted_objects_have_no_dict(obj):
+    assert not hasattr(obj, "__dict__")
+    with pytest.raises(AttributeError):
+        obj.unknown_attribute = 1
+
+
+def test_default_question_type_is_shared_and_read_only():
+    first, second = Question(), Question()
+    assert first.q_type is second.q_type is DEFAULT_QUESTION_TYPE
+    with pytest.raises(TypeError):
+        first.q_type["theme"] = "x"
+    with pytest.raises(TypeError):
+        first.q_type.name = "cat"
+    # Questions get their own type by assignment
+    first.q_type = QuestionType("cat")
+    assert second.q_type is DEFAULT_QUESTION_TYPE
+
+
+def test_info_is_allocated_on_demand():
+    question = Question()
+    assert not question.has_info
+    question.info.comments = "c"
+    assert question.has_info
+
+
+def test_pickle_round_trip():
+    question = Question(price=300)
+    question.info.authors.append("a")
+    question.scenario.append(Atom("t", "say", 5))
+    question.right.append("r")
+    question.wrong.append("w")
+    copy = pickle.loads(pickle.dumps(question))
+    assert copy.price == 300 and copy.q_type is DEFAULT_QUESTION_TYPE
+    assert copy.info.authors == ["a"] and copy.right == ["r"] and copy.wrong == ["w"]
+    assert [(atom.text, atom.type, atom.time) for atom in copy.scenario] == [("t", "say", 5)]
+
+
+def test_question_type_params():
+    q_type = QuestionType("bagcat")
+    q_type["theme"] = "T"
+    q_type["cost"] = "0"
+    q_type["self"] = "true"
+    assert list(q_type) == ["theme", "cost", "self"] and len(q_type) == 3
+    assert q_type["cost"] == "0" and "cost" in q_type
+    # Missing parameters read as empty, like in SIGame
+    assert q_type["knows"] == "" and "knows" not in q_type
+    q_type["theme"] = "U"
+    del q_type["cost"]
+    assert dict(q_type) == {"theme": "U", "self": "true"}
+    with pytest.raises(KeyError):
+        del q_type["cost"]
+
+
+def test_question_type_round_trips_keep_order():
+    q_type = QuestionType("cat")
+    for key in ("z", "a", "m"):
+        q_type[key] = key.upper()
+    assert list(QuestionType.json_deserialize(q_type.json_serialize())) == ["z", "a", "m"]
+    copy = pickle.loads(pickle.dumps(q_type))
+    assert copy.name == "cat" and list(copy.items()) == [("z", "Z"), ("a", "A"), ("m", "M")]
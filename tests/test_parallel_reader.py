@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import package_dict, write_siq
+from sigame_tools import parallel_reader, siq_reader
+from sigame_tools.datatypes import SIDocument, SIQReaders
+
+CONTENT = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><info><comments>&lt;rounds&gt;'
+           '</comments></info><rounds>'
+           '<round name="First &amp; only"><themes><theme name="T"><questions><question price="100"><scenario>'
+           '<atom>&lt;/round&gt; is text here</atom></scenario><right><answer>A</answer></right></question>'
+           '</questions></theme></themes></round>'
+           '<round name="Empty" />'
+           '<round name="Final" type="final"><themes><theme name="F"><questions><question price="0"><scenario>'
+           '<atom>Q</atom></scenario><right><answer>B</answer></right></question></questions></theme></themes>'
+           '</round></rounds></package>')
+
+
+def test_matches_iterparse_reader(siq_path):
+    parallel = SIDocument.read_siq(siq_path, reader=SIQReaders.PARALLEL, workers=2).package
+    assert package_dict(parallel) == package_dict(SIDocument.read_siq(siq_path).package)
+
+
+def test_rounds_keep_document_order():
+    data = CONTENT.encode("utf-8")
+    with ThreadPoolExecutor(2) as executor:
+        package = parallel_reader.read_package(data, executor=executor)
+    assert [r.name for r in package.rounds] == ["First & only", "Empty", "Final"]
+    assert package.rounds[2].final and package.rounds[0].themes[0].questions[0].scenario[0].text == \
+        "</round> is text here"
+    assert package_dict(package) == package_dict(siq_reader.read_package(io.BytesIO(data)))
+
+
+def test_single_worker_falls_back(tmp_path):
+    path = write_siq(tmp_path / "pack.siq", CONTENT)
+    package = SIDocument.read_siq(path, reader=SIQReaders.PARALLEL, workers=1).package
+    assert package_dict(package) == package_dict(SIDocument.read_siq(path).package)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import contextlib
+import tracemalloc
+
+import pytest
+
+from conftest import SPEC
+from sigame_tools import cli, profiling
+from sigame_tools.datatypes import SIDocument
+
+BIG = 20 * 2 ** 20
+
+
+def test_phases_without_profiler():
+    with profiling.phase("nothing"):
+        pass
+    assert profiling._current is None
+
+
+def test_phase_records(siq_path):
+    with profiling.profiled("read") as profiler:
+        SIDocument.read_siq(siq_path)
+    names = [record["name"] for record in profiler.phases]
+    assert names == ["read", "read/zip open", "read/parse"]
+    assert [record["depth"] for record in profiler.phases] == [0, 1, 1]
+    total = profiler.phases[0]
+    assert total["wall"] >= sum(record["wall"] for record in profiler.phases[1:])
+    # Objects are counted at the end of phases, the package is built by then
+    assert profiler.phases[2]["objects"]["Question"] >= SPEC.question_count
+    # Memory is only traced with a tracemalloc dump
+    assert "traced_peak" not in total and profiler.report()["traced_peak_bytes"] is None
+    assert "max RSS" in profiler.format_report()
+
+
+def test_traced_peak_per_phase(tmp_path):
+    with profiling.profiled("total", tracemalloc_path=str(tmp_path / "snapshot")) as profiler:
+        with profiling.phase("big"):
+            data = bytearray(BIG)
+            del data
+        with profiling.phase("small"):
+            with profiling.phase("nested"):
+                data = bytearray(BIG // 4)
+                del data
+            data = bytearray(BIG // 8)
+            del data
+    assert not tracemalloc.is_tracing() and (tmp_path / "snapshot").exists()
+    peaks = {record["name"]: record["traced_peak"] for record in profiler.phases}
+    # Each phase has its own peak instead of the largest one so far
+    assert peaks["total/big"] >= BIG
+    assert BIG // 4 <= peaks["total/small/nested"] < BIG
+    assert peaks["total/small"] >= peaks["total/small/nested"] and peaks["total/small"] < BIG
+    # Outer phases still see the peaks of their subphases
+    assert peaks["total"] >= BIG and profiler.traced_peak == peaks["total"]
+
+
+def test_failed_profiler_start(siq_path, tmp_path, monkeypatch):
+    @contextlib.contextmanager
+    def failing(*args):
+        raise OSError("Profiling is not available")
+        yield
+
+    monkeypatch.setattr(profiling, "profiled", failing)
+    args = cli.parser.parse_args(["query", "--no-index", "--stats", "--stats-json", str(tmp_path / "stats.json"),
+                                  str(siq_path)])
+    # The error of the profiler comes through rather than one of the missing report
+    with pytest.raises(OSError, match="Profiling is not available"):
+        cli.run_profiled(args)
+    assert not (tmp_path / "stats.json").exists()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from conftest import write_siq
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+MEDIA = {
+    "Images/picture.jpg": bytes(range(256)) * 8,
+    "Audio/sound.mp3": b"\x01\x02" * 500,
+    "Texts/notes.txt": b"plain text " * 100,
+}
+CONTENT = '<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd" />'
+
+
+@pytest.fixture
+def origin(tmp_path):
+    path = tmp_path / "origin.siq"
+    write_siq(path, CONTENT)
+    with ZipFile(path, "a") as zipfile:
+        zipfile.writestr("Images/picture.jpg", MEDIA["Images/picture.jpg"], ZIP_DEFLATED)
+        zipfile.writestr("Audio/sound.mp3", MEDIA["Audio/sound.mp3"], ZIP_STORED)
+        zipfile.writestr("Texts/notes.txt", MEDIA["Texts/notes.txt"], ZIP_DEFLATED)
+        # Not an asset
+        zipfile.writestr("other.txt", b"ignored")
+    return path
+
+
+def members(path):
+    with ZipFile(path) as zipfile:
+        assert zipfile.testzip() is None
+        return {info.filename: (zipfile.read(info), info.compress_type) for info in zipfile.infolist()}
+
+
+@pytest.mark.parametrize("raw", [True, False])
+def test_assets_are_copied(origin, tmp_path, raw):
+    dst = tmp_path / "copy.jsiq.zip"
+    SIDocument.read_siq(origin).save_as(dst, SIDocumentTypes.JSIQ, raw_assets=raw)
+    copied = members(dst)
+    assert {name: data for name, (data, _) in copied.items() if name in MEDIA} == MEDIA
+    assert "other.txt" not in copied
+    if raw:
+        # Members keep their compression, data is moved as is
+        assert copied["Images/picture.jpg"][1] == ZIP_DEFLATED
+        assert copied["Audio/sound.mp3"][1] == ZIP_STORED
+
+
+def test_store_media(origin, tmp_path):
+    dst = tmp_path / "stored.siq"
+    SIDocument.read_siq(origin).save_as(dst, SIDocumentTypes.SIQ, store_media=True)
+    copied = members(dst)
+    assert copied["Images/picture.jpg"] == (MEDIA["Images/picture.jpg"], ZIP_STORED)
+    assert copied["Audio/sound.mp3"] == (MEDIA["Audio/sound.mp3"], ZIP_STORED)
+    # Only already compressed media formats are stored
+    assert copied["Texts/notes.txt"] == (MEDIA["Texts/notes.txt"], ZIP_DEFLATED)
+
+
+def test_asset_names():
+    assert SIDocument.is_asset("Images/a.png") and not SIDocument.is_asset("content.xml")
+    assert not SIDocument.is_asset("Other/a.png")
+    assert SIDocument.is_compressed_media("Video/A.MP4") and not SIDocument.is_compressed_media("Texts/a.txt")
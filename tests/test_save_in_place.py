@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools.datatypes import SaveModes, SIDocument, SIDocumentTypes
+
+MODES = [SaveModes.APPEND, SaveModes.REWRITE]
+
+
+@pytest.fixture(params=[SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ, SIDocumentTypes.BSIQ])
+def origin(request, siq_path, tmp_path):
+    if request.param == SIDocumentTypes.SIQ:
+        return request.param, siq_path
+    path = tmp_path / f"pack{'.jsiq.zip' if request.param == SIDocumentTypes.JSIQ else '.bsiq'}"
+    SIDocument.read_siq(siq_path).save_as(path, request.param)
+    return request.param, path
+
+
+def media(path):
+    with ZipFile(path) as zipfile:
+        assert zipfile.testzip() is None
+        return {name: zipfile.read(name) for name in zipfile.namelist() if SIDocument.is_asset(name)}
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_save_in_place(origin, mode):
+    filetype, path = origin
+    assets = media(path)
+    doc = SIDocument.read_as(path, filetype)
+    doc.package.name = "Edited"
+    doc.package.rounds[0].themes[0].questions[0].right.append("Also right")
+    doc.save_in_place(mode)
+    # Saving twice must not pile up stale content either
+    doc.save_in_place(mode)
+    saved = SIDocument.read_as(path, filetype).package
+    assert package_dict(saved) == package_dict(doc.package) and saved.name == "Edited"
+    assert media(path) == assets
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_failed_save_keeps_origin(origin, mode):
+    filetype, path = origin
+    before = path.read_bytes()
+    doc = SIDocument.read_as(path, filetype)
+    question = doc.package.rounds[0].themes[0].questions[0]
+    # Fails halfway through serializing: too big for the binary format, not a string for the text formats
+    question.price = 2 ** 40
+    question.wrong.append(object() if filetype != SIDocumentTypes.BSIQ else "w")
+    with pytest.raises((TypeError, ValueError, OverflowError, AttributeError)):
+        doc.save_in_place(mode)
+    assert path.read_bytes() == before
+    assert list(path.parent.glob("*.tmp")) == []
+
+
+def test_save_in_place_errors(siq_path):
+    doc = SIDocument.read_siq(siq_path)
+    with pytest.raises(ValueError, match="Incorrect save mode"):
+        doc.save_in_place("overwrite")
+    doc.origin = None
+    with pytest.raises(ValueError, match="no origin"):
+        doc.save_in_place()
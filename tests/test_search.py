@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import pytest
+
+from conftest import write_siq
+from sigame_tools.datatypes import SIDocumentTypes
+from sigame_tools.search import SearchIndex, prefix_end, tokenize
+
+CONTENT = ('<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><rounds><round name="Round">'
+           '<themes><theme name="Ёлки"><info><comments>Зимняя тема</comments></info><questions>'
+           '<question price="100"><scenario><atom>Самое высокое дерево</atom><atom type="image">@tree.jpg</atom>'
+           '</scenario><right><answer>Секвойя</answer></right><wrong><answer>Баобаб</answer></wrong></question>'
+           '<question price="200"><info><comments>Hint about pines</comments></info>'
+           '<scenario><atom type="say">Самая старая сосна</atom></scenario>'
+           '<right><answer>Мафусаил</answer></right></question>'
+           '</questions></theme></themes></round></rounds></package>')
+
+
+@pytest.fixture
+def index(tmp_path):
+    with SearchIndex(tmp_path / "search.sqlite3") as index:
+        index.update(write_siq(tmp_path / "trees.siq", CONTENT), SIDocumentTypes.SIQ)
+        yield index
+
+
+def prices(index, query):
+    return [hit.price for hit in index.search(query)]
+
+
+def test_tokenize():
+    assert tokenize("Ёлка, ЕЛЬ и ёж!") == ["елка", "ель", "и", "еж"]
+
+
+def test_search(index):
+    hit, = index.search("дерево")
+    assert (hit.round, hit.theme, hit.question, hit.round_name, hit.theme_name) == (0, 0, 0, "Round", "Ёлки")
+    # Only text atoms make up the question text
+    assert (hit.price, hit.text, hit.answer) == (100, "Самое высокое дерево", "Секвойя")
+
+
+def test_search_fields(index):
+    # Theme name and comments match every question of the theme
+    assert prices(index, "елки") == [100, 200]
+    assert prices(index, "зимняя") == [100, 200]
+    # Right and wrong answers, question comments and oral atoms
+    assert prices(index, "баобаб") == [100]
+    assert prices(index, "pines") == [200]
+    assert prices(index, "сосна") == [200]
+    # Media references are not text
+    assert prices(index, "tree") == []
+
+
+def test_search_all_words_and_prefix(index):
+    assert prices(index, "самое дерево") == [100]
+    assert prices(index, "самая дерево") == []
+    assert prices(index, "сам*") == [100, 200]
+    assert prices(index, "") == []
+    assert len(index.search("елки", limit=1)) == 1
+
+
+def test_prefix_is_literal(tmp_path):
+    content = CONTENT.replace("Баобаб", "snake_case snakeXcase")
+    with SearchIndex(tmp_path / "literal.sqlite3") as index:
+        index.update(write_siq(tmp_path / "literal.siq", content), SIDocumentTypes.SIQ)
+        # Wildcards of LIKE are plain characters of a prefix
+        assert [hit.answer for hit in index.search("snake_*")] == ["Секвойя"]
+        assert prices(index, "snakex*") == [100] and prices(index, "snakey*") == []
+    assert prefix_end("ab") == "ac" and prefix_end("a\ud7ff") == "a\ue000"
+
+
+def test_update_replaces_questions(index, tmp_path):
+    path = tmp_path / "trees.siq"
+    assert not index.update(path, SIDocumentTypes.SIQ)
+    write_siq(path, CONTENT.replace("Секвойя", "Sequoia"))
+    assert index.update(path, SIDocumentTypes.SIQ)
+    assert prices(index, "секвойя") == [] and prices(index, "sequoia") == [100]
+    assert index.stats()[:2] == (1, 2)
+
+
+def test_prune(index, tmp_path):
+    (tmp_path / "trees.siq").unlink()
+    assert index.prune() == 1
+    assert index.stats() == (0, 0, 0)
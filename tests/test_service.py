@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import multiprocessing
+from typing import Dict, Tuple
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools import service as svc
+from sigame_tools.batch import ConversionJob
+from sigame_tools.datatypes import Package, SIDocument, SIDocumentTypes
+
+
+async def request(port: int, method: str, target: str, body: None | bytes = None) -> Tuple[int, Dict[str, str], bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {target} HTTP/1.1", "Host: localhost"]
+    if body is not None:
+        lines.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in header_lines)}
+    return int(status_line.split(" ")[1]), headers, payload
+
+
+def run_server(test, max_upload: int = svc.MAX_UPLOAD):
+    async def main():
+        async with svc.ConversionService(workers=1) as service:
+            server = svc.ConversionServer(service, max_upload)
+            listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+            try:
+                async with listener:
+                    await test(listener.sockets[0].getsockname()[1], service)
+            finally:
+                server.close()
+    asyncio.run(main())
+
+
+def test_http_convert(siq_path):
+    original = package_dict(SIDocument.read_siq(siq_path).package)
+
+    async def test(port, service):
+        status, headers, body = await request(port, "POST", "/convert?out=jsiq.zip", siq_path.read_bytes())
+        assert status == 200 and headers["content-type"] == "application/zip"
+        assert int(headers["content-length"]) == len(body)
+        with ZipFile(io.BytesIO(body)) as zipfile:
+            content = json.loads(zipfile.read("content.json"))
+        assert package_dict(Package.json_deserialize(content)) == original
+
+        status, _, body = await request(port, "GET", "/metrics")
+        metrics = json.loads(body)
+        assert status == 200 and (metrics["submitted"], metrics["completed"], metrics["failed"]) == (1, 1, 0)
+        assert metrics["bytes_per_second"] > 0
+    run_server(test)
+
+
+@pytest.mark.parametrize("target, body, status", [
+    ("/convert?out=doc", b"", 400),
+    ("/convert?out=siq&in=doc", b"", 400),
+    ("/convert?out=siq", None, 411),
+    ("/convert?out=siq", b"x" * 100, 413),
+    ("/convert?out=siq&in=siq", b"not a zip", 422),
+    ("/other", b"", 404),
+])
+def test_http_errors(target, body, status):
+    async def test(port, service):
+        response_status, headers, payload = await request(port, "POST", target, body)
+        assert response_status == status and headers["content-type"] == "application/json"
+        assert json.loads(payload)["error"]
+    run_server(test, max_upload=50)
+
+
+def test_queue_full(siq_path, tmp_path):
+    async def test():
+        async with svc.ConversionService(workers=1, max_queue=0) as service:
+            job = ConversionJob(siq_path, tmp_path / "out.bsiq", SIDocumentTypes.SIQ, SIDocumentTypes.BSIQ)
+            with pytest.raises(svc.QueueFull):
+                await service.convert(job)
+            assert service.metrics.snapshot()["rejected"] == 1
+    asyncio.run(test())
+
+
+def test_convert_stream(siq_path, tmp_path):
+    async def test():
+        async with svc.ConversionService(workers=1) as service:
+            job = ConversionJob(siq_path, tmp_path / "out.bsiq", SIDocumentTypes.SIQ, SIDocumentTypes.BSIQ)
+            result, chunks = await service.convert_stream(job, chunk_size=100)
+            data = b"".join([chunk async for chunk in chunks])
+            assert result.result.error is None and result.latency >= result.queue_wait
+            assert data == job.dst.read_bytes()
+    asyncio.run(test())
+
+
+def test_killed_worker(siq_path, tmp_path):
+    async def test():
+        async with svc.ConversionService(workers=1) as service:
+            job = ConversionJob(siq_path, tmp_path / "out.bsiq", SIDocumentTypes.SIQ, SIDocumentTypes.BSIQ)
+            assert (await service.convert(job)).result.error is None
+            for worker in multiprocessing.active_children():
+                worker.kill()
+                worker.join()
+            # The broken pool is replaced and the job run in the new one
+            for _ in range(2):
+                assert (await service.convert(job)).result.error is None
+            assert service.metrics.snapshot()["restarts"] == 1
+    asyncio.run(test())
+
+
+def test_percentile():
+    assert svc.percentile(svc.deque(), 0.5) == 0.0
+    assert svc.percentile(svc.deque([3.0, 1.0, 2.0]), 0.5) == 2.0
+    assert svc.percentile(svc.deque([3.0, 1.0, 2.0]), 0.95) == 3.0
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from conftest import package_dict, write_siq
+from sigame_tools import siq_reader
+from sigame_tools.datatypes import AtomTypes, QuestionTypes, SIDocument, SIQReaders
+
+CONTENT = """<?xml version="1.0" encoding="utf-8"?>
+<package name="Pack &amp; co" version="5" id="p1" difficulty="7" language="en"
+         xmlns="http://vladimirkhil.com/ygpackage3.0.xsd">
+  <tags><tag>one</tag><tag>two</tag></tags>
+  <info><authors><author>Author</author></authors><comments>Package comment</comments></info>
+  <rounds>
+    <round name="First">
+      <themes>
+        <theme name="Theme">
+          <info><authors><author>Theme author</author></authors></info>
+          <questions>
+            <question price="100">
+              <info><comments>Question comment</comments></info>
+              <scenario><atom>Text</atom><atom type="say" time="5">Oral</atom><atom type="marker" /></scenario>
+              <right><answer>Right</answer><answer /></right>
+              <wrong><answer>Wrong</answer></wrong>
+            </question>
+            <question>
+              <type name="cat"><param name="theme">Other</param><param name="cost">300</param></type>
+              <scenario><atom type="image">@image.jpg</atom></scenario>
+              <right><answer>Cat</answer></right>
+            </question>
+          </questions>
+        </theme>
+      </themes>
+    </round>
+    <round name="Final" type="final"><themes /></round>
+  </rounds>
+</package>
+"""
+
+
+def test_iterparse_reads_all_fields(tmp_path):
+    package = SIDocument.read_siq(write_siq(tmp_path / "pack.siq", CONTENT)).package
+    assert (package.name, package.version, package.id, package.difficulty) == ("Pack & co", 5.0, "p1", 7)
+    assert package.tags == ["one", "two"]
+    assert package.info.authors == ["Author"] and package.info.comments == "Package comment"
+    assert [r.name for r in package.rounds] == ["First", "Final"]
+    assert package.rounds[1].final and not package.rounds[1].themes
+    theme = package.rounds[0].themes[0]
+    assert theme.info.authors == ["Theme author"]
+    first, second = theme.questions
+    assert first.price == 100 and first.q_type.name == QuestionTypes.SIMPLE
+    assert first.info.comments == "Question comment"
+    assert [(a.type, a.text, a.time) for a in first.scenario] == [
+        (AtomTypes.TEXT, "Text", 0), (AtomTypes.ORAL, "Oral", "5"), (AtomTypes.MARKER, "", 0)]
+    assert first.right == ["Right", ""] and first.wrong == ["Wrong"]
+    # Missing price falls back to the default
+    assert second.price == -1
+    assert second.q_type.name == QuestionTypes.CAT and dict(second.q_type) == {"theme": "Other", "cost": "300"}
+
+
+def test_iterparse_matches_minidom(siq_path):
+    iterparse = SIDocument.read_siq(siq_path, reader=SIQReaders.ITERPARSE).package
+    minidom = SIDocument.read_siq(siq_path, reader=SIQReaders.MINIDOM).package
+    assert package_dict(iterparse) == package_dict(minidom)
+
+
+def test_iterparse_without_namespace():
+    content = b'<package name="P"><rounds><round name="R"><themes><theme name="T"><questions>' \
+              b'<question price="5"><scenario><atom>A</atom></scenario><right><answer>B</answer></right>' \
+              b'</question></questions></theme></themes></round></rounds></package>'
+    package = siq_reader.read_package(io.BytesIO(content))
+    question = package.rounds[0].themes[0].questions[0]
+    assert (question.price, question.scenario[0].text, question.right) == (5, "A", ["B"])
+
+
+def test_empty_package():
+    package = siq_reader.read_package(io.BytesIO(b'<package name="Empty" />'))
+    assert package.name == "Empty" and package.rounds == [] and not package.has_info
+
+
+def test_incorrect_reader(siq_path):
+    with pytest.raises(ValueError, match="Incorrect SIQ reader"):
+        SIDocument.read_siq(siq_path, reader="sax")
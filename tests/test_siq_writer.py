@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import io
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import package_dict
+from sigame_tools import siq_reader
+from sigame_tools.datatypes import Atom, Package, Question, QuestionType, Round, SIDocument, SIQWriters, Theme
+
+
+def content_xml(doc: SIDocument, path, writer: str) -> bytes:
+    doc.save_siq(path, writer=writer)
+    with ZipFile(path) as zipfile:
+        return zipfile.read("content.xml")
+
+
+def edge_case_package() -> Package:
+    package = Package('Quotes " & <tags>')
+    package.tags.append("a > b")
+    package.info.comments = "Line\nbreak"
+    _round = Round("R", final=True)
+    theme = Theme("")
+    q_type = QuestionType("cat")
+    q_type["theme"] = ""
+    q_type["cost"] = "100"
+    question = Question(q_type, 100)
+    question.scenario.extend([Atom(""), Atom("Say & done", "say", 5)])
+    question.right.extend(["", "x"])
+    question.wrong.append("")
+    theme.questions.append(question)
+    _round.themes.append(theme)
+    package.rounds.extend([_round, Round("Empty")])
+    return package
+
+
+def test_stream_writer_matches_minidom(siq_path, tmp_path):
+    doc = SIDocument.read_siq(siq_path)
+    assert content_xml(doc, tmp_path / "a.siq", SIQWriters.STREAM) == \
+        content_xml(doc, tmp_path / "b.siq", SIQWriters.MINIDOM)
+
+
+def test_stream_writer_matches_minidom_on_edge_cases(tmp_path):
+    doc = SIDocument(edge_case_package())
+    stream = content_xml(doc, tmp_path / "a.siq", SIQWriters.STREAM)
+    assert stream == content_xml(doc, tmp_path / "b.siq", SIQWriters.MINIDOM)
+    assert package_dict(siq_reader.read_package(io.BytesIO(stream)))["name"] == 'Quotes " & <tags>'
+
+
+def test_empty_package(tmp_path):
+    doc = SIDocument(Package("Empty"))
+    assert content_xml(doc, tmp_path / "a.siq", SIQWriters.STREAM) == \
+        content_xml(doc, tmp_path / "b.siq", SIQWriters.MINIDOM)
+
+
+def test_incorrect_writer(tmp_path):
+    with pytest.raises(ValueError, match="Incorrect SIQ writer"):
+        SIDocument(Package()).save_siq(tmp_path / "a.siq", writer="sax")
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import struct
+from zipfile import ZipFile
+
+import pytest
+
+from conftest import write_siq
+from sigame_tools import binary, cli, validate
+from sigame_tools.datatypes import SIDocument, SIDocumentTypes
+
+CONTENT = ('<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd"><rounds><round name="R"><themes>'
+           '<theme name="T"><questions>'
+           '<question price="100"><scenario><atom>Q</atom></scenario><right><answer>A</answer></right></question>'
+           '<question price="-5"><right><answer>A</answer></right></question>'
+           '<question price="x"><type name="riddle" /><scenario /><right /></question>'
+           '<question price="300"><scenario><atom type="image">@gone.png</atom><atom type="say" time="long">Q</atom>'
+           '<atom type="smell">Q</atom></scenario><right><answer>A</answer></right></question>'
+           '</questions></theme></themes></round></rounds></package>')
+EXPECTED = [
+    ("scenario", "No scenario", 1),
+    ("price", "Negative price -5", 1),
+    ("scenario", "Empty scenario", 2),
+    ("answer", "No right answer", 2),
+    ("price", "Price 'x' is not an integer", 2),
+    ("question-type", "Unknown question type 'riddle'", 2),
+    ("atom-type", "Unknown atom type 'smell'", 3),
+    ("atom-time", "Atom time 'long' is not an integer", 3),
+    ("media", "Missing media 'Images/gone.png'", 3),
+]
+
+
+def problems(path, filetype=SIDocumentTypes.SIQ, **kwargs):
+    return [(p.rule, p.message, p.location.question if p.location else None)
+            for p in validate.validate(path, filetype, **kwargs)]
+
+
+def write_jsiq(path, content) -> str:
+    with ZipFile(path, "w") as zipfile:
+        zipfile.writestr("content.json", content if isinstance(content, str) else json.dumps(content))
+    return path
+
+
+@pytest.mark.parametrize("filetype", [SIDocumentTypes.SIQ, SIDocumentTypes.JSIQ, SIDocumentTypes.BSIQ])
+def test_valid_packages(siq_path, tmp_path, filetype):
+    path = siq_path
+    if filetype != SIDocumentTypes.SIQ:
+        path = tmp_path / f"pack.{filetype}"
+        SIDocument.read_siq(siq_path).save_as(path, filetype)
+    assert problems(path, filetype) == []
+
+
+def test_rules(tmp_path):
+    path = write_siq(tmp_path / "pack.siq", CONTENT)
+    assert sorted(problems(path), key=lambda p: p[2]) == sorted(EXPECTED, key=lambda p: p[2])
+    assert problems(path, fail_fast=True) == [EXPECTED[0]]
+    assert problems(path, rules=[validate.RULES["media"]]) == [EXPECTED[-1]]
+
+
+def test_jsiq_rules(tmp_path):
+    content = {"name": "P", "rounds": [{"name": "R", "themes": [{"name": "T", "questions": [
+        {"scenario": [{"text": "Q", "time": [1]}], "answers": {"right": ["A"]}},
+    ]}]}]}
+    assert problems(write_jsiq(tmp_path / "a.jsiq.zip", content), SIDocumentTypes.JSIQ) == [
+        ("price", "No price", 0), ("atom-time", "Atom time [1] is not an integer", 0)]
+
+
+@pytest.mark.parametrize("content, message", [
+    ("{", "Malformed content.json: Expecting property name"),
+    ([], "Malformed content.json: Package is not an object"),
+    ({"rounds": {}}, "Malformed content.json: 'rounds' of package is not a list"),
+    ({"rounds": [{"themes": [{"questions": [{"scenario": [{"text": 1}]}]}]}]},
+     "Malformed content.json: 'text' of atom is not a string"),
+    ({"rounds": [{"themes": [{"questions": [{"type": "cat"}]}]}]},
+     "Malformed content.json: Question type is not an object"),
+])
+def test_malformed_json(tmp_path, content, message):
+    (rule, text, location), = problems(write_jsiq(tmp_path / "a.jsiq.zip", content), SIDocumentTypes.JSIQ)
+    assert rule == "format" and text.startswith(message) and location is None
+
+
+def test_format_problems(tmp_path):
+    (tmp_path / "text.siq").write_text("text")
+    assert problems(tmp_path / "text.siq")[0][:2] == ("format", "Not a zip file: File is not a zip file")
+    assert problems(write_jsiq(tmp_path / "a.siq", {})) == [("format", "No content.xml", None)]
+    broken = write_siq(tmp_path / "broken.siq", CONTENT[:200])
+    assert problems(broken)[0][1].startswith("Malformed content.xml")
+    assert problems(tmp_path / "text.siq", "") == [("format", "Not a SI Game package", None)]
+    assert problems(tmp_path / "text.siq", "doc") == [("format", "Unknown file type 'doc'", None)]
+
+
+def test_broken_binary_package(siq_path, tmp_path):
+    path = tmp_path / "pack.bsiq"
+    SIDocument.read_siq(siq_path).save_as(path, SIDocumentTypes.BSIQ)
+    with ZipFile(path) as zipfile:
+        data = zipfile.read("content.bin")
+    # The package record follows the header and the string table, its first value is the index of the name
+    count = len(binary.SECTIONS)
+    start = 8 + 4 * count + struct.unpack_from("<I", data, 8)[0]
+    with ZipFile(tmp_path / "broken.bsiq", "w") as zipfile:
+        zipfile.writestr("content.bin", data[:start] + struct.pack("<i", 10 ** 6) + data[start + 4:])
+    (rule, message, location), = problems(tmp_path / "broken.bsiq", SIDocumentTypes.BSIQ)
+    assert rule == "format" and location is None
+    assert message == "Malformed content.bin: Read error: String index out of range in package section"
+
+
+def test_rule_errors_propagate(tmp_path):
+    class BrokenRule(validate.Rule):
+        name = "broken"
+
+        def check(self, question, context):
+            raise KeyError("bug")
+
+    with pytest.raises(KeyError):
+        problems(write_siq(tmp_path / "pack.siq", CONTENT), rules=[BrokenRule()])
+
+
+def test_cli(tmp_path, capsys):
+    write_siq(tmp_path / "pack.siq", CONTENT)
+    (tmp_path / "notes.txt").write_text("not a package")
+    args = cli.parser.parse_args(["validate", "-q", "-r", "scenario", str(tmp_path / "pack.siq"),
+                                  str(tmp_path / "notes.txt")])
+    with pytest.raises(SystemExit) as exit_info:
+        args.func(args)
+    assert exit_info.value.code == 1
+    output = capsys.readouterr().out
+    assert "notes.txt: 1 problems" in output and "Not a SI Game package [format]" in output
+    assert "pack.siq: 2 problems" in output
+    assert "0/2 packages valid" in output
+    # Every rule can be picked
+    for name in validate.RULES:
+        assert cli.parser.parse_args(["validate", "-r", name, "x"]).rule == [name]
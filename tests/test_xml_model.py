@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from xml.dom.minidom import parseString
+
+from conftest import package_dict
+from sigame_tools.datatypes import Package, Question, SIDocument, SIQReaders
+
+CONTENT = """<package name="P" xmlns="http://vladimirkhil.com/ygpackage3.0.xsd">
+  <rounds>
+    <round name="R">
+      <themes>
+        <theme name="T">
+          <questions>
+            <question price="200">
+              <info><authors><author>Question author</author></authors></info>
+              <scenario><atom>Text</atom><atom type="voice" time="7">@a.mp3</atom></scenario>
+              <right><answer>A</answer></right>
+            </question>
+          </questions>
+        </theme>
+      </themes>
+    </round>
+  </rounds>
+</package>
+"""
+
+
+def test_nested_info_stays_with_its_owner():
+    package = Package.from_document(parseString(CONTENT))
+    _round = package.rounds[0]
+    theme = _round.themes[0]
+    question = theme.questions[0]
+    # Only direct children are read, so question info never ends up on the package, round or theme
+    assert not package.has_info and not _round.has_info and not theme.has_info
+    assert question.info.authors == ["Question author"]
+
+
+def test_question_fields():
+    question = Question()
+    question.read_xml(parseString(CONTENT).getElementsByTagName("question")[0])
+    assert question.price == 200
+    assert [(atom.type, atom.text, atom.time) for atom in question.scenario] == [("text", "Text", 0),
+                                                                                ("voice", "@a.mp3", "7")]
+    assert question.right == ["A"] and question.wrong == []
+
+
+def test_write_and_read_back(siq_path):
+    package = SIDocument.read_siq(siq_path, reader=SIQReaders.MINIDOM).package
+    document = parseString(package.write_xml(parseString("<root/>")).toxml())
+    assert package_dict(Package.from_document(document)) == package_dict(package)